@@ -1,21 +1,71 @@
 import asyncio
 import json
+import time
 
+import httpx
 from fastmcp import Client
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 
 from config import Config
+from llm_stub import CassetteRecorder
+from telemetry import Telemetry, extract_usage
+from tool_cache import ToolResultCache
+from tool_router import EXPAND_TOOL_NAME, ToolRouter, compact_tool, schema_chars
+
+# 进程内共享的HTTP连接池，所有LLM请求复用keep-alive连接
+_shared_http_client = None
+
+
+def get_shared_http_client():
+    """获取（必要时创建）共享的异步HTTP连接池"""
+    global _shared_http_client
+    if _shared_http_client is None or _shared_http_client.is_closed:
+        _shared_http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=Config.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=Config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=Config.HTTP_KEEPALIVE_EXPIRY,
+            )
+        )
+    return _shared_http_client
+
+
+async def close_shared_http_client():
+    """关闭共享的HTTP连接池（进程退出前调用）"""
+    global _shared_http_client
+    if _shared_http_client is not None:
+        await _shared_http_client.aclose()
+        _shared_http_client = None
+
+
+def print_token(text: str):
+    """REPL流式渲染：收到token立即输出"""
+    print(text, end="", flush=True)
 
 
 class UserClient:
-    def __init__(self, script=None, model=None):
-        # 使用配置类获取默认值
+    def __init__(self, script=None, model=None, on_token=None, base_url=None, api_key=None, record_path=None,
+                 mcp_client=None, llm_client=None, tool_cache=None):
+        # 使用配置类获取默认值；mcp_client / llm_client / tool_cache 可由多会话服务传入共享的实例
         self.model = model or Config.get_model()
-        self.mcp_client = Client(script or Config.DEFAULT_MCP_SCRIPT)
-        self.llm_client = OpenAI(
-            base_url=Config.get_base_url(),
-            api_key=Config.get_api_key(),
+        self.mcp_client = mcp_client or Client(script or Config.DEFAULT_MCP_SCRIPT)
+        self.llm_client = llm_client or AsyncOpenAI(
+            base_url=base_url or Config.get_base_url(),
+            api_key=api_key or Config.get_api_key(),
+            http_client=get_shared_http_client(),
         )
+        # LLM调用录制（供 llm_stub.py 离线回放），为空表示不录制
+        record_path = Config.get_llm_record_path() if record_path is None else record_path
+        self.recorder = CassetteRecorder(record_path) if record_path else None
+        # 流式输出回调，None 表示不渲染
+        self.on_token = on_token
+        # 最近一次对话的耗时统计（首token耗时、总耗时，单位秒）
+        self.last_turn_timing = {}
+        # 每次对话的LLM/工具耗时与token遥测
+        self.telemetry = Telemetry(Config.get_telemetry_path())
+        self._turn = None
+        # 只读工具结果缓存（默认会话内独享）
+        self.tool_cache = tool_cache or ToolResultCache(Config.get_tool_cache_ttl())
         # 保持完整的对话历史
         self.conversation_history = [
             {
@@ -24,10 +74,12 @@ class UserClient:
             }
         ]
         self.tools = []
+        # 按对话内容选择每次请求发送的工具子集，None 表示发送全部工具
+        self.tool_router = None
 
     async def prepare_tools(self):
         tools = await self.mcp_client.list_tools()
-        return [
+        tools = [
             {
                 "type": "function",
                 "function": {
@@ -38,23 +90,175 @@ class UserClient:
             }
             for tool in tools
         ]
+        if Config.get_compact_tool_descriptions():
+            full_chars = schema_chars(tools)
+            tools = [compact_tool(tool) for tool in tools]
+            print(f"工具定义精简: {full_chars} → {schema_chars(tools)} 字符")
+        if Config.get_tool_routing():
+            self.tool_router = ToolRouter(tools)
+        return tools
+
+    def select_tools(self):
+        """本次请求发送的工具列表"""
+        if self.tool_router is None:
+            return self.tools
+        return self.tool_router.select(self.conversation_history)
 
     async def execute_tool(self, tool_call):
+        tool_name = tool_call["function"]["name"]
+        started = time.perf_counter()
+        ok = False
+        cached = False
+        result = None
+        arguments = None
         try:
-            tool_name = tool_call.function.name
-            arguments = json.loads(tool_call.function.arguments)
+            arguments = json.loads(tool_call["function"]["arguments"] or "{}")
             print(f"\n[调用工具] {tool_name} 参数: {arguments}")
 
-            result = await self.mcp_client.call_tool(tool_name, arguments)
+            if tool_name == EXPAND_TOOL_NAME and self.tool_router is not None:
+                # 启用工具类别的伪工具，在本地处理
+                result = self.tool_router.expand(arguments)
+                ok = True
+                return result
+
+            result = self.tool_cache.get(tool_name, arguments)
+            if result is not None:
+                print(f"[缓存命中] {tool_name}")
+                ok = cached = True
+                return result
+
+            # 变更类工具在执行前后都要失效重叠路径的缓存，避免并发读取写入过期结果
+            self.tool_cache.invalidate(tool_name, arguments)
+            generation = self.tool_cache.generation
+            try:
+                result = await self.mcp_client.call_tool(tool_name, arguments)
+            finally:
+                self.tool_cache.invalidate(tool_name, arguments)
             print(f"[工具结果] {result}")
+            self.tool_cache.put(tool_name, arguments, result, generation)
+            ok = True
             return result
         except Exception as e:
             print(f"工具执行失败: {e}")
-            return f"工具执行错误: {str(e)}"
+            result = f"工具执行错误: {str(e)}"
+            return result
+        finally:
+            if self._turn is not None:
+                self._turn.record_tool_call(tool_name, time.perf_counter() - started, ok, len(str(result)), cached,
+                                           arguments)
+
+    async def complete(self, use_tools: bool = True):
+        """
+        流式调用LLM，基于完整的对话历史生成下一条助手消息
+        内容token到达即通过 on_token 渲染，工具调用的增量片段按 index 拼接
+        :param use_tools: 是否提供工具
+        :return: (助手消息字典, 耗时与token统计字典)
+        """
+        kwargs = {
+            "model": self.model,
+            "messages": self.conversation_history,
+            "stream": True,
+            # 流式响应的最后一个chunk携带usage
+            "stream_options": {"include_usage": True},
+        }
+        tools = self.select_tools() if use_tools else []
+        if tools:
+            kwargs["tools"] = tools
+            kwargs["tool_choice"] = "auto"
+
+        started = time.perf_counter()
+        first_token_at = None
+        content_parts = []
+        tool_calls = {}
+        usage = None
+
+        stream = await self.llm_client.chat.completions.create(**kwargs)
+        async for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+
+            if delta.content:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    if self.on_token:
+                        self.on_token("\n🤖 ")
+                content_parts.append(delta.content)
+                if self.on_token:
+                    self.on_token(delta.content)
+
+            for tool_call_delta in delta.tool_calls or []:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                entry = tool_calls.setdefault(tool_call_delta.index, {
+                    "id": None,
+                    "type": "function",
+                    "function": {"name": "", "arguments": ""},
+                })
+                if tool_call_delta.id:
+                    entry["id"] = tool_call_delta.id
+                if tool_call_delta.function:
+                    if tool_call_delta.function.name:
+                        entry["function"]["name"] += tool_call_delta.function.name
+                    if tool_call_delta.function.arguments:
+                        entry["function"]["arguments"] += tool_call_delta.function.arguments
+
+        finished = time.perf_counter()
+        message = {
+            "role": "assistant",
+            "content": "".join(content_parts) or None,
+        }
+        if tool_calls:
+            message["tool_calls"] = [tool_calls[index] for index in sorted(tool_calls)]
+
+        metrics = {
+            "ttft": (first_token_at or finished) - started,
+            "total": finished - started,
+            "tools": len(tools),
+        }
+        metrics.update(extract_usage(usage))
+        if self.recorder is not None:
+            self.recorder.record(self.conversation_history, use_tools, message, usage, metrics)
+        return message, metrics
+
+    async def execute_tool_calls(self, tool_calls, timeout: float):
+        """
+        并发执行同一条助手消息中的所有工具调用
+        :param tool_calls: 助手消息中的工具调用列表
+        :param timeout: 本轮工具执行的剩余时间（秒）
+        :return: 与 tool_calls 顺序一致的结果列表
+        """
+        async def run_one(tool_call):
+            try:
+                return await asyncio.wait_for(self.execute_tool(tool_call), timeout)
+            except asyncio.TimeoutError:
+                print(f"工具执行超时: {tool_call['function']['name']}")
+                return f"工具执行错误: 超过 {timeout:.0f} 秒未完成"
+
+        # gather 保证结果顺序与调用顺序一致
+        return await asyncio.gather(*(run_one(tool_call) for tool_call in tool_calls))
+
+    async def complete_before(self, deadline: float, use_tools: bool = True):
+        """
+        在总耗时上限内请求一次模型回复
+        :param deadline: time.monotonic() 表示的截止时间
+        :return: (消息, 指标)；剩余时间不足或超时返回 (None, None)
+        """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None, None
+        try:
+            return await asyncio.wait_for(self.complete(use_tools=use_tools), remaining)
+        except asyncio.TimeoutError:
+            return None, None
 
     async def chat(self, user_message: str):
         """
-        单轮对话，但保持历史记录
+        多轮工具调用对话，保持历史记录
+        每一轮中同一条助手消息的工具调用并发执行，直到模型不再调用工具，
+        或达到轮数上限/总耗时上限
         """
         async with self.mcp_client:
             if not self.tools:
@@ -70,62 +274,93 @@ class UserClient:
             print(f"\n[用户消息] {user_message}")
             print(f"[当前历史记录长度] {len(self.conversation_history)} 条消息")
 
-            # 使用完整的对话历史
-            response = await asyncio.to_thread(
-                lambda: self.llm_client.chat.completions.create(
-                    model=self.model,
-                    messages=self.conversation_history,
-                    tools=self.tools,
-                    tool_choice="auto",
-                )
-            )
-
-            response_message = response.choices[0].message
-            print(f"\n[AI响应] {response_message}")
-
-            # 添加AI响应到历史记录
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": response_message.content,
-                "tool_calls": response_message.tool_calls
-            })
-
-            # 处理工具调用
-            if response_message.tool_calls:
-                for tool_call in response_message.tool_calls:
-                    tool_result = await self.execute_tool(tool_call)
-                    # 添加工具结果到历史记录
+            self._turn = self.telemetry.start_turn(user_message, len(self.conversation_history))
+
+            max_rounds = Config.get_max_tool_rounds()
+            round_index = 0
+            turn_started = time.perf_counter()
+            deadline = time.monotonic() + Config.get_max_turn_seconds()
+            # 首个内容token（用户可见的回复）出现前的耗时
+            turn_ttft = None
+
+            for round_index in range(1, max_rounds + 1):
+                # 使用完整的对话历史
+                response_message, metrics = await self.complete_before(deadline)
+                if response_message is None:
+                    return self._timeout_turn(turn_started, turn_ttft)
+                self._turn.record_llm_call(round_index, metrics, len(self.conversation_history))
+                if turn_ttft is None and response_message["content"]:
+                    turn_ttft = time.perf_counter() - turn_started - metrics["total"] + metrics["ttft"]
+
+                # 添加AI响应到历史记录
+                self.conversation_history.append(response_message)
+
+                tool_calls = response_message.get("tool_calls")
+                if not tool_calls:
+                    return self._finish_turn(response_message["content"], turn_started, turn_ttft)
+
+                print(f"\n[AI响应 第{round_index}轮] 请求调用 {len(tool_calls)} 个工具")
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    tool_results = ["工具执行错误: 本次对话已超过总耗时上限，未执行"] * len(tool_calls)
+                else:
+                    tool_results = await self.execute_tool_calls(tool_calls, remaining)
+
+                # 按调用顺序添加工具结果到历史记录
+                for tool_call, tool_result in zip(tool_calls, tool_results):
                     self.conversation_history.append({
                         "role": "tool",
                         "content": str(tool_result),
-                        "tool_call_id": tool_call.id,
-                        "name": tool_call.function.name,
+                        "tool_call_id": tool_call["id"],
+                        "name": tool_call["function"]["name"],
                     })
 
-                # 获取最终响应
-                second_response = await asyncio.to_thread(
-                    lambda: self.llm_client.chat.completions.create(
-                        model=self.model,
-                        messages=self.conversation_history,
-                    )
-                )
-                final_message = second_response.choices[0].message
-
-                # 添加最终响应到历史记录
-                self.conversation_history.append({
-                    "role": "assistant",
-                    "content": final_message.content
-                })
-
-                print(f"\n[AI最终回复] {final_message.content}")
-                return final_message.content
-
-            print(f"\n[AI回复] {response_message.content}")
-            return response_message.content
+                if time.monotonic() >= deadline:
+                    print("[提示] 已达到单次对话的总耗时上限，停止继续调用工具")
+                    break
+            else:
+                print(f"[提示] 已达到工具调用轮数上限 ({max_rounds} 轮)，停止继续调用工具")
+
+            # 达到上限后不再提供工具，让模型基于已有结果给出最终回复
+            final_message, metrics = await self.complete_before(deadline, use_tools=False)
+            if final_message is None:
+                return self._timeout_turn(turn_started, turn_ttft)
+            self._turn.record_llm_call(round_index + 1, metrics, len(self.conversation_history))
+            if turn_ttft is None:
+                turn_ttft = time.perf_counter() - turn_started - metrics["total"] + metrics["ttft"]
+
+            # 添加最终响应到历史记录
+            self.conversation_history.append(final_message)
+
+            return self._finish_turn(final_message["content"], turn_started, turn_ttft)
+
+    def _timeout_turn(self, turn_started: float, turn_ttft):
+        """模型回复未能在总耗时上限内完成时，以错误信息结束本次对话"""
+        content = f"错误: 本次对话已超过总耗时上限 ({Config.get_max_turn_seconds():.0f} 秒)，未能生成回复"
+        print(f"[提示] {content}")
+        # 保持历史记录以助手消息结尾，下一次对话可以正常继续
+        self.conversation_history.append({"role": "assistant", "content": content})
+        return self._finish_turn(content, turn_started, turn_ttft)
+
+    def _finish_turn(self, content, turn_started: float, turn_ttft):
+        """记录本次对话的耗时统计与遥测并返回回复内容"""
+        total = time.perf_counter() - turn_started
+        self.last_turn_timing = {
+            "ttft": turn_ttft if turn_ttft is not None else total,
+            "total": total,
+        }
+        self.telemetry.finish_turn(self._turn, self.last_turn_timing["ttft"], total)
+        self._turn = None
+        print(f"\n[耗时] 首token {self.last_turn_timing['ttft']:.2f} 秒，总计 {total:.2f} 秒")
+        return content
 
     def clear_history(self):
         """清除对话历史（保留系统提示）"""
         self.conversation_history = self.conversation_history[:1]  # 只保留system消息
+        self.tool_cache.clear()
+        if self.tool_router is not None:
+            self.tool_router.reset()
         print("对话历史已清除")
 
     def show_history(self):
@@ -144,13 +379,17 @@ class UserClient:
                 print(f"{i}: [工具:{msg.get('name')}] {content[:100]}...")
         print("================")
 
+    def show_stats(self):
+        """显示本次会话的耗时与token统计"""
+        print("\n" + self.telemetry.summary())
+
 
 async def main():
-    user_client = UserClient()
+    user_client = UserClient(on_token=print_token)
 
     print("📁 智能助手启动，输入 'quit' 退出")
     print("💡 支持多轮对话，助手会记住之前的操作")
-    print("命令: 'clear' 清除历史, 'history' 查看历史")
+    print("命令: 'clear' 清除历史, 'history' 查看历史, 'stats' 查看耗时统计")
     print("=" * 50)
 
     while True:
@@ -169,13 +408,16 @@ async def main():
                 user_client.show_history()
                 continue
 
+            if user_input.lower() == 'stats':
+                user_client.show_stats()
+                continue
+
             if not user_input.strip():
                 continue
 
             print("🤖 处理中...")
-            response = await user_client.chat(user_input)
-            print(f"\n=== 助手回复 ===")
-            print(response)
+            # 回复内容已在生成过程中流式输出
+            await user_client.chat(user_input)
 
         except KeyboardInterrupt:
             print("\n👋 再见!")
@@ -183,6 +425,8 @@ async def main():
         except Exception as e:
             print(f"❌ 发生错误: {e}")
 
+    await close_shared_http_client()
+
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
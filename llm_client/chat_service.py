@@ -0,0 +1,507 @@
+"""
+多会话对话服务 - 一个进程同时承载多个用户的对话
+
+与 app.py 的单用户REPL不同，所有会话共享：
+- MCP会话池：启动时建立 VALKYRIE_MCP_POOL_SIZE 个MCP会话（每个对应一个MCP服务器进程），
+  每个对话固定使用其中一个（后台任务、列表快照令牌等状态保存在对应的服务器进程中）
+- 一个LLM客户端和进程内共享的HTTP连接池
+- 只读工具结果缓存：任一会话的变更类工具都会失效所有会话中路径重叠的缓存
+
+调度：
+- 同一会话的对话按到达顺序依次处理
+- LLM请求和工具调用都要先取得调度器的名额：全局最多 VALKYRIE_SERVICE_CONCURRENCY 个，
+  单个会话最多 VALKYRIE_SESSION_CONCURRENCY 个；名额空出时按会话轮转分配，
+  并发工具调用多的会话不会挤占其他会话
+
+HTTP接口（JSON）:
+    POST   /sessions/<会话ID>/messages   {"message": "..."}  → {"session_id", "reply", "timing"}
+    POST   /sessions/<会话ID>/clear      清除对话历史
+    GET    /sessions/<会话ID>/stats      会话耗时与token统计
+    DELETE /sessions/<会话ID>            关闭会话（正在处理对话时返回409）
+    GET    /status                       服务状态
+
+启动:
+    python chat_service.py --port 8780 --mcp-sessions 2
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import re
+import time
+from collections import OrderedDict, deque
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Dict, List, Optional
+
+from fastmcp import Client
+from openai import AsyncOpenAI
+
+from app import UserClient, close_shared_http_client, get_shared_http_client
+from config import Config
+from tool_cache import ToolResultCache
+
+# 会话ID允许的字符
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+# 空闲会话的检查间隔（秒）
+SWEEP_INTERVAL = 60.0
+
+# 请求体大小上限（字节）
+MAX_BODY_BYTES = 1024 * 1024
+
+# 请求头最多行数（单行长度受 StreamReader 的缓冲上限限制）
+MAX_HEADER_LINES = 100
+
+HTTP_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class HeaderTooLarge(Exception):
+    """请求行或请求头超过长度/行数上限"""
+
+
+async def read_header_line(reader: asyncio.StreamReader) -> str:
+    """读取一行请求行/请求头，单行超过缓冲上限时抛出 HeaderTooLarge"""
+    try:
+        line = await reader.readline()
+    except (asyncio.LimitOverrunError, ValueError):
+        # readline 遇到超长行时把 LimitOverrunError 转成 ValueError 抛出
+        raise HeaderTooLarge()
+    return line.decode("latin-1")
+
+
+class FairScheduler:
+    """
+    跨会话的公平调度器
+    - 全局最多 capacity 个名额，单个会话最多 per_session 个
+    - 同一会话内按请求顺序分配；名额空出时从上次分配之后的会话开始轮转，
+      排队请求再多的会话每轮也只能分到一个名额
+    """
+
+    def __init__(self, capacity: int, per_session: int):
+        self.capacity = capacity
+        self.per_session = per_session
+        self.active = 0
+        self.granted = 0
+        self.queued = 0
+        self._active_by_session: Dict[str, int] = {}
+        self._waiting: "OrderedDict[str, deque]" = OrderedDict()
+
+    def _can_run(self, session_id: str) -> bool:
+        return self.active < self.capacity and self._active_by_session.get(session_id, 0) < self.per_session
+
+    def _grant(self, session_id: str):
+        self.active += 1
+        self.granted += 1
+        self._active_by_session[session_id] = self._active_by_session.get(session_id, 0) + 1
+
+    def _dispatch(self):
+        while self.active < self.capacity and self._waiting:
+            for session_id in self._waiting:
+                if self._active_by_session.get(session_id, 0) < self.per_session:
+                    break
+            else:
+                return
+            waiters = self._waiting.pop(session_id)
+            future = waiters.popleft()
+            self._grant(session_id)
+            future.set_result(None)
+            # 还有排队请求的会话排到队尾，实现轮转
+            if waiters:
+                self._waiting[session_id] = waiters
+
+    async def acquire(self, session_id: str):
+        # 本会话没有排队请求且有空闲名额时直接运行；有名额却在排队的只可能是其他会话达到了单会话上限
+        if session_id not in self._waiting and self._can_run(session_id):
+            self._grant(session_id)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(session_id, deque()).append(future)
+        self.queued += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已分到名额但调用方被取消，归还名额
+                self.release(session_id)
+            else:
+                waiters = self._waiting.get(session_id)
+                if waiters is not None and future in waiters:
+                    waiters.remove(future)
+                    if not waiters:
+                        del self._waiting[session_id]
+            raise
+
+    def release(self, session_id: str):
+        self.active -= 1
+        remaining = self._active_by_session[session_id] - 1
+        if remaining:
+            self._active_by_session[session_id] = remaining
+        else:
+            del self._active_by_session[session_id]
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, session_id: str):
+        await self.acquire(session_id)
+        try:
+            yield
+        finally:
+            self.release(session_id)
+
+    def waiting(self) -> int:
+        return sum(len(waiters) for waiters in self._waiting.values())
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "per_session": self.per_session,
+            "active": self.active,
+            "waiting": self.waiting(),
+            "granted": self.granted,
+            "queued": self.queued,
+        }
+
+
+class PooledMCPClient:
+    """
+    会话固定使用的池中MCP会话
+    连接由 MCPSessionPool 管理，进入/退出上下文不做任何事，UserClient 的 `async with self.mcp_client` 因此无需修改
+    """
+
+    def __init__(self, pool: "MCPSessionPool", index: int):
+        self.pool = pool
+        self.index = index
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    async def list_tools(self):
+        return await self.pool.list_tools()
+
+    async def call_tool(self, name: str, arguments: dict):
+        return await self.pool.clients[self.index].call_tool(name, arguments)
+
+
+class MCPSessionPool:
+    """共享的MCP会话池，按已分配的对话数把新对话分给最空闲的会话"""
+
+    def __init__(self, script: str, size: int):
+        self.script = script
+        self.size = size
+        self.clients: List[Client] = []
+        self.assigned: List[int] = []
+        self._tools = None
+        self._stack: Optional[AsyncExitStack] = None
+
+    async def start(self):
+        self._stack = AsyncExitStack()
+        for _ in range(self.size):
+            self.clients.append(await self._stack.enter_async_context(Client(self.script)))
+            self.assigned.append(0)
+        print(f"已建立 {self.size} 个MCP会话: {self.script}")
+
+    async def close(self):
+        if self._stack is not None:
+            await self._stack.aclose()
+            self._stack = None
+        self.clients.clear()
+        self.assigned.clear()
+
+    async def list_tools(self):
+        # 所有会话连接的是同一个服务器脚本，工具列表只取一次
+        if self._tools is None:
+            self._tools = await self.clients[0].list_tools()
+        return self._tools
+
+    def checkout(self) -> PooledMCPClient:
+        index = min(range(len(self.clients)), key=self.assigned.__getitem__)
+        self.assigned[index] += 1
+        return PooledMCPClient(self, index)
+
+    def checkin(self, client: PooledMCPClient):
+        self.assigned[client.index] -= 1
+
+
+class ChatSession(UserClient):
+    """服务中的一个对话：共享MCP会话池、LLM客户端和工具缓存，LLM请求和工具调用经调度器排队"""
+
+    def __init__(self, session_id: str, scheduler: FairScheduler, **kwargs):
+        super().__init__(**kwargs)
+        self.session_id = session_id
+        self.scheduler = scheduler
+        # 同一会话的对话依次处理
+        self.lock = asyncio.Lock()
+        self.created_at = time.time()
+        self.last_active = time.monotonic()
+
+    @property
+    def busy(self) -> bool:
+        return self.lock.locked()
+
+    async def complete(self, use_tools: bool = True):
+        async with self.scheduler.slot(self.session_id):
+            return await super().complete(use_tools)
+
+    async def execute_tool(self, tool_call):
+        async with self.scheduler.slot(self.session_id):
+            return await super().execute_tool(tool_call)
+
+    def clear_history(self):
+        # 工具缓存由所有会话共享，清除历史时不清空
+        self.conversation_history = self.conversation_history[:1]
+        if self.tool_router is not None:
+            self.tool_router.reset()
+
+
+class ChatService:
+    """多会话对话服务"""
+
+    def __init__(self, script: str = None, pool_size: int = None, capacity: int = None, per_session: int = None,
+                 max_sessions: int = None, idle_seconds: float = None, model: str = None):
+        self.model = model or Config.get_model()
+        self.pool = MCPSessionPool(script or Config.DEFAULT_MCP_SCRIPT, pool_size or Config.get_mcp_pool_size())
+        self.scheduler = FairScheduler(capacity or Config.get_service_max_concurrency(),
+                                       per_session or Config.get_session_max_concurrency())
+        self.max_sessions = max_sessions or Config.get_max_sessions()
+        self.idle_seconds = Config.get_session_idle_seconds() if idle_seconds is None else idle_seconds
+        self.llm_client = AsyncOpenAI(
+            base_url=Config.get_base_url(),
+            api_key=Config.get_api_key(),
+            http_client=get_shared_http_client(),
+        )
+        self.tool_cache = ToolResultCache(Config.get_tool_cache_ttl())
+        self.sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self.turns = 0
+        self._sweeper = None
+
+    async def start(self):
+        await self.pool.start()
+        self._sweeper = asyncio.create_task(self._sweep_idle())
+
+    async def close(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        for session_id in list(self.sessions):
+            self.close_session(session_id)
+        await self.pool.close()
+        await close_shared_http_client()
+
+    def get_session(self, session_id: str, create: bool = True) -> Optional[ChatSession]:
+        session = self.sessions.get(session_id)
+        if session is not None or not create:
+            return session
+
+        if len(self.sessions) >= self.max_sessions:
+            # 回收最久未活动的空闲会话
+            idle = [s for s in self.sessions.values() if not s.busy]
+            if not idle:
+                raise RuntimeError(f"会话数已达上限 ({self.max_sessions})")
+            self.close_session(min(idle, key=lambda s: s.last_active).session_id)
+
+        session = ChatSession(
+            session_id,
+            self.scheduler,
+            model=self.model,
+            mcp_client=self.pool.checkout(),
+            llm_client=self.llm_client,
+            tool_cache=self.tool_cache,
+        )
+        self.sessions[session_id] = session
+        return session
+
+    def close_session(self, session_id: str) -> bool:
+        """关闭会话并归还MCP会话；调用方负责确认会话不在处理对话（服务关闭时除外）"""
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        self.pool.checkin(session.mcp_client)
+        return True
+
+    async def chat(self, session_id: str, message: str) -> dict:
+        session = self.get_session(session_id)
+        async with session.lock:
+            session.last_active = time.monotonic()
+            try:
+                reply = await session.chat(message)
+            finally:
+                session.last_active = time.monotonic()
+        self.turns += 1
+        return {"session_id": session_id, "reply": reply, "timing": session.last_turn_timing}
+
+    async def _sweep_idle(self):
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            if self.idle_seconds <= 0:
+                continue
+            cutoff = time.monotonic() - self.idle_seconds
+            for session in list(self.sessions.values()):
+                if not session.busy and session.last_active < cutoff:
+                    self.close_session(session.session_id)
+                    print(f"[会话回收] {session.session_id} 空闲超过 {self.idle_seconds:.0f} 秒")
+
+    def status(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "busy_sessions": sum(1 for s in self.sessions.values() if s.busy),
+            "turns": self.turns,
+            "mcp_sessions": self.pool.assigned,
+            "scheduler": self.scheduler.stats(),
+            "tool_cache": {"hits": self.tool_cache.hits, "misses": self.tool_cache.misses},
+        }
+
+    async def route(self, method: str, path: str, body: bytes) -> tuple:
+        """处理一个HTTP请求，返回 (状态码, JSON数据)"""
+        if path == "/status":
+            if method != "GET":
+                return 405, {"error": "只支持 GET"}
+            return 200, self.status()
+
+        match = re.match(r"^/sessions/([^/]+)(?:/(messages|clear|stats))?$", path)
+        if not match:
+            return 404, {"error": f"未知路径: {path}"}
+        session_id, action = match.groups()
+        if not SESSION_ID_PATTERN.match(session_id):
+            return 400, {"error": "会话ID只能包含字母、数字、'_'、'-'、'.'，最长64个字符"}
+
+        if action is None:
+            if method != "DELETE":
+                return 405, {"error": "只支持 DELETE"}
+            session = self.get_session(session_id, create=False)
+            if session is not None and session.busy:
+                return 409, {"error": f"会话 {session_id} 正在处理对话，请在对话结束后再关闭"}
+            return 200, {"session_id": session_id, "closed": self.close_session(session_id)}
+
+        if action == "stats":
+            if method != "GET":
+                return 405, {"error": "只支持 GET"}
+            session = self.get_session(session_id, create=False)
+            if session is None:
+                return 404, {"error": f"会话 {session_id} 不存在"}
+            return 200, {"session_id": session_id, "summary": session.telemetry.summary()}
+
+        if method != "POST":
+            return 405, {"error": "只支持 POST"}
+
+        if action == "clear":
+            session = self.get_session(session_id, create=False)
+            if session is None:
+                return 404, {"error": f"会话 {session_id} 不存在"}
+            async with session.lock:
+                session.clear_history()
+            return 200, {"session_id": session_id, "cleared": True}
+
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            return 400, {"error": "请求体必须是JSON"}
+        message = payload.get("message") if isinstance(payload, dict) else None
+        if not isinstance(message, str) or not message.strip():
+            return 400, {"error": "缺少 message"}
+        try:
+            return 200, await self.chat(session_id, message)
+        except RuntimeError as e:
+            return 503, {"error": str(e)}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """极简的HTTP/1.1处理：每个连接处理一个请求"""
+        try:
+            try:
+                request_line = (await read_header_line(reader)).strip()
+                method, target, _ = request_line.split(" ", 2)
+                headers = {}
+                for header_lines in itertools.count():
+                    line = await read_header_line(reader)
+                    if line in ("\r\n", "\n", ""):
+                        break
+                    if header_lines >= MAX_HEADER_LINES:
+                        raise HeaderTooLarge()
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length < 0:
+                    raise ValueError(length)
+            except HeaderTooLarge:
+                status, data = 413, {"error": f"请求行或请求头过长（最多 {MAX_HEADER_LINES} 行，单行不超过缓冲上限）"}
+            except ValueError:
+                status, data = 400, {"error": "无效的HTTP请求"}
+            else:
+                if length > MAX_BODY_BYTES:
+                    status, data = 413, {"error": f"请求体超过 {MAX_BODY_BYTES} 字节"}
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    try:
+                        status, data = await self.route(method.upper(), target.split("?", 1)[0], body)
+                    except Exception as e:
+                        print(f"❌ 处理请求出错: {e}")
+                        status, data = 500, {"error": str(e)}
+
+            payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status} {HTTP_REASONS.get(status, 'OK')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: close\r\n\r\n".encode("latin-1") + payload
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host: str, port: int, **options):
+    service = ChatService(**options)
+    await service.start()
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f"🌐 多会话服务已启动: http://{host}:{port}"
+          f"（MCP会话 {service.pool.size} 个，全局并发 {service.scheduler.capacity}，"
+          f"单会话并发 {service.scheduler.per_session}）")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="多会话对话服务")
+    parser.add_argument("--host", default=Config.CHAT_SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=Config.CHAT_SERVICE_PORT)
+    parser.add_argument("--script", default=None, help="MCP服务器脚本")
+    parser.add_argument("--mcp-sessions", type=int, default=None, help="共享的MCP会话数")
+    parser.add_argument("--max-concurrency", type=int, default=None, help="全局并发的LLM请求和工具调用数")
+    parser.add_argument("--session-concurrency", type=int, default=None, help="单个会话并发的LLM请求和工具调用数")
+    parser.add_argument("--max-sessions", type=int, default=None, help="同时保留的会话数")
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(
+            args.host,
+            args.port,
+            script=args.script,
+            pool_size=args.mcp_sessions,
+            capacity=args.max_concurrency,
+            per_session=args.session_concurrency,
+            max_sessions=args.max_sessions,
+        ))
+    except KeyboardInterrupt:
+        print("\n👋 服务已停止")
+
+
+if __name__ == "__main__":
+    main()
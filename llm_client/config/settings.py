@@ -16,6 +16,37 @@ class Config:
     
     # MCP配置
     DEFAULT_MCP_SCRIPT: str = "../mcp_client/server.py"
+
+    # 智能体循环配置
+    MAX_TOOL_ROUNDS: int = 8          # 单次对话最多执行的工具调用轮数
+    MAX_TURN_SECONDS: float = 300.0   # 单次对话的总耗时上限（秒）
+
+    # HTTP连接池配置（LLM请求共享keep-alive连接）
+    HTTP_MAX_CONNECTIONS: int = 20
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0
+
+    # 遥测配置（JSON Lines格式，设为空字符串则不写文件）
+    TELEMETRY_PATH: str = "telemetry.jsonl"
+
+    # 只读工具结果缓存有效期（秒），设为0禁用缓存
+    TOOL_CACHE_TTL: float = 300.0
+
+    # 工具路由：每次请求只发送与对话相关的工具类别；精简工具描述
+    TOOL_ROUTING: bool = True
+    COMPACT_TOOL_DESCRIPTIONS: bool = True
+
+    # LLM调用录制文件（JSON Lines格式，供 llm_stub.py 离线回放），为空表示不录制
+    LLM_RECORD_PATH: str = ""
+
+    # 多会话服务配置（chat_service.py）
+    CHAT_SERVICE_HOST: str = "127.0.0.1"
+    CHAT_SERVICE_PORT: int = 8780
+    MCP_POOL_SIZE: int = 1              # 共享的MCP会话数（每个会话对应一个MCP服务器进程）
+    SERVICE_MAX_CONCURRENCY: int = 16   # 全部会话同时进行的LLM请求和工具调用总数
+    SESSION_MAX_CONCURRENCY: int = 2    # 单个会话同时进行的LLM请求和工具调用数
+    MAX_SESSIONS: int = 200             # 同时保留的会话数
+    SESSION_IDLE_SECONDS: float = 1800.0  # 会话空闲多久后被回收（秒）
     
     # 系统提示
     SYSTEM_PROMPT: str = """你是一个智能文件管理助手，必须使用提供的工具完成用户的文件操作请求。
@@ -42,4 +73,64 @@ class Config:
     @classmethod
     def get_model(cls) -> str:
         """获取默认模型"""
-        return os.getenv("DEEPSEEK_MODEL", cls.DEFAULT_MODEL)
\ No newline at end of file
+        return os.getenv("DEEPSEEK_MODEL", cls.DEFAULT_MODEL)
+
+    @classmethod
+    def get_max_tool_rounds(cls) -> int:
+        """获取单次对话最多的工具调用轮数"""
+        return max(1, int(os.getenv("VALKYRIE_MAX_TOOL_ROUNDS", cls.MAX_TOOL_ROUNDS)))
+
+    @classmethod
+    def get_max_turn_seconds(cls) -> float:
+        """获取单次对话的总耗时上限（秒）"""
+        return float(os.getenv("VALKYRIE_MAX_TURN_SECONDS", cls.MAX_TURN_SECONDS))
+
+    @classmethod
+    def get_telemetry_path(cls) -> str:
+        """获取遥测文件路径，为空表示不写文件"""
+        return os.getenv("VALKYRIE_TELEMETRY_PATH", cls.TELEMETRY_PATH)
+
+    @classmethod
+    def get_tool_cache_ttl(cls) -> float:
+        """获取只读工具结果缓存有效期（秒）"""
+        return float(os.getenv("VALKYRIE_TOOL_CACHE_TTL", cls.TOOL_CACHE_TTL))
+
+    @classmethod
+    def get_tool_routing(cls) -> bool:
+        """是否按对话内容只发送相关的工具"""
+        return os.getenv("VALKYRIE_TOOL_ROUTING", "1" if cls.TOOL_ROUTING else "0") != "0"
+
+    @classmethod
+    def get_compact_tool_descriptions(cls) -> bool:
+        """是否使用精简的工具描述"""
+        return os.getenv("VALKYRIE_COMPACT_TOOLS", "1" if cls.COMPACT_TOOL_DESCRIPTIONS else "0") != "0"
+
+    @classmethod
+    def get_llm_record_path(cls) -> str:
+        """获取LLM调用录制文件路径，为空表示不录制"""
+        return os.getenv("VALKYRIE_LLM_RECORD", cls.LLM_RECORD_PATH)
+
+    @classmethod
+    def get_mcp_pool_size(cls) -> int:
+        """获取多会话服务共享的MCP会话数"""
+        return max(1, int(os.getenv("VALKYRIE_MCP_POOL_SIZE", cls.MCP_POOL_SIZE)))
+
+    @classmethod
+    def get_service_max_concurrency(cls) -> int:
+        """获取多会话服务全局的并发请求上限"""
+        return max(1, int(os.getenv("VALKYRIE_SERVICE_CONCURRENCY", cls.SERVICE_MAX_CONCURRENCY)))
+
+    @classmethod
+    def get_session_max_concurrency(cls) -> int:
+        """获取单个会话的并发请求上限"""
+        return max(1, int(os.getenv("VALKYRIE_SESSION_CONCURRENCY", cls.SESSION_MAX_CONCURRENCY)))
+
+    @classmethod
+    def get_max_sessions(cls) -> int:
+        """获取多会话服务同时保留的会话数"""
+        return max(1, int(os.getenv("VALKYRIE_MAX_SESSIONS", cls.MAX_SESSIONS)))
+
+    @classmethod
+    def get_session_idle_seconds(cls) -> float:
+        """获取会话空闲回收时间（秒）"""
+        return float(os.getenv("VALKYRIE_SESSION_IDLE_SECONDS", cls.SESSION_IDLE_SECONDS))
@@ -0,0 +1,369 @@
+"""
+LLM 录制/回放模块 - 离线、可复现的对话基准测试
+
+录制：设置 VALKYRIE_LLM_RECORD=cassette.jsonl 后正常使用 app.py，
+每次LLM调用的请求与完整响应（内容、工具调用、usage、首token耗时与总耗时）写入一行JSON。
+
+回放：本地启动 OpenAI 兼容的桩服务器，按请求内容返回录制的响应（支持SSE流式输出），
+把 DEEPSEEK_BASE_URL 指向它即可在没有网络的机器上运行完整的多轮对话（包括真实的MCP工具执行）:
+    python llm_stub.py serve --cassette cassette.jsonl --port 8765
+    DEEPSEEK_BASE_URL=http://127.0.0.1:8765/v1 python app.py
+
+基准测试：启动桩服务器并按录制顺序重放所有用户消息，输出会话统计:
+    python llm_stub.py bench --cassette cassette.jsonl --latency none
+
+请求按“消息内容 + 是否提供工具”匹配录制记录，工具结果消息只比较工具名，
+因此目录内容或时间戳不同导致工具输出变化时仍能匹配。相同请求出现多次时按录制顺序依次返回。
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from config import Config
+
+# 流式输出时每个chunk包含的字符数
+DEFAULT_CHUNK_CHARS = 4
+
+# 回放延迟模式
+LATENCY_MODES = ["recorded", "fixed", "none"]
+
+
+def request_key(messages: List[dict], use_tools: bool) -> str:
+    """计算请求的匹配键，忽略工具调用ID和工具结果内容"""
+    normalized = []
+    for message in messages:
+        item = {"role": message["role"]}
+        if message["role"] == "tool":
+            item["name"] = message.get("name")
+        else:
+            item["content"] = message.get("content")
+        if message.get("tool_calls"):
+            item["tool_calls"] = [[call["function"]["name"], call["function"]["arguments"]]
+                                  for call in message["tool_calls"]]
+        normalized.append(item)
+    payload = json.dumps({"messages": normalized, "tools": bool(use_tools)}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def usage_to_dict(usage) -> Optional[dict]:
+    """把API返回的usage对象转换为可序列化的字典（保留DeepSeek的缓存命中字段）"""
+    if usage is None:
+        return None
+    if hasattr(usage, "model_dump"):
+        return usage.model_dump(exclude_none=True)
+    return dict(usage)
+
+
+class CassetteRecorder:
+    """把每次LLM调用追加写入录制文件（JSON Lines）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, messages: List[dict], use_tools: bool, message: dict, usage, metrics: dict):
+        record = {
+            "key": request_key(messages, use_tools),
+            "request": {"messages": messages, "tools": bool(use_tools)},
+            "response": {
+                "content": message.get("content"),
+                "tool_calls": message.get("tool_calls"),
+                "usage": usage_to_dict(usage),
+            },
+            "timing": {"ttft": round(metrics["ttft"], 4), "total": round(metrics["total"], 4)},
+        }
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"写入录制文件失败: {e}")
+
+
+class Cassette:
+    """读取录制文件，按请求匹配键依次返回录制的响应"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self.records.append(json.loads(line))
+        if not self.records:
+            raise ValueError(f"录制文件 {path} 为空")
+        self._by_key: Dict[str, List[dict]] = defaultdict(list)
+        for record in self.records:
+            self._by_key[record["key"]].append(record)
+        self._queues = {}
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._queues = {key: deque(records) for key, records in self._by_key.items()}
+
+    def match(self, messages: List[dict], use_tools: bool) -> Optional[dict]:
+        key = request_key(messages, use_tools)
+        with self._lock:
+            queue = self._queues.get(key)
+            if not queue:
+                return None
+            # 最后一条保留，相同请求再次出现时重复返回
+            return queue.popleft() if len(queue) > 1 else queue[0]
+
+    def user_turns(self) -> List[tuple]:
+        """
+        按录制顺序返回 [(是否新会话, 用户消息)]
+        最后一条消息是用户消息的请求是一次对话的第一轮，历史中只有系统提示和该消息时是新会话
+        """
+        turns = []
+        for record in self.records:
+            messages = record["request"]["messages"]
+            if messages and messages[-1]["role"] == "user":
+                turns.append((len(messages) <= 2, messages[-1]["content"]))
+        return turns
+
+
+# ---------------------------------------------------------------------------
+# OpenAI 兼容的桩服务器
+# ---------------------------------------------------------------------------
+
+def _split_content(content: str, chunk_chars: int) -> List[str]:
+    return [content[i:i + chunk_chars] for i in range(0, len(content), chunk_chars)]
+
+
+def build_chunks(record: dict, model: str, chunk_chars: int) -> List[dict]:
+    """把录制的响应拆成流式chunk，最后一个chunk只携带usage"""
+    response = record["response"]
+    completion_id = f"chatcmpl-stub-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+
+    def chunk(delta=None, finish_reason=None, usage=None):
+        choices = [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        data = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                "model": model, "choices": choices}
+        if usage is not None:
+            data["usage"] = usage
+        return data
+
+    chunks = [chunk({"role": "assistant", "content": ""})]
+    for piece in _split_content(response.get("content") or "", chunk_chars):
+        chunks.append(chunk({"content": piece}))
+    for index, call in enumerate(response.get("tool_calls") or []):
+        chunks.append(chunk({"tool_calls": [{
+            "index": index,
+            "id": call.get("id") or f"call_stub_{index}",
+            "type": "function",
+            "function": {"name": call["function"]["name"], "arguments": call["function"]["arguments"]},
+        }]}))
+    chunks.append(chunk({}, "tool_calls" if response.get("tool_calls") else "stop"))
+    if response.get("usage"):
+        chunks.append(chunk(usage=response["usage"]))
+    return chunks
+
+
+def build_completion(record: dict, model: str) -> dict:
+    """非流式请求的完整响应"""
+    response = record["response"]
+    message = {"role": "assistant", "content": response.get("content")}
+    if response.get("tool_calls"):
+        message["tool_calls"] = response["tool_calls"]
+    return {
+        "id": f"chatcmpl-stub-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message,
+                     "finish_reason": "tool_calls" if response.get("tool_calls") else "stop"}],
+        "usage": response.get("usage"),
+    }
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    OpenAI 兼容的本地桩服务器
+    :param latency: recorded 按录制的首token耗时和总耗时回放；fixed 使用 ttft 和 chunk_interval；none 不等待
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, cassette: Cassette, latency: str = "recorded", ttft: float = 0.2,
+                 chunk_interval: float = 0.02, chunk_chars: int = DEFAULT_CHUNK_CHARS):
+        super().__init__(address, StubRequestHandler)
+        self.cassette = cassette
+        self.latency = latency
+        self.ttft = ttft
+        self.chunk_interval = chunk_interval
+        self.chunk_chars = chunk_chars
+        self.served = 0
+        self.misses = 0
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def delays(self, record: dict, chunk_count: int) -> tuple:
+        """返回 (首个chunk前的等待, 之后每个chunk之间的间隔)"""
+        if self.latency == "none":
+            return 0.0, 0.0
+        if self.latency == "fixed":
+            return self.ttft, self.chunk_interval
+        timing = record.get("timing") or {}
+        ttft = timing.get("ttft", 0.0)
+        rest = max(0.0, timing.get("total", ttft) - ttft)
+        return ttft, rest / max(1, chunk_count - 1)
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keep-alive，流式响应使用分块传输编码
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, data: dict):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": Config.get_model(), "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": f"未知路径 {self.path}", "type": "not_found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"未知路径 {self.path}", "type": "not_found"}})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+            messages = body["messages"]
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {"error": {"message": f"请求无效: {e}", "type": "invalid_request_error"}})
+            return
+
+        server: StubServer = self.server
+        record = server.cassette.match(messages, bool(body.get("tools")))
+        if record is None:
+            server.misses += 1
+            self._send_json(404, {"error": {"message": "录制文件中没有与该请求匹配的记录", "type": "cassette_miss"}})
+            return
+        server.served += 1
+
+        model = body.get("model") or Config.get_model()
+        if not body.get("stream"):
+            first_delay, interval = server.delays(record, 1)
+            time.sleep(first_delay)
+            self._send_json(200, build_completion(record, model))
+            return
+
+        chunks = build_chunks(record, model, server.chunk_chars)
+        first_delay, interval = server.delays(record, len(chunks))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(first_delay)
+        for index, data in enumerate(chunks):
+            if index and interval:
+                time.sleep(interval)
+            self._write_chunk(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+
+def start_stub_server(cassette: Cassette, host: str = "127.0.0.1", port: int = 0, **options) -> StubServer:
+    """在后台线程中启动桩服务器，port 为0时自动选择空闲端口"""
+    server = StubServer((host, port), cassette, **options)
+    threading.Thread(target=server.serve_forever, name="llm-stub", daemon=True).start()
+    return server
+
+
+# ---------------------------------------------------------------------------
+# 命令行
+# ---------------------------------------------------------------------------
+
+async def run_bench(server: StubServer, cassette: Cassette, script: str = None) -> str:
+    """按录制顺序重放所有用户消息，返回会话统计"""
+    from app import UserClient, close_shared_http_client
+
+    user_client = UserClient(script=script, base_url=server.base_url, api_key="stub", record_path="")
+    user_client.telemetry.path = ""
+    turns = cassette.user_turns()
+    started = time.perf_counter()
+    try:
+        for new_session, user_message in turns:
+            if new_session and len(user_client.conversation_history) > 1:
+                user_client.clear_history()
+            await user_client.chat(user_message)
+    finally:
+        await close_shared_http_client()
+    elapsed = time.perf_counter() - started
+
+    summary = user_client.telemetry.summary()
+    summary += (f"\n重放 {len(turns)} 次对话，总耗时 {elapsed:.2f} 秒；"
+                f"桩服务器返回 {server.served} 次，未匹配 {server.misses} 次")
+    return summary
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="LLM 录制回放桩服务器")
+    parser.add_argument("command", choices=["serve", "bench"],
+                        help="serve: 启动桩服务器；bench: 启动桩服务器并重放录制的全部对话")
+    parser.add_argument("--cassette", required=True, help="录制文件（VALKYRIE_LLM_RECORD 生成的 JSONL）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="serve 使用的端口（bench 自动选择）")
+    parser.add_argument("--latency", choices=LATENCY_MODES, default="recorded",
+                        help="recorded: 按录制耗时回放；fixed: 使用 --ttft/--chunk-interval；none: 不等待")
+    parser.add_argument("--ttft", type=float, default=0.2, help="fixed 模式下的首token耗时（秒）")
+    parser.add_argument("--chunk-interval", type=float, default=0.02, help="fixed 模式下chunk之间的间隔（秒）")
+    parser.add_argument("--chunk-chars", type=int, default=DEFAULT_CHUNK_CHARS, help="每个流式chunk的字符数")
+    parser.add_argument("--script", help="bench 使用的MCP服务器脚本（默认与 app.py 相同）")
+    args = parser.parse_args(argv)
+
+    cassette = Cassette(args.cassette)
+    options = {"latency": args.latency, "ttft": args.ttft, "chunk_interval": args.chunk_interval,
+               "chunk_chars": max(1, args.chunk_chars)}
+
+    if args.command == "serve":
+        server = StubServer((args.host, args.port), cassette, **options)
+        print(f"🧪 桩服务器已启动: {server.base_url}（{len(cassette.records)} 条录制记录，延迟模式 {args.latency}）")
+        print(f"使用方法: DEEPSEEK_BASE_URL={server.base_url} python app.py")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print(f"\n已返回 {server.served} 次，未匹配 {server.misses} 次")
+        finally:
+            server.server_close()
+        return
+
+    server = start_stub_server(cassette, args.host, 0, **options)
+    try:
+        print(asyncio.run(run_bench(server, cassette, args.script)))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
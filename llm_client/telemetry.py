@@ -0,0 +1,161 @@
+"""
+对话遥测模块 - 记录每次对话中LLM调用、工具调用的耗时与token用量
+"""
+
+import json
+import math
+import time
+from datetime import datetime
+from typing import Optional
+
+
+def percentile(values, pct: float) -> float:
+    """计算百分位数（最近秩法），空列表返回0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def extract_usage(usage) -> dict:
+    """
+    从API返回的usage中提取token统计
+    缓存命中token兼容DeepSeek（prompt_cache_hit_tokens）和OpenAI（prompt_tokens_details.cached_tokens）两种格式
+    """
+    if usage is None:
+        return {}
+
+    cached_tokens = getattr(usage, "prompt_cache_hit_tokens", None)
+    if cached_tokens is None:
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", None) if details else None
+
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+        "cached_tokens": cached_tokens,
+    }
+
+
+class TurnTelemetry:
+    """单次对话（一条用户消息）的遥测记录"""
+
+    def __init__(self, user_message: str, history_length: int):
+        self.started_at = time.time()
+        self.user_message = user_message
+        self.history_length = history_length
+        self.llm_calls = []
+        self.tool_calls = []
+
+    def record_llm_call(self, round_index: int, metrics: dict, message_count: int):
+        """记录一次LLM调用的耗时与token用量"""
+        self.llm_calls.append({
+            "round": round_index,
+            "messages": message_count,
+            "tools": metrics.get("tools"),
+            "ttft": round(metrics["ttft"], 4),
+            "latency": round(metrics["total"], 4),
+            "prompt_tokens": metrics.get("prompt_tokens"),
+            "completion_tokens": metrics.get("completion_tokens"),
+            "cached_tokens": metrics.get("cached_tokens"),
+        })
+
+    def record_tool_call(self, tool_name: str, latency: float, ok: bool, result_chars: int, cached: bool = False,
+                         arguments: dict = None):
+        """
+        记录一次工具调用的耗时与结果大小
+        :param arguments: 调用参数，记录后 mcp_client/client.py 可以按真实会话回放负载
+        """
+        self.tool_calls.append({
+            "tool": tool_name,
+            "latency": round(latency, 4),
+            "ok": ok,
+            "cached": cached,
+            "result_chars": result_chars,
+            "arguments": arguments,
+        })
+
+    def to_dict(self, ttft: float, total: float) -> dict:
+        return {
+            "timestamp": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "user_message_chars": len(self.user_message),
+            "history_length": self.history_length,
+            "ttft": round(ttft, 4),
+            "total": round(total, 4),
+            "llm_calls": self.llm_calls,
+            "tool_calls": self.tool_calls,
+        }
+
+
+class Telemetry:
+    """会话遥测：每次对话写入一行JSON（JSON Lines），并在内存中保留记录供 stats 命令汇总"""
+
+    def __init__(self, path: Optional[str] = None):
+        # path 为空表示只在内存中统计，不写文件
+        self.path = path
+        self.turns = []
+
+    def start_turn(self, user_message: str, history_length: int) -> TurnTelemetry:
+        return TurnTelemetry(user_message, history_length)
+
+    def finish_turn(self, turn: TurnTelemetry, ttft: float, total: float) -> dict:
+        record = turn.to_dict(ttft, total)
+        self.turns.append(record)
+
+        if self.path:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            except OSError as e:
+                print(f"写入遥测文件失败: {e}")
+
+        return record
+
+    def summary(self) -> str:
+        """生成本次会话的统计摘要"""
+        if not self.turns:
+            return "暂无统计数据"
+
+        turn_totals = [t["total"] for t in self.turns]
+        turn_ttfts = [t["ttft"] for t in self.turns]
+        llm_calls = [c for t in self.turns for c in t["llm_calls"]]
+        tool_calls = [c for t in self.turns for c in t["tool_calls"]]
+
+        llm_latencies = [c["latency"] for c in llm_calls]
+        prompt_tokens = sum(c["prompt_tokens"] or 0 for c in llm_calls)
+        completion_tokens = sum(c["completion_tokens"] or 0 for c in llm_calls)
+        cached_tokens = sum(c["cached_tokens"] or 0 for c in llm_calls)
+        llm_time = sum(llm_latencies)
+        tool_time = sum(c["latency"] for c in tool_calls)
+
+        lines = ["=== 会话统计 ==="]
+        lines.append(f"对话次数: {len(self.turns)}")
+        lines.append(
+            f"单次对话耗时: 平均 {sum(turn_totals) / len(turn_totals):.2f}s, "
+            f"p50 {percentile(turn_totals, 50):.2f}s, p95 {percentile(turn_totals, 95):.2f}s"
+        )
+        lines.append(f"首token耗时: p50 {percentile(turn_ttfts, 50):.2f}s, p95 {percentile(turn_ttfts, 95):.2f}s")
+        lines.append(
+            f"LLM调用: {len(llm_calls)} 次, 共 {llm_time:.2f}s, "
+            f"p50 {percentile(llm_latencies, 50):.2f}s, p95 {percentile(llm_latencies, 95):.2f}s"
+        )
+        lines.append(f"Token: 输入 {prompt_tokens}, 输出 {completion_tokens}")
+        if prompt_tokens:
+            lines.append(f"缓存命中: {cached_tokens} token ({cached_tokens / prompt_tokens:.1%})")
+        cache_hits = sum(1 for c in tool_calls if c.get("cached"))
+        lines.append(f"工具调用: {len(tool_calls)} 次 (缓存命中 {cache_hits} 次), 共 {tool_time:.2f}s")
+
+        by_tool = {}
+        for call in tool_calls:
+            by_tool.setdefault(call["tool"], []).append(call)
+        for tool_name, calls in sorted(by_tool.items(), key=lambda item: -sum(c["latency"] for c in item[1])):
+            latencies = [c["latency"] for c in calls]
+            errors = sum(1 for c in calls if not c["ok"])
+            lines.append(
+                f"  - {tool_name}: {len(calls)} 次, 平均 {sum(latencies) / len(latencies):.3f}s, "
+                f"p95 {percentile(latencies, 95):.3f}s, 失败 {errors} 次"
+            )
+
+        lines.append("================")
+        return "\n".join(lines)
@@ -0,0 +1,161 @@
+"""
+工具结果缓存模块 - 会话内缓存只读工具的调用结果，变更类工具触及重叠路径时自动失效
+"""
+
+import json
+import os
+import time
+from typing import Optional
+
+# 只读工具：结果只取决于参数和磁盘状态，可以缓存
+READ_ONLY_TOOLS = {
+    "list_files",
+    "find_files",
+    "search_content",
+    "analyze_directory",
+}
+
+# 可能携带路径的参数名
+PATH_ARGUMENTS = (
+    "directory",
+    "source_directory",
+    "target_directory",
+    "file_path",
+    "file_paths",
+    "source_items",
+    "output_json_path",
+    "output_path",
+    "archive_path",
+    "target_root",
+    "output_directory",
+)
+
+
+def normalize_path(path: str) -> str:
+    return os.path.normcase(os.path.abspath(os.path.expanduser(path)))
+
+
+# 可以是JSON字符串的路径列表参数（与批量重命名工具的解析方式一致）
+JSON_LIST_ARGUMENTS = ("file_paths",)
+
+
+def _json_list(value: str) -> Optional[list]:
+    """解析JSON字符串形式的路径列表：JSON 列表或 {"file_paths": [...]}，非JSON文本视为单个路径；无法识别返回 None"""
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        return [value]
+    if isinstance(parsed, dict) and "file_paths" in parsed:
+        parsed = parsed["file_paths"]
+    if isinstance(parsed, str):
+        return [parsed]
+    if isinstance(parsed, list) and all(isinstance(v, str) for v in parsed):
+        return parsed
+    return None
+
+
+def extract_paths(arguments: dict) -> Optional[list]:
+    """从工具参数中提取规范化后的路径列表，存在无法识别的路径参数时返回 None"""
+    paths = []
+    for name in PATH_ARGUMENTS:
+        value = arguments.get(name)
+        if isinstance(value, str) and name in JSON_LIST_ARGUMENTS:
+            values = _json_list(value)
+            if values is None:
+                return None
+        elif isinstance(value, str):
+            values = [value]
+        elif isinstance(value, (list, tuple)):
+            values = [v for v in value if isinstance(v, str)]
+        else:
+            continue
+        paths.extend(normalize_path(v) for v in values if v)
+    return paths
+
+
+def paths_overlap(a: str, b: str) -> bool:
+    """两个路径相同，或一个是另一个的祖先目录"""
+    if a == b:
+        return True
+    return a.startswith(b.rstrip(os.sep) + os.sep) or b.startswith(a.rstrip(os.sep) + os.sep)
+
+
+class ToolResultCache:
+    """
+    会话级只读工具结果缓存
+    - 键为工具名 + 规范化的JSON参数
+    - 非只读工具执行前后按路径重叠关系失效缓存，无法识别路径时清空全部缓存
+    - 每次失效都会递增 generation，执行期间发生过失效的读取结果不写入缓存
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        # ttl 为缓存有效期（秒），用于兜底会话外部对磁盘的修改；<=0 表示禁用缓存
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    @staticmethod
+    def is_cacheable(tool_name: str) -> bool:
+        return tool_name in READ_ONLY_TOOLS
+
+    @staticmethod
+    def make_key(tool_name: str, arguments: dict) -> str:
+        return tool_name + ":" + json.dumps(arguments, sort_keys=True, ensure_ascii=False)
+
+    def get(self, tool_name: str, arguments: dict):
+        """命中返回缓存结果，未命中或已过期返回 None"""
+        if not self.enabled or not self.is_cacheable(tool_name):
+            return None
+
+        key = self.make_key(tool_name, arguments)
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry["stored_at"] > self.ttl:
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry["result"]
+
+    def put(self, tool_name: str, arguments: dict, result, generation: Optional[int] = None):
+        """
+        写入缓存
+        :param generation: 调用开始时的 generation，若期间发生过失效则放弃写入
+        """
+        if not self.enabled or not self.is_cacheable(tool_name):
+            return
+        if generation is not None and generation != self.generation:
+            return
+
+        self._entries[self.make_key(tool_name, arguments)] = {
+            "result": result,
+            "paths": extract_paths(arguments) or [],
+            "stored_at": time.monotonic(),
+        }
+
+    def invalidate(self, tool_name: str, arguments: dict):
+        """非只读工具触及路径时，失效所有路径重叠的缓存项"""
+        if self.is_cacheable(tool_name):
+            return
+
+        self.generation += 1
+        mutated_paths = extract_paths(arguments)
+        # 没有可识别的路径时无法判断影响范围，清空全部缓存
+        if not mutated_paths:
+            self._entries.clear()
+            return
+
+        for key in list(self._entries):
+            cached_paths = self._entries[key]["paths"]
+            if not cached_paths or any(paths_overlap(c, m) for c in cached_paths for m in mutated_paths):
+                del self._entries[key]
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
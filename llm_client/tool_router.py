@@ -0,0 +1,243 @@
+"""
+工具路由模块 - 每次请求只发送与当前对话相关的工具，缩短提示词、降低首token耗时
+
+按最近几条用户消息中的关键词匹配工具类别，只发送常用工具和匹配到的类别；
+同时提供伪工具 request_tools，模型发现缺少工具时可以调用它启用其他类别（在本地处理，不经过MCP）。
+不属于任何类别的工具（如新增的工具）始终发送。
+
+compact_tool 生成精简的工具定义：描述只保留第一行，参数说明移入 JSON Schema 的属性描述。
+"""
+
+import copy
+import json
+import re
+from typing import Dict, List
+
+# 工具类别：包含的工具、说明和触发关键词（关键词按小写匹配）
+TOOL_CATEGORIES = {
+    "browse": {
+        "description": "列出、查找文件，搜索文件内容，分析目录空间占用",
+        "tools": ["list_files", "find_files", "search_content", "analyze_directory"],
+        "keywords": ["列出", "查看", "看看", "有哪些", "查找", "找", "搜索", "包含", "内容", "分析", "占用", "统计",
+                     "多大", "list", "find", "search", "grep", "analy"],
+    },
+    "move": {
+        "description": "移动文件或文件夹",
+        "tools": ["move_files", "move_files_by_pattern"],
+        "keywords": ["移动", "移到", "挪", "转移", "放到", "剪切", "move"],
+    },
+    "delete": {
+        "description": "删除文件、按模式批量删除、清理旧文件",
+        "tools": ["delete_files", "delete_files_by_pattern", "safe_cleanup"],
+        "keywords": ["删除", "删掉", "删", "清理", "清除", "清空", "delete", "remove", "clean"],
+    },
+    "rename": {
+        "description": "重命名单个或批量文件",
+        "tools": ["rename_file", "batch_rename_files", "rename_with_rules"],
+        "keywords": ["重命名", "改名", "命名", "名字", "名称", "前缀", "后缀", "rename"],
+    },
+    "organize": {
+        "description": "整理目录、同步目录、多步批处理流水线",
+        "tools": ["organize_directory", "sync_directories", "run_pipeline"],
+        "keywords": ["整理", "分类", "归类", "同步", "备份", "镜像", "批处理", "流水线", "organize", "sync", "pipeline"],
+    },
+    "archive": {
+        "description": "打包压缩文件、解压归档",
+        "tools": ["archive_files", "extract_archive"],
+        "keywords": ["压缩", "打包", "解压", "归档", "zip", "tar", "archive", "extract"],
+    },
+    "ocr": {
+        "description": "识别图片或PDF中的文字",
+        "tools": ["ocr_recognize", "ocr_recognize_batch"],
+        "keywords": ["识别", "ocr", "图片", "照片", "扫描", "pdf", "文字", "提取"],
+    },
+    "disk": {
+        "description": "磁盘空间、目录空间、大文件、内存使用情况",
+        "tools": ["get_system_disk_usage", "get_directory_space_usage", "find_large_files", "get_system_memory_usage"],
+        "keywords": ["磁盘", "硬盘", "空间", "容量", "大文件", "内存", "disk", "memory"],
+    },
+    "jobs": {
+        "description": "后台任务：启动耗时操作、查询进度、等待结果、取消",
+        "tools": ["start_job", "get_job", "wait_job", "cancel_job", "list_jobs"],
+        "keywords": ["后台", "任务", "进度", "等待", "取消", "job"],
+    },
+    "profile": {
+        "description": "性能剖析：为工具调用开启剖析、查看剖析结果和热点函数",
+        "tools": ["set_profiling", "list_profiles", "get_profile_hotspots"],
+        "keywords": ["剖析", "性能", "热点", "为什么慢", "变慢", "profil"],
+    },
+    "io": {
+        "description": "查看和调整磁盘I/O并发，查看修改操作的路径锁",
+        "tools": ["get_io_scheduler_status", "set_io_concurrency", "get_path_locks"],
+        "keywords": ["并发", "调度", "i/o", "锁", "卡住", "lock"],
+    },
+}
+
+# 始终发送的工具
+CORE_TOOLS = {"list_files", "find_files"}
+
+# 关键词匹配覆盖的最近用户消息条数（后续消息常常省略操作对象，如“把它们删掉”）
+ROUTING_WINDOW = 3
+
+# 启用其他类别的伪工具
+EXPAND_TOOL_NAME = "request_tools"
+
+# 精简描述中单个参数说明的最大长度
+MAX_PARAM_DESCRIPTION = 120
+
+_PARAM_PATTERN = re.compile(r"^\s*:param\s+(\w+)\s*:\s*(.*)$")
+_OPTION_KEY_PATTERN = re.compile(r'"(\w+)"\s*:')
+
+
+def compact_description(text: str) -> str:
+    """
+    精简多行的参数说明：保留第一行，"- "开头的选项列表只保留选项名
+    如 filters 的十几行说明精简为“额外过滤条件（可选），支持的键：exclude, regex, min_size, ...”
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines:
+        return ""
+    summary = lines[0]
+    keys = []
+    for line in lines[1:]:
+        if not line.startswith("-"):
+            continue
+        # 冒号前的所有带引号的名称（如 "min_size" / "max_size":），以及行内其他 "名称": 形式的选项
+        head = line.split('":', 1)[0] + '"' if '":' in line else ""
+        for key in re.findall(r'"(\w+)"', head) + _OPTION_KEY_PATTERN.findall(line):
+            if key not in keys:
+                keys.append(key)
+    if keys:
+        summary = summary.rstrip("：:") + "：" + ", ".join(keys)
+    if len(summary) > MAX_PARAM_DESCRIPTION:
+        summary = summary[:MAX_PARAM_DESCRIPTION] + "…"
+    return summary
+
+
+def compact_tool(tool: dict) -> dict:
+    """
+    生成精简的工具定义：描述只保留第一行，参数说明精简后放在参数的 description 中（缺少时从 :param 提取），
+    并去掉 Schema 中的 title 和为 null 的默认值
+    """
+    tool = copy.deepcopy(tool)
+    function = tool["function"]
+    lines = [line.strip() for line in (function.get("description") or "").splitlines()]
+    summary = next((line for line in lines if line), "")
+
+    # 参数说明可能跨多行，续行附加到上一个参数
+    param_docs: Dict[str, str] = {}
+    current = None
+    for line in lines:
+        match = _PARAM_PATTERN.match(line)
+        if match:
+            current = match.group(1)
+            param_docs[current] = match.group(2)
+        elif line.startswith(":"):
+            current = None
+        elif current and line:
+            param_docs[current] += "\n" + line
+
+    def strip_schema(schema):
+        if isinstance(schema, dict):
+            schema.pop("title", None)
+            if "default" in schema and schema["default"] is None:
+                del schema["default"]
+            for value in schema.values():
+                strip_schema(value)
+        elif isinstance(schema, list):
+            for value in schema:
+                strip_schema(value)
+
+    parameters = function.get("parameters") or {}
+    strip_schema(parameters)
+    for name, schema in (parameters.get("properties") or {}).items():
+        if not isinstance(schema, dict):
+            continue
+        doc = schema.get("description") or param_docs.get(name)
+        if doc:
+            schema["description"] = compact_description(doc)
+
+    function["description"] = summary
+    return tool
+
+
+def schema_chars(tools: List[dict]) -> int:
+    """工具定义序列化后的字符数，用于估算提示词开销"""
+    return len(json.dumps(tools, ensure_ascii=False))
+
+
+class ToolRouter:
+    """按对话内容为每次请求选择工具子集"""
+
+    def __init__(self, tools: List[dict]):
+        self.tools = tools
+        self.by_name = {tool["function"]["name"]: tool for tool in tools}
+        self.categories = {
+            name: {**category, "tools": [t for t in category["tools"] if t in self.by_name]}
+            for name, category in TOOL_CATEGORIES.items()
+        }
+        self.categories = {name: category for name, category in self.categories.items() if category["tools"]}
+        categorized = {t for category in self.categories.values() for t in category["tools"]}
+        # 未归类的工具始终发送，避免新增工具被路由层隐藏
+        self.always = [name for name in self.by_name if name in CORE_TOOLS or name not in categorized]
+        # 通过 request_tools 启用的类别，在整个会话中保持启用
+        self.requested = set()
+        self.expand_tool = self._build_expand_tool()
+
+    def _build_expand_tool(self) -> dict:
+        lines = [f"{name}: {category['description']}" for name, category in self.categories.items()]
+        return {
+            "type": "function",
+            "function": {
+                "name": EXPAND_TOOL_NAME,
+                "description": "当前可用工具不足以完成任务时，启用其他类别的工具（启用后下一步即可调用）。类别: "
+                               + "；".join(lines),
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "categories": {
+                            "type": "array",
+                            "items": {"type": "string", "enum": list(self.categories)},
+                            "description": "要启用的类别",
+                        },
+                    },
+                    "required": ["categories"],
+                },
+            },
+        }
+
+    def match_categories(self, text: str) -> set:
+        text = text.lower()
+        return {name for name, category in self.categories.items()
+                if any(keyword in text for keyword in category["keywords"])}
+
+    def select(self, conversation_history: List[dict]) -> List[dict]:
+        """根据最近的用户消息和已启用的类别返回本次请求的工具列表（顺序与完整列表一致）"""
+        user_messages = [m.get("content") or "" for m in conversation_history if m["role"] == "user"]
+        active = set(self.requested)
+        for content in user_messages[-ROUTING_WINDOW:]:
+            active |= self.match_categories(content)
+
+        names = set(self.always)
+        for category in active:
+            names.update(self.categories[category]["tools"])
+
+        selected = [tool for name, tool in self.by_name.items() if name in names]
+        if len(selected) < len(self.tools):
+            selected.append(self.expand_tool)
+        return selected
+
+    def expand(self, arguments: dict) -> str:
+        """处理 request_tools 调用"""
+        requested = arguments.get("categories") or []
+        if isinstance(requested, str):
+            requested = [requested]
+        unknown = [name for name in requested if name not in self.categories]
+        if unknown:
+            return f"错误: 未知的工具类别 {', '.join(map(str, unknown))}，可选: {', '.join(self.categories)}"
+        self.requested.update(requested)
+        tools = [t for name in requested for t in self.categories[name]["tools"]]
+        return f"已启用工具: {', '.join(tools)}"
+
+    def reset(self):
+        self.requested.clear()
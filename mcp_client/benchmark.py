@@ -0,0 +1,611 @@
+"""
+文件工具基准测试
+
+在临时目录中生成可复现的合成目录树（wide / deep / many_small / few_huge），
+按多个规模逐个计时所有文件工具，记录耗时、文件/秒和峰值内存增量（RSS），
+并可与保存的基线对比，标记性能回退。
+
+用法：
+    python benchmark.py                                  # 默认规模 1,4，每项重复3次
+    python benchmark.py --shapes wide,deep --scales 1,10
+    python benchmark.py --tools find_files,search_content
+    python benchmark.py --save-baseline benchmark_baseline.json
+    python benchmark.py --baseline benchmark_baseline.json --threshold 0.2
+    python benchmark.py --syscalls --tools list_files,find_files    # 同时统计文件系统调用次数
+
+每次测量在独立的子进程中执行，峰值RSS不受其他测量项影响；内存按子进程加载工具后的基准RSS计算增量，
+不包含解释器和模块本身的占用；
+会修改目录树的工具每次重复前都会重新生成目录树，目录树生成不计入耗时。
+存在回退时进程以退出码 1 结束，便于在CI中使用。
+
+--syscalls 在子进程中替换 os 模块的文件系统函数（stat / open / scandir / rename / unlink ...）
+和内置 open 进行计数，不依赖 strace；计数本身会略微增加耗时。
+"""
+
+import argparse
+import builtins
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from collections import Counter
+from typing import Callable, Dict, List, NamedTuple
+
+# 生成文件内容使用的随机种子，保证不同机器/不同次运行的目录树完全一致
+TREE_SEED = 20240601
+
+# 文本文件中用于 search_content 的关键字，约每 50 行出现一次
+NEEDLE = "needle"
+
+# 合成文件的扩展名分布
+EXTENSIONS = ["txt", "txt", "log", "log", "tmp", "py", "md", "jpg"]
+
+# 默认参数
+DEFAULT_SHAPES = ["wide", "deep", "many_small", "few_huge"]
+DEFAULT_SCALES = [1, 4]
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.2
+
+# 耗时过短时相对误差太大，低于该值的测量不参与回退判断
+MIN_COMPARABLE_SECONDS = 0.01
+
+
+# ---------------------------------------------------------------------------
+# 合成目录树
+# ---------------------------------------------------------------------------
+
+class TreeStats(NamedTuple):
+    files: int
+    dirs: int
+    bytes: int
+
+
+def _text_block(rng: random.Random, size: int) -> bytes:
+    lines = []
+    total = 0
+    while total < size:
+        if rng.random() < 0.02:
+            line = f"{rng.randrange(10 ** 6)} {NEEDLE} found here"
+        else:
+            line = " ".join(rng.choice(("alpha", "beta", "gamma", "delta", "log", "data", "value"))
+                            for _ in range(rng.randint(3, 12)))
+        lines.append(line)
+        total += len(line) + 1
+    return ("\n".join(lines) + "\n").encode()[:size]
+
+
+def _write_file(path: str, rng: random.Random, size: int, ext: str, binary_block: bytes):
+    with open(path, "wb") as f:
+        if ext == "jpg" or size > 1024 * 1024:
+            # 二进制/大文件：重复一个随机块，避免生成大量随机数
+            remaining = size
+            while remaining > 0:
+                chunk = binary_block[:remaining]
+                f.write(chunk)
+                remaining -= len(chunk)
+        else:
+            f.write(_text_block(rng, size))
+    # 修改时间分布在最近两年内，使按时间的过滤条件有意义
+    mtime = time.time() - rng.uniform(0, 730) * 86400
+    os.utime(path, (mtime, mtime))
+
+
+def _file_name(rng: random.Random, index: int) -> str:
+    return f"file_{index:06d}_{rng.randrange(16 ** 4):04x}.{rng.choice(EXTENSIONS)}"
+
+
+def _layout(shape: str, scale: int) -> List[tuple]:
+    """返回 [(相对目录, 文件数, 最小大小, 最大大小)]"""
+    if shape == "wide":
+        # 一个目录下大量文件，外加大量空的同级目录
+        return [("", 2000 * scale, 64, 8 * 1024)] + [(f"dir_{i:04d}", 0, 0, 0) for i in range(100 * scale)]
+    if shape == "deep":
+        # 一条很深的目录链，每层少量文件
+        layout = []
+        path = ""
+        for level in range(100):
+            path = os.path.join(path, f"d{level:03d}")
+            layout.append((path, 10 * scale, 64, 8 * 1024))
+        return layout
+    if shape == "many_small":
+        # 大量目录，每个目录多个小文件
+        return [(os.path.join(f"group_{i // 20:03d}", f"dir_{i:04d}"), 50, 0, 4 * 1024) for i in range(100 * scale)]
+    if shape == "few_huge":
+        # 少量大文件
+        return [("", 4, 16 * 1024 * 1024 * scale, 16 * 1024 * 1024 * scale)]
+    raise ValueError(f"未知的目录树形状: {shape}")
+
+
+def generate_tree(root: str, shape: str, scale: int) -> TreeStats:
+    """在 root 下生成目录树，相同的 shape/scale 总是生成相同的树"""
+    rng = random.Random(f"{TREE_SEED}:{shape}:{scale}")
+    binary_block = random.Random(TREE_SEED).randbytes(1024 * 1024)
+    files = dirs = total = 0
+    index = 0
+    os.makedirs(root, exist_ok=True)
+    for rel_dir, count, min_size, max_size in _layout(shape, scale):
+        directory = os.path.join(root, rel_dir)
+        if rel_dir:
+            os.makedirs(directory, exist_ok=True)
+            dirs += 1
+        for _ in range(count):
+            size = rng.randint(min_size, max_size)
+            name = _file_name(rng, index)
+            _write_file(os.path.join(directory, name), rng, size, name.rsplit(".", 1)[1], binary_block)
+            index += 1
+            files += 1
+            total += size
+    return TreeStats(files, dirs, total)
+
+
+def _tree_files(root: str, pattern_ext: str = None, limit: int = None) -> List[str]:
+    paths = []
+    for current, _, names in os.walk(root):
+        for name in sorted(names):
+            if pattern_ext is None or name.endswith("." + pattern_ext):
+                paths.append(os.path.join(current, name))
+    paths.sort()
+    return paths[:limit] if limit else paths
+
+
+# ---------------------------------------------------------------------------
+# 测量项
+# ---------------------------------------------------------------------------
+
+class Case(NamedTuple):
+    name: str                               # 测量项名称
+    tool: str                               # 工具函数名
+    mutating: bool                          # 是否修改目录树（每次重复前需要重新生成）
+    build: Callable[[str, str], Dict]       # (目录树根目录, 临时工作目录) -> 工具参数
+    count: Callable[[str], int] = None      # 目录树根目录 -> 实际处理的条目数（None 表示按参数或整棵树计）
+
+
+def _count_top_level(root: str) -> int:
+    """list_files 只列出顶层的文件和文件夹"""
+    return len(os.listdir(root))
+
+
+def _count_files(*extensions: str, older_than_days: float = None) -> Callable[[str], int]:
+    """按扩展名（及修改时间）统计目录树中会被处理的文件数，与对应测量项的模式一致"""
+    def count(root: str) -> int:
+        cutoff = time.time() - older_than_days * 86400 if older_than_days is not None else None
+        total = 0
+        for current, _, names in os.walk(root):
+            for name in names:
+                if extensions and not name.endswith(tuple("." + ext for ext in extensions)):
+                    continue
+                if cutoff is not None and os.stat(os.path.join(current, name)).st_mtime >= cutoff:
+                    continue
+                total += 1
+        return total
+    return count
+
+
+def _build_extract(root: str, work: str) -> Dict:
+    archive = os.path.join(work, "tree.zip")
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        for path in _tree_files(root):
+            zf.write(path, os.path.relpath(path, root))
+    return {"archive_path": archive, "target_directory": os.path.join(work, "extracted")}
+
+
+CASES = [
+    Case("list_files", "list_files", False,
+         lambda root, work: {"directory": root}, _count_top_level),
+    Case("find_files", "find_files", False,
+         lambda root, work: {"directory": root, "pattern": "*.txt", "filters": {"recursive": True}}),
+    Case("find_files_filtered", "find_files", False,
+         lambda root, work: {"directory": root, "pattern": ["*.log", "*.tmp"],
+                             "filters": {"recursive": True, "min_size": 1024, "older_than_days": 180}}),
+    Case("search_content", "search_content", False,
+         lambda root, work: {"directory": root, "query": NEEDLE, "max_matches": 1000}),
+    Case("analyze_directory", "analyze_directory", False,
+         lambda root, work: {"directory": root}),
+    Case("move_files", "move_files", True,
+         lambda root, work: {"source_items": _tree_files(root, "md"), "target_directory": os.path.join(work, "moved")}),
+    Case("move_files_by_pattern", "move_files_by_pattern", True,
+         lambda root, work: {"source_directory": root, "pattern": "*.log", "target_directory": os.path.join(work, "moved"),
+                             "filters": {"recursive": True}}, _count_files("log")),
+    Case("delete_files", "delete_files", True,
+         lambda root, work: {"file_paths": _tree_files(root, "py"), "confirm": True}),
+    Case("delete_files_by_pattern", "delete_files_by_pattern", True,
+         lambda root, work: {"directory": root, "pattern": "*.tmp", "confirm": True, "filters": {"recursive": True}},
+         _count_files("tmp")),
+    Case("safe_cleanup", "safe_cleanup", True,
+         lambda root, work: {"directory": root, "days_old": 365, "confirm": True, "filters": {"recursive": True}},
+         _count_files(older_than_days=365)),
+    Case("rename_file", "rename_file", True,
+         lambda root, work: {"file_path": _tree_files(root)[0], "new_name": "renamed"}),
+    Case("batch_rename_files", "batch_rename_files", True,
+         lambda root, work: {"file_paths": _tree_files(root, "txt", limit=2000), "rename_pattern": "doc_{index:05d}"}),
+    Case("rename_with_rules", "rename_with_rules", True,
+         lambda root, work: {"file_paths": _tree_files(root, "txt", limit=2000),
+                             "rules": {"prefix": "x_", "case": "upper"}}),
+    Case("organize_directory", "organize_directory", True,
+         lambda root, work: {"directory": root, "recursive": True, "confirm": True,
+                             "rules": [{"ext": ["txt", "md"], "target": "text/{year}"}],
+                             "default_target": "other/{ext}", "target_root": os.path.join(work, "organized")}),
+    Case("sync_directories", "sync_directories", True,
+         lambda root, work: {"source_directory": root, "target_directory": os.path.join(work, "mirror")}),
+    Case("archive_files", "archive_files", True,
+         lambda root, work: {"directory": root, "pattern": "*", "output_path": os.path.join(work, "tree.tar.gz"),
+                             "filters": {"recursive": True, "file_type": "file"}}),
+    Case("extract_archive", "extract_archive", True, _build_extract),
+]
+
+
+class _ToolCollector:
+    """模拟 FastMCP 的 tool 装饰器，收集工具函数以便直接调用"""
+
+    def __init__(self):
+        self.tools = {}
+
+    def tool(self, fn=None, **kwargs):
+        if fn is None:
+            return lambda f: self.tool(f)
+        self.tools[fn.__name__] = fn
+        return fn
+
+
+_TOOLS = None
+
+
+def load_tools() -> Dict[str, Callable]:
+    global _TOOLS
+    if _TOOLS is None:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from tools import register_all_tools
+        collector = _ToolCollector()
+        register_all_tools(collector)
+        _TOOLS = collector.tools
+    return _TOOLS
+
+
+class _CountingEntry:
+    """代理 os.DirEntry，统计 stat() 实际触发的系统调用（DirEntry 自身会缓存结果，每种 follow_symlinks 只计一次）"""
+
+    __slots__ = ("_entry", "_counter", "_counted")
+
+    def __init__(self, entry, counter: "SyscallCounter"):
+        self._entry = entry
+        self._counter = counter
+        self._counted = set()
+
+    def stat(self, *, follow_symlinks=True):
+        if follow_symlinks not in self._counted:
+            self._counted.add(follow_symlinks)
+            self._counter.add("DirEntry.stat")
+        return self._entry.stat(follow_symlinks=follow_symlinks)
+
+    def __fspath__(self):
+        return self._entry.path
+
+    def __getattr__(self, name):
+        return getattr(self._entry, name)
+
+
+class _CountingScandir:
+    """代理 os.scandir 的迭代器，把目录项包装为 _CountingEntry"""
+
+    def __init__(self, iterator, counter: "SyscallCounter"):
+        self._iterator = iterator
+        self._counter = counter
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return _CountingEntry(next(self._iterator), self._counter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._iterator.close()
+
+
+class SyscallCounter:
+    """在 Python 层统计文件系统系统调用次数（按调用名分别计数）"""
+
+    FUNCTIONS = ("stat", "lstat", "fstat", "open", "listdir", "rename", "replace", "remove", "unlink",
+                 "rmdir", "mkdir", "utime", "chmod")
+
+    def __init__(self):
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._originals = {}
+
+    def add(self, name: str):
+        with self._lock:
+            self.counts[name] += 1
+
+    def _wrap(self, name: str, function: Callable) -> Callable:
+        def counted(*args, **kwargs):
+            self.add(name)
+            return function(*args, **kwargs)
+        return counted
+
+    def install(self):
+        """替换 os 中的函数；应在工具模块导入之后调用，使模块导入时的平台能力检测不受影响"""
+        for name in self.FUNCTIONS:
+            if hasattr(os, name):
+                self._originals[(os, name)] = getattr(os, name)
+                setattr(os, name, self._wrap(name, getattr(os, name)))
+
+        scandir = os.scandir
+        self._originals[(os, "scandir")] = scandir
+
+        def counting_scandir(*args, **kwargs):
+            self.add("scandir")
+            return _CountingScandir(scandir(*args, **kwargs), self)
+        os.scandir = counting_scandir
+
+        builtin_open = builtins.open
+        self._originals[(builtins, "open")] = builtin_open
+
+        def counting_open(file, *args, **kwargs):
+            # 带 opener 的打开（如 openat）由被替换的 os.open 计数
+            if kwargs.get("opener") is None and not isinstance(file, int):
+                self.add("open")
+            return builtin_open(file, *args, **kwargs)
+        builtins.open = counting_open
+
+    def uninstall(self):
+        for (module, name), function in self._originals.items():
+            setattr(module, name, function)
+        self._originals.clear()
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+
+def _peak_rss_kb() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 上 ru_maxrss 单位为字节，Linux 上为KB
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _run_case_in_child(tool_name: str, arguments: Dict, count_syscalls: bool = False) -> Dict:
+    """在子进程中调用一次工具并测量"""
+    import io
+    import contextlib
+
+    # 工具内部的 print 输出（包括写到 stderr 的提示）不混入测量结果
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        tools = load_tools()
+        counter = SyscallCounter() if count_syscalls else None
+        rss_before = _peak_rss_kb()
+        if counter:
+            counter.install()
+        started = time.perf_counter()
+        try:
+            result = tools[tool_name](**arguments)
+        finally:
+            seconds = time.perf_counter() - started
+            if counter:
+                counter.uninstall()
+    text = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False)
+    failed = text.startswith("错误") or "时出错" in text[:200]
+    peak_rss = _peak_rss_kb()
+    measurement = {
+        "seconds": seconds,
+        "peak_rss_kb": peak_rss,
+        "rss_before_kb": rss_before,
+        "rss_delta_kb": max(0, peak_rss - rss_before),
+        "error": text[:200] if failed else None,
+    }
+    if counter:
+        measurement["syscalls"] = counter.total
+        measurement["syscalls_by_call"] = dict(counter.counts.most_common())
+    return measurement
+
+
+def workload_size(case: Case, root: str, arguments: Dict, tree_files: int) -> int:
+    """
+    工具实际处理的条目数，用于计算 文件/秒：
+    测量项给出 count 时按目录树实际统计（只列顶层、只处理匹配模式的文件等），
+    显式传入路径列表的工具按列表长度计，其余（需要遍历整棵树的扫描、同步、归档等）按整棵树计
+    """
+    if case.count is not None:
+        return case.count(root)
+    for key in ("file_paths", "source_items"):
+        if isinstance(arguments.get(key), list):
+            return len(arguments[key])
+    if "file_path" in arguments:
+        return 1
+    return tree_files
+
+
+def run_case(pool_context, case: Case, shape: str, scale: int, repeat: int, scratch: str,
+             shared_tree: str, tree_files: int, count_syscalls: bool = False) -> Dict:
+    """
+    执行一个测量项，返回最快一次的耗时和所有重复中最大的峰值RSS增量
+    :param shared_tree: 只读测量项共用的已生成目录树
+    :param tree_files: 目录树中的文件数
+    :param count_syscalls: 是否统计文件系统调用次数
+    """
+    best = None
+    for _ in range(repeat):
+        work = tempfile.mkdtemp(prefix=f"{case.name}-", dir=scratch)
+        try:
+            if case.mutating:
+                root = os.path.join(work, "tree")
+                generate_tree(root, shape, scale)
+            else:
+                root = shared_tree
+            arguments = case.build(root, work)
+            files = workload_size(case, root, arguments, tree_files)
+
+            with pool_context.Pool(1, maxtasksperchild=1) as pool:
+                measurement = pool.apply(_run_case_in_child, (case.tool, arguments, count_syscalls))
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+
+        if measurement["error"]:
+            return measurement
+        measurement["files"] = files
+        measurement["files_per_sec"] = files / measurement["seconds"] if measurement["seconds"] > 0 else 0.0
+        if best is None:
+            best = measurement
+        else:
+            delta = max(best["rss_delta_kb"], measurement["rss_delta_kb"])
+            if measurement["seconds"] < best["seconds"]:
+                best = measurement
+            best["rss_delta_kb"] = delta
+
+    return best
+
+
+# ---------------------------------------------------------------------------
+# 基线对比
+# ---------------------------------------------------------------------------
+
+def rss_delta_kb(result: Dict) -> int:
+    """峰值RSS相对子进程基准的增量（旧基线文件没有 rss_delta_kb 时按峰值减基准计算）"""
+    if "rss_delta_kb" in result:
+        return result["rss_delta_kb"]
+    return max(0, result["peak_rss_kb"] - result.get("rss_before_kb", 0))
+
+
+def compare_to_baseline(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """返回回退描述列表：耗时、峰值RSS增量或文件系统调用次数（两次都统计时）超过基线 (1 + threshold) 倍"""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None or current.get("error") or previous.get("error"):
+            continue
+        if (previous["seconds"] >= MIN_COMPARABLE_SECONDS
+                and current["seconds"] > previous["seconds"] * (1 + threshold)):
+            regressions.append(f"{key}: 耗时 {previous['seconds']:.3f}s → {current['seconds']:.3f}s "
+                               f"(+{(current['seconds'] / previous['seconds'] - 1) * 100:.0f}%)")
+        # RSS 以加载工具后的增量比较，排除解释器和模块本身的占用
+        previous_rss = rss_delta_kb(previous)
+        current_rss = rss_delta_kb(current)
+        if previous_rss > 1024 and current_rss > previous_rss * (1 + threshold):
+            regressions.append(f"{key}: 峰值内存增量 {previous_rss} KB → {current_rss} KB")
+        # 系统调用次数不受机器负载影响，小幅增加也能稳定反映出来
+        if previous.get("syscalls") and current.get("syscalls") is not None \
+                and current["syscalls"] > previous["syscalls"] * (1 + threshold):
+            regressions.append(f"{key}: 文件系统调用 {previous['syscalls']} → {current['syscalls']} 次")
+    return regressions
+
+
+def format_row(key: str, result: Dict, baseline: Dict = None) -> str:
+    if result.get("error"):
+        return f"{key:<48} 失败: {result['error']}"
+    row = (f"{key:<48} {result['seconds']:>9.3f}s {result['files_per_sec']:>12.0f} 文件/s "
+           f"{'+%.1f' % (rss_delta_kb(result) / 1024):>8} MB")
+    if result.get("syscalls") is not None:
+        row += f" {result['syscalls']:>9} 次调用"
+    previous = (baseline or {}).get(key)
+    if previous and not previous.get("error") and previous["seconds"] > 0:
+        row += f"   基线 {previous['seconds']:.3f}s ({(result['seconds'] / previous['seconds'] - 1) * 100:+.0f}%)"
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="文件工具基准测试")
+    parser.add_argument("--shapes", default=",".join(DEFAULT_SHAPES),
+                        help=f"目录树形状，逗号分隔（可选: {', '.join(DEFAULT_SHAPES)}）")
+    parser.add_argument("--scales", default=",".join(map(str, DEFAULT_SCALES)), help="规模倍数，逗号分隔")
+    parser.add_argument("--tools", default=None, help="只运行这些测量项，逗号分隔（默认全部）")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="每个测量项重复次数，取最快一次")
+    parser.add_argument("--baseline", default=None, help="与该基线文件对比")
+    parser.add_argument("--save-baseline", default=None, help="把本次结果保存为基线文件")
+    parser.add_argument("--output", default=None, help="把本次结果写入JSON文件")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="判定回退的相对阈值（默认0.2）")
+    parser.add_argument("--workdir", default=None, help="生成目录树的位置（默认系统临时目录）")
+    parser.add_argument("--syscalls", action="store_true", help="同时统计每个测量项的文件系统调用次数")
+    args = parser.parse_args(argv)
+
+    shapes = [s for s in args.shapes.split(",") if s]
+    scales = [int(s) for s in args.scales.split(",") if s]
+    selected = set(args.tools.split(",")) if args.tools else None
+    cases = [c for c in CASES if selected is None or c.name in selected]
+    unknown_shapes = set(shapes) - set(DEFAULT_SHAPES)
+    if unknown_shapes:
+        parser.error(f"未知的目录树形状: {', '.join(sorted(unknown_shapes))}")
+    if not cases:
+        parser.error("没有匹配的测量项，可选: " + ", ".join(c.name for c in CASES))
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+
+    # 在父进程中先检查工具能否加载，避免每个子进程各自报错
+    import io
+    import contextlib
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        available = load_tools()
+    missing = [c.name for c in cases if c.tool not in available]
+    if missing:
+        print(f"跳过未注册的工具: {', '.join(missing)}")
+        cases = [c for c in cases if c.tool in available]
+
+    pool_context = multiprocessing.get_context("spawn")
+    results = {}
+    scratch = tempfile.mkdtemp(prefix="valkyrie-bench-", dir=args.workdir)
+    try:
+        for shape in shapes:
+            for scale in scales:
+                shared_tree = os.path.join(scratch, f"{shape}-{scale}")
+                tree_started = time.perf_counter()
+                stats = generate_tree(shared_tree, shape, scale)
+                print(f"\n== {shape} x{scale}: {stats.files} 个文件，{stats.dirs} 个目录，"
+                      f"{stats.bytes / 1024 / 1024:.1f} MB（生成耗时 {time.perf_counter() - tree_started:.1f}s）")
+
+                for case in cases:
+                    key = f"{case.name}/{shape}/x{scale}"
+                    result = run_case(pool_context, case, shape, scale, args.repeat, scratch, shared_tree, stats.files,
+                                      count_syscalls=args.syscalls)
+                    results[key] = result
+                    print(format_row(key, result, baseline))
+
+                shutil.rmtree(shared_tree, ignore_errors=True)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    document = {
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "repeat": args.repeat,
+        "syscalls": args.syscalls,
+        "results": results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(document, f, ensure_ascii=False, indent=2)
+            print(f"\n结果已保存到 {path}")
+
+    failures = [key for key, result in results.items() if result.get("error")]
+    if failures:
+        print(f"\n❌ {len(failures)} 个测量项执行失败: {', '.join(failures)}")
+
+    if baseline:
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n⚠️ 相对基线出现 {len(regressions)} 项性能回退（阈值 +{args.threshold * 100:.0f}%）:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\n✅ 没有超过阈值 +{args.threshold * 100:.0f}% 的性能回退")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
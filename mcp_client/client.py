@@ -1,23 +1,374 @@
 """
-1.创建客户端
-2.获取工具、资源、prompt
-3.执行工具
+MCP 端到端负载生成器
+
+启动多个 MCP 客户端会话，每个会话以固定的并发数持续调用工具，
+统计总吞吐量和每个工具的 p50/p95/p99 延迟，用于衡量服务器在真实调用模式下的表现
+（与 benchmark.py 直接调用工具函数不同，这里包含 MCP 协议、序列化和传输的开销）。
+
+用法：
+    python client.py                                        # 合成只读负载，1个会话，并发4，共500次调用
+    python client.py --clients 4 --concurrency 8 --requests 5000
+    python client.py --duration 30                          # 持续30秒，不限调用次数
+    python client.py --transport inproc                     # 在本进程内运行服务器，不经过 stdio
+    python client.py --trace ../llm_client/telemetry.jsonl  # 回放真实会话中记录的工具调用
+    python client.py --output load_report.json
+
+调用轨迹文件为 JSONL，每行可以是：
+    {"tool": "list_files", "arguments": {"directory": "/tmp"}}
+    {"name": "list_files", "arguments": "{\"directory\": \"/tmp\"}"}   # OpenAI tool_call 格式
+    llm_client 的 telemetry.jsonl 记录（取其中 tool_calls 的工具名和参数）
+轨迹中的调用按顺序循环使用；轨迹可能包含会修改文件的工具，回放前请确认其中的路径。
+
+不指定轨迹时，在临时目录中生成 benchmark.py 的合成目录树，只调用只读工具。
 """
 
+import argparse
 import asyncio
-from http.client import responses
+import itertools
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from fastmcp import Client
 
+# 默认参数
+DEFAULT_CLIENTS = 1
+DEFAULT_CONCURRENCY = 4
+DEFAULT_REQUESTS = 500
+DEFAULT_CALL_TIMEOUT = 120.0
+
+# 合成负载使用的目录树与随机种子
+SYNTHETIC_SHAPE = "many_small"
+SYNTHETIC_SEED = 20240601
+
+# 报告的延迟分位数
+PERCENTILES = [50, 95, 99]
+
+Call = Tuple[str, Dict[str, Any]]
+
+
+# ---------------------------------------------------------------------------
+# 调用轨迹
+# ---------------------------------------------------------------------------
+
+def _parse_trace_line(record: Dict[str, Any]) -> List[Call]:
+    if "tool_calls" in record:
+        # telemetry.jsonl 中的一轮对话，未记录参数的调用（旧版本记录）无法回放
+        return [(call["tool"], call["arguments"]) for call in record["tool_calls"]
+                if isinstance(call.get("arguments"), dict)]
+    name = record.get("tool") or record.get("name")
+    arguments = record.get("arguments") or {}
+    if isinstance(arguments, str):
+        arguments = json.loads(arguments)
+    if not name or not isinstance(arguments, dict):
+        raise ValueError("缺少工具名或参数不是字典")
+    return [(name, arguments)]
+
+
+def load_trace(path: str) -> List[Call]:
+    """读取 JSONL 调用轨迹"""
+    calls = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                calls.extend(_parse_trace_line(json.loads(line)))
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"{path} 第 {number} 行无效: {e}")
+    if not calls:
+        raise ValueError(f"{path} 中没有可回放的工具调用")
+    return calls
+
+
+def synthetic_trace(root: str, seed: int = SYNTHETIC_SEED) -> List[Call]:
+    """
+    按对话中常见的比例生成只读调用：以浏览目录和查找文件为主，少量内容搜索和目录分析
+    """
+    rng = random.Random(seed)
+    directories = sorted(current for current, _, _ in os.walk(root))
+    groups = sorted(os.path.join(root, name) for name in os.listdir(root))
+    patterns = ["*.txt", "*.log", "*.py", "*.md", "file_0*"]
+
+    def list_files():
+        return "list_files", {"directory": rng.choice(directories)}
+
+    def find_files():
+        return "find_files", {"directory": rng.choice(groups), "pattern": rng.choice(patterns),
+                              "filters": {"recursive": True}}
+
+    def find_filtered():
+        return "find_files", {"directory": root, "pattern": rng.choice(patterns),
+                              "filters": {"recursive": True, "min_size": rng.choice([512, 1024, 2048]),
+                                          "older_than_days": rng.choice([30, 180, 365])}}
+
+    def search_content():
+        return "search_content", {"directory": rng.choice(groups), "query": "needle", "max_matches": 50}
+
+    def analyze_directory():
+        return "analyze_directory", {"directory": rng.choice(groups)}
+
+    mix = [(list_files, 40), (find_files, 25), (find_filtered, 15), (search_content, 15), (analyze_directory, 5)]
+    makers = [maker for maker, _ in mix]
+    weights = [weight for _, weight in mix]
+    return [rng.choices(makers, weights)[0]() for _ in range(1000)]
+
+
+# ---------------------------------------------------------------------------
+# 负载执行
+# ---------------------------------------------------------------------------
+
+class CallSource:
+    """所有会话共享的调用来源：按顺序循环轨迹，达到调用次数或截止时间后停止"""
+
+    def __init__(self, calls: List[Call], requests: Optional[int], duration: Optional[float]):
+        self._calls: Iterator[Call] = itertools.cycle(calls)
+        self._remaining = requests
+        self._duration = duration
+        self._deadline = None
+
+    def start(self):
+        if self._duration is not None:
+            self._deadline = time.perf_counter() + self._duration
+
+    def next(self) -> Optional[Call]:
+        if self._deadline is not None and time.perf_counter() >= self._deadline:
+            return None
+        if self._remaining is not None:
+            if self._remaining <= 0:
+                return None
+            self._remaining -= 1
+        return next(self._calls)
+
+
+class ToolStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.result_chars = 0
+        self.first_error = None
+
+    def record(self, latency: float, ok: bool, result_chars: int, error: str = None):
+        self.latencies.append(latency)
+        self.result_chars += result_chars
+        if not ok:
+            self.errors += 1
+            if self.first_error is None:
+                self.first_error = error
+
 
-async def main():
-    client = Client("server.py")
+def _result_text(result) -> str:
+    return "".join(getattr(block, "text", "") for block in result.content)
+
+
+def _make_client(transport: str, server_script: str, server=None) -> Client:
+    if transport == "inproc":
+        return Client(server)
+    return Client(Path(server_script))
+
+
+async def _worker(client: Client, source: CallSource, stats: Dict[str, ToolStats], timeout: float):
+    while True:
+        call = source.next()
+        if call is None:
+            return
+        tool_name, arguments = call
+        started = time.perf_counter()
+        try:
+            result = await client.call_tool(tool_name, arguments, timeout=timeout, raise_on_error=False)
+            text = _result_text(result)
+            ok, error = not result.is_error, (text[:200] if result.is_error else None)
+        except Exception as e:
+            text, ok, error = "", False, f"{type(e).__name__}: {e}"
+        stats.setdefault(tool_name, ToolStats()).record(time.perf_counter() - started, ok, len(text), error)
+
+
+async def _run_session(client: Client, source: CallSource, concurrency: int,
+                       stats: Dict[str, ToolStats], timeout: float, ready: asyncio.Event,
+                       connect_times: List[float]):
+    started = time.perf_counter()
     async with client:
-        tools = await client.list_tools()
-        tool = tools[0]
-        tool_result = await client.call_tool(tool.name, {"city": "杭州"})
-        print(tool_result)
+        connect_times.append(time.perf_counter() - started)
+        await ready.wait()
+        await asyncio.gather(*(_worker(client, source, stats, timeout) for _ in range(concurrency)))
+
+
+async def run_load(calls: List[Call], transport: str, clients: int, concurrency: int,
+                   requests: Optional[int], duration: Optional[float], timeout: float,
+                   server_script: str) -> Dict[str, Any]:
+    """
+    建立 clients 个会话，全部连接完成后同时开始施压，每个会话同时有 concurrency 个调用在执行
+    :return: 测量结果
+    """
+    server = None
+    if transport == "inproc":
+        sys.path.insert(0, os.path.dirname(os.path.abspath(server_script)))
+        from server import create_mcp_server
+        server = create_mcp_server()
+
+    source = CallSource(calls, requests, duration)
+    stats: Dict[str, ToolStats] = {}
+    connect_times: List[float] = []
+    ready = asyncio.Event()
+
+    sessions = [asyncio.create_task(_run_session(_make_client(transport, server_script, server), source, concurrency,
+                                                 stats, timeout, ready, connect_times))
+                for _ in range(clients)]
+    while len(connect_times) < clients:
+        failed = [task for task in sessions if task.done()]
+        if failed:
+            ready.set()
+            await asyncio.gather(*sessions)
+        await asyncio.sleep(0.01)
+
+    source.start()
+    started = time.perf_counter()
+    ready.set()
+    await asyncio.gather(*sessions)
+    elapsed = time.perf_counter() - started
+
+    return summarize(stats, elapsed, connect_times, {
+        "transport": transport,
+        "clients": clients,
+        "concurrency": concurrency,
+        "requests": requests,
+        "duration": duration,
+    })
+
+
+# ---------------------------------------------------------------------------
+# 报告
+# ---------------------------------------------------------------------------
+
+def _nearest_rank(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def _latency_summary(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    summary = {"mean_ms": round(sum(ordered) / len(ordered) * 1000, 2) if ordered else 0.0}
+    for percent in PERCENTILES:
+        summary[f"p{percent}_ms"] = round(_nearest_rank(ordered, percent) * 1000, 2)
+    summary["max_ms"] = round(ordered[-1] * 1000, 2) if ordered else 0.0
+    return summary
+
+
+def summarize(stats: Dict[str, ToolStats], elapsed: float, connect_times: List[float],
+              settings: Dict[str, Any]) -> Dict[str, Any]:
+    all_latencies = [latency for tool in stats.values() for latency in tool.latencies]
+    total = len(all_latencies)
+    tools = {}
+    for name in sorted(stats):
+        tool = stats[name]
+        tools[name] = {
+            "calls": len(tool.latencies),
+            "errors": tool.errors,
+            "calls_per_second": round(len(tool.latencies) / elapsed, 2) if elapsed else 0.0,
+            "mean_result_chars": round(tool.result_chars / len(tool.latencies)) if tool.latencies else 0,
+            **_latency_summary(tool.latencies),
+        }
+        if tool.first_error:
+            tools[name]["first_error"] = tool.first_error
+    return {
+        "settings": settings,
+        "elapsed_seconds": round(elapsed, 3),
+        "calls": total,
+        "errors": sum(tool.errors for tool in stats.values()),
+        "calls_per_second": round(total / elapsed, 2) if elapsed else 0.0,
+        "connect_ms": _latency_summary(connect_times),
+        "latency": _latency_summary(all_latencies),
+        "tools": tools,
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    settings = report["settings"]
+    lines = [
+        f"传输: {settings['transport']}，会话 {settings['clients']} 个 × 并发 {settings['concurrency']}",
+        f"共 {report['calls']} 次调用，失败 {report['errors']} 次，耗时 {report['elapsed_seconds']:.2f} 秒，"
+        f"吞吐量 {report['calls_per_second']:.1f} 次/秒",
+        f"会话建立耗时: 平均 {report['connect_ms']['mean_ms']:.1f} ms，最长 {report['connect_ms']['max_ms']:.1f} ms",
+        "",
+        f"{'工具':<22}{'调用':>8}{'失败':>6}{'次/秒':>10}{'平均ms':>10}"
+        + "".join(f"{'p' + str(p) + 'ms':>10}" for p in PERCENTILES) + f"{'最大ms':>10}",
+    ]
+
+    def row(name, item):
+        return (f"{name:<22}{item['calls']:>8}{item['errors']:>6}{item['calls_per_second']:>10.1f}"
+                f"{item['mean_ms']:>10.1f}" + "".join(f"{item[f'p{p}_ms']:>10.1f}" for p in PERCENTILES)
+                + f"{item['max_ms']:>10.1f}")
+
+    for name, item in report["tools"].items():
+        lines.append(row(name, item))
+    lines.append(row("(全部)", {"calls": report["calls"], "errors": report["errors"],
+                                "calls_per_second": report["calls_per_second"], **report["latency"]}))
+
+    failures = [(name, item["first_error"]) for name, item in report["tools"].items() if "first_error" in item]
+    if failures:
+        lines.append("")
+        lines.append("首个错误:")
+        lines.extend(f"  {name}: {error}" for name, error in failures)
+    return "\n".join(lines)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="MCP 端到端负载生成器")
+    parser.add_argument("--transport", choices=["stdio", "inproc"], default="stdio",
+                        help="stdio: 启动 server.py 子进程；inproc: 在本进程内运行服务器（默认 stdio）")
+    parser.add_argument("--server", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py"),
+                        help="服务器脚本路径")
+    parser.add_argument("--clients", type=int, default=DEFAULT_CLIENTS, help="同时连接的会话数")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="每个会话同时执行的调用数")
+    parser.add_argument("--requests", type=int, help=f"总调用次数（默认 {DEFAULT_REQUESTS}，指定 --duration 时不限）")
+    parser.add_argument("--duration", type=float, help="持续施压的秒数")
+    parser.add_argument("--trace", help="回放的调用轨迹 JSONL 文件（默认使用合成只读负载）")
+    parser.add_argument("--scale", type=int, default=1, help="合成负载目录树的规模")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_CALL_TIMEOUT, help="单次调用超时（秒）")
+    parser.add_argument("--output", help="把结果写入JSON文件")
+    args = parser.parse_args(argv)
+
+    if args.clients < 1 or args.concurrency < 1:
+        parser.error("--clients 和 --concurrency 至少为 1")
+    requests = args.requests
+    if requests is None and args.duration is None:
+        requests = DEFAULT_REQUESTS
+
+    workdir = None
+    try:
+        if args.trace:
+            calls = load_trace(args.trace)
+            print(f"从 {args.trace} 读取 {len(calls)} 次调用")
+        else:
+            sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+            from benchmark import generate_tree
+            workdir = tempfile.mkdtemp(prefix="mcp_load_")
+            tree = generate_tree(os.path.join(workdir, "tree"), SYNTHETIC_SHAPE, args.scale)
+            calls = synthetic_trace(os.path.join(workdir, "tree"))
+            print(f"合成负载: {tree.files} 个文件，{tree.dirs} 个目录（{SYNTHETIC_SHAPE}，规模 {args.scale}）")
+
+        report = asyncio.run(run_load(calls, args.transport, args.clients, args.concurrency, requests,
+                                      args.duration, args.timeout, args.server))
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到 {args.output}")
+    return 1 if report["errors"] else 0
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    sys.exit(main())
@@ -7,9 +7,19 @@
 - tools/file_operations.py  - 文件移动操作工具 (2个工具)
 - tools/file_deletion.py    - 文件删除工具 (3个工具)
 - tools/file_rename.py      - 文件重命名工具 (3个工具)
-- tools/ocr_tools.py        - OCR识别工具 (1个工具)
-
-总计：11个工具，分布在5个专业模块中
+- tools/file_organize.py    - 文件整理工具 (1个工具)
+- tools/file_sync.py        - 目录同步工具 (1个工具)
+- tools/file_archive.py     - 归档工具 (2个工具)
+- tools/content_search.py   - 内容搜索工具 (1个工具)
+- tools/directory_analytics.py - 目录分析工具 (1个工具)
+- tools/pipeline.py         - 批处理流水线工具 (1个工具)
+- tools/ocr_tools.py        - OCR识别工具 (2个工具)
+- tools/jobs.py             - 后台任务工具 (5个工具)
+- tools/io_scheduler.py     - I/O调度工具 (2个工具)
+- tools/path_locks.py       - 路径锁状态工具 (1个工具)
+- tools/profiling.py        - 性能剖析工具 (3个工具)
+
+总计：30个工具，分布在15个专业模块中
 """
 
 from fastmcp import FastMCP
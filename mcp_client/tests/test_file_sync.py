@@ -0,0 +1,84 @@
+"""
+sync_directories 回归测试
+运行: python -m pytest mcp_client/tests 或 python -m unittest discover mcp_client/tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.file_sync import register_file_sync_tools  # noqa: E402
+
+
+class _ToolCollector:
+    """模拟 FastMCP 的 tool 装饰器，收集工具函数以便直接调用"""
+
+    def __init__(self):
+        self.tools = {}
+
+    def tool(self, fn=None, **kwargs):
+        if fn is None:
+            return lambda f: self.tool(f)
+        self.tools[fn.__name__] = fn
+        return fn
+
+
+def _write(path: str, content: str = "x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+class SyncDirectoriesTest(unittest.TestCase):
+
+    def setUp(self):
+        collector = _ToolCollector()
+        register_file_sync_tools(collector)
+        self.sync_directories = collector.tools["sync_directories"]
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = self._tmp.name
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_target_ancestor_of_source_is_rejected(self):
+        source = os.path.join(self.root, "project", "src")
+        _write(os.path.join(source, "main.py"))
+        _write(os.path.join(self.root, "project", "README.md"))
+
+        result = self.sync_directories(os.path.join(self.root, "project", "src"),
+                                       os.path.join(self.root, "project"),
+                                       delete_extraneous=True)
+
+        self.assertTrue(result.startswith("错误"), result)
+        self.assertTrue(os.path.isfile(os.path.join(source, "main.py")))
+        self.assertTrue(os.path.isfile(os.path.join(self.root, "project", "README.md")))
+
+    def test_target_inside_source_is_rejected(self):
+        source = os.path.join(self.root, "src")
+        _write(os.path.join(source, "a.txt"))
+
+        result = self.sync_directories(source, os.path.join(source, "mirror"))
+
+        self.assertTrue(result.startswith("错误"), result)
+        self.assertFalse(os.path.exists(os.path.join(source, "mirror")))
+
+    def test_sibling_directories_sync(self):
+        source = os.path.join(self.root, "src")
+        target = os.path.join(self.root, "src_backup")
+        _write(os.path.join(source, "a.txt"), "hello")
+        _write(os.path.join(target, "stale.txt"))
+
+        result = self.sync_directories(source, target, delete_extraneous=True)
+
+        self.assertFalse(result.startswith("错误"), result)
+        with open(os.path.join(target, "a.txt"), encoding="utf-8") as f:
+            self.assertEqual(f.read(), "hello")
+        self.assertFalse(os.path.exists(os.path.join(target, "stale.txt")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,23 +2,58 @@
 工具模块 - MCP服务器工具集合
 """
 
+import sys
+
 from .file_listing import register_file_listing_tools
 from .file_operations import register_file_operation_tools  
 from .file_deletion import register_file_deletion_tools
 from .file_rename import register_file_rename_tools
+from .file_organize import register_file_organize_tools
+from .file_sync import register_file_sync_tools
+from .file_archive import register_file_archive_tools
+from .content_search import register_content_search_tools
+from .directory_analytics import register_directory_analytics_tools
+from .pipeline import register_pipeline_tools
 from .ocr_tools import register_ocr_tools
-from .disk_space import register_disk_space_tools
+try:
+    from .disk_space import register_disk_space_tools
+except ImportError:
+    # disk_space.py 或其依赖不可用时跳过磁盘监控工具，其余工具照常注册
+    register_disk_space_tools = None
+from .io_scheduler import register_io_scheduler_tools
+from .path_locks import register_path_lock_tools
+from .profiling import register_profiling_tools
+from .jobs import register_job_tools
+from .registry import ToolRegistry
 
 def register_all_tools(mcp):
-    """注册所有工具到MCP实例"""
-    register_file_listing_tools(mcp)
-    register_file_operation_tools(mcp)
-    register_file_deletion_tools(mcp)
-    register_file_rename_tools(mcp)
-    register_ocr_tools(mcp)
-    register_disk_space_tools(mcp)
+    """
+    注册所有工具到MCP实例
+    :return: 记录了全部工具函数的 ToolRegistry
+    """
+    registry = ToolRegistry(mcp)
+    register_file_listing_tools(registry)
+    register_file_operation_tools(registry)
+    register_file_deletion_tools(registry)
+    register_file_rename_tools(registry)
+    register_file_organize_tools(registry)
+    register_file_sync_tools(registry)
+    register_file_archive_tools(registry)
+    register_content_search_tools(registry)
+    register_directory_analytics_tools(registry)
+    register_pipeline_tools(registry)
+    register_ocr_tools(registry)
+    if register_disk_space_tools is not None:
+        register_disk_space_tools(registry)
+    else:
+        print("磁盘监控工具不可用（未找到 tools/disk_space.py 或其依赖），已跳过", file=sys.stderr)
+    register_io_scheduler_tools(registry)
+    register_path_lock_tools(registry)
+    register_profiling_tools(registry)
+    register_job_tools(registry)
     
-    print("已注册所有工具模块")
+    print("已注册所有工具模块", file=sys.stderr)
+    return registry
 
 __all__ = [
     'register_all_tools',
@@ -26,6 +61,17 @@ __all__ = [
     'register_file_operation_tools', 
     'register_file_deletion_tools',
     'register_file_rename_tools',
+    'register_file_organize_tools',
+    'register_file_sync_tools',
+    'register_file_archive_tools',
+    'register_content_search_tools',
+    'register_directory_analytics_tools',
+    'register_pipeline_tools',
     'register_ocr_tools',
-    'register_disk_space_tools'
+    'register_disk_space_tools',
+    'register_io_scheduler_tools',
+    'register_path_lock_tools',
+    'register_profiling_tools',
+    'register_job_tools',
+    'ToolRegistry'
 ]
\ No newline at end of file
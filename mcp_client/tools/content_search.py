@@ -0,0 +1,264 @@
+"""
+内容搜索工具模块
+在目录树的文本文件中并发搜索字面字符串或正则表达式，通过 mmap 读取文件，
+自动跳过二进制文件，达到匹配上限后提前停止
+"""
+
+import mmap
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Union
+
+from . import fs
+from .file_query import FileQuery
+from .io_scheduler import io_slot
+from .jobs import report_progress
+
+# 并发搜索的线程数
+SEARCH_WORKERS = 8
+
+# 读取文件开头多少字节判断是否为二进制文件
+BINARY_SNIFF_SIZE = 8192
+
+# 不超过该大小的文件直接读入内存，更大的文件使用 mmap
+MMAP_THRESHOLD = 64 * 1024
+
+# 匹配数与上下文行数的上限
+MAX_MATCHES_LIMIT = 1000
+MAX_CONTEXT_LINES = 5
+
+# 单行最多展示的字符数
+MAX_LINE_CHARS = 300
+
+# 默认不进入的目录
+DEFAULT_EXCLUDE = [".git", ".svn", ".hg", "node_modules", "__pycache__"]
+
+
+class MatchBudget:
+    """所有工作线程共享的匹配计数，用完后其余线程尽快停止"""
+
+    def __init__(self, limit: int):
+        self.remaining = limit
+        self.exhausted = False
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self._lock:
+            if self.remaining <= 0:
+                self.exhausted = True
+                return False
+            self.remaining -= 1
+            if self.remaining == 0:
+                self.exhausted = True
+            return True
+
+
+def compile_search(query: str, regex: bool, case_sensitive: bool, encoding: str) -> re.Pattern:
+    """将查询编译为字节正则，字面查询会先转义"""
+    flags = re.MULTILINE
+    if not case_sensitive:
+        flags |= re.IGNORECASE
+    source = query.encode(encoding)
+    if not regex:
+        source = re.escape(source)
+    return re.compile(source, flags)
+
+
+def _decode_line(data, start: int, end: int, encoding: str) -> str:
+    text = data[start:end].decode(encoding, errors="replace").rstrip("\r")
+    if len(text) > MAX_LINE_CHARS:
+        text = text[:MAX_LINE_CHARS] + "…"
+    return text
+
+
+def search_file(path: str, pattern: re.Pattern, context_lines: int, budget: MatchBudget, encoding: str):
+    """
+    搜索单个文件，每行最多记一次匹配
+    :return: None 表示二进制文件；否则为 [(行号, 行内容, 是否匹配行)]，按行号排序并已合并重叠的上下文
+    """
+    with fs.open_file(path, "rb") as f:
+        head = f.read(BINARY_SNIFF_SIZE)
+        if b"\0" in head:
+            return None
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return []
+
+        mapped = None
+        if size <= MMAP_THRESHOLD:
+            data = head + f.read()
+        else:
+            data = mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            lines = {}
+            length = len(data)
+            line_no = 1
+            counted_to = 0
+            pos = 0
+            while pos <= length and not budget.exhausted:
+                match = pattern.search(data, pos)
+                if match is None:
+                    break
+                line_start = data.rfind(b"\n", 0, match.start()) + 1
+                line_end = data.find(b"\n", match.start())
+                if line_end == -1:
+                    line_end = length
+                if not budget.take():
+                    break
+
+                line_no += data[counted_to:line_start].count(b"\n")
+                counted_to = line_start
+                lines[line_no] = (_decode_line(data, line_start, line_end, encoding), True)
+
+                # 向前、向后各取 context_lines 行上下文，已记录的行不覆盖
+                start = line_start
+                for offset in range(1, context_lines + 1):
+                    if start == 0:
+                        break
+                    prev_start = data.rfind(b"\n", 0, start - 1) + 1
+                    lines.setdefault(line_no - offset, (_decode_line(data, prev_start, start - 1, encoding), False))
+                    start = prev_start
+                end = line_end
+                for offset in range(1, context_lines + 1):
+                    if end >= length:
+                        break
+                    next_end = data.find(b"\n", end + 1)
+                    if next_end == -1:
+                        next_end = length
+                    if next_end == end + 1 and next_end == length:
+                        break
+                    lines.setdefault(line_no + offset, (_decode_line(data, end + 1, next_end, encoding), False))
+                    end = next_end
+
+                pos = line_end + 1
+
+            return [(number, text, is_match) for number, (text, is_match) in sorted(lines.items())]
+        finally:
+            if mapped is not None:
+                mapped.close()
+
+
+def register_content_search_tools(mcp):
+    """注册内容搜索相关工具"""
+
+    @mcp.tool
+    def search_content(directory: str, query: str, regex: bool = False, case_sensitive: bool = True,
+                       pattern: Union[str, List[str]] = "*", filters: Dict[str, Any] = None,
+                       context_lines: int = 0, max_matches: int = 100, encoding: str = "utf-8"):
+        """
+        在目录下的文本文件中搜索内容（类似 grep），递归搜索，自动跳过二进制文件
+        :param directory: 要搜索的目录
+        :param query: 要查找的字符串；regex=True 时为正则表达式
+        :param regex: 是否按正则表达式搜索（默认按字面字符串）
+        :param case_sensitive: 是否区分大小写（默认True）
+        :param pattern: 只搜索文件名匹配的文件，如 "*.py" 或 ["*.md", "*.txt"]（默认全部）
+        :param filters: 额外过滤条件（可选），与 find_files 相同，如 {"max_size": 10485760}；
+                        默认排除 .git、node_modules 等目录，传入 exclude 时以传入的为准
+        :param context_lines: 每处匹配前后显示的上下文行数（默认0，最多5）
+        :param max_matches: 最多返回的匹配行数（默认100，最多1000），达到后停止搜索
+        :param encoding: 文件编码（默认utf-8），如 "gbk"
+        :return: 按文件分组的匹配行（带行号）
+        """
+        try:
+            if not fs.exists(directory):
+                return f"错误: 目录 {directory} 不存在"
+
+            if not fs.isdir(directory):
+                return f"错误: {directory} 不是一个目录"
+
+            if not query:
+                return "错误: query 不能为空"
+
+            try:
+                search_regex = compile_search(query, regex, case_sensitive, encoding)
+            except re.error as e:
+                return f"错误: 正则表达式无效 - {str(e)}"
+            except LookupError:
+                return f"错误: 未知的编码 {encoding}"
+
+            try:
+                file_query = FileQuery.from_spec(pattern, filters, fixed={"file_type": "file"}, recursive=True,
+                                                 exclude=DEFAULT_EXCLUDE)
+            except ValueError as e:
+                return f"错误: {str(e)}"
+
+            max_matches = max(1, min(int(max_matches), MAX_MATCHES_LIMIT))
+            context_lines = max(0, min(int(context_lines), MAX_CONTEXT_LINES))
+
+            started = time.perf_counter()
+            entries = file_query.scan(directory)
+            budget = MatchBudget(max_matches)
+            stats = {"searched": 0, "binary": 0, "bytes": 0}
+            stats_lock = threading.Lock()
+            errors = []
+
+            def search_one(entry):
+                if budget.exhausted:
+                    return entry, None
+                # 跳过FIFO、设备等非普通文件，避免打开时阻塞
+                if not fs.isfile(entry.path):
+                    return entry, None
+                try:
+                    with io_slot(entry.path):
+                        lines = search_file(entry.path, search_regex, context_lines, budget, encoding)
+                except PermissionError:
+                    errors.append(f"  {entry.rel_path}: 权限不足，无法读取")
+                    return entry, None
+                except Exception as e:
+                    errors.append(f"  {entry.rel_path}: 读取失败 - {str(e)}")
+                    return entry, None
+                with stats_lock:
+                    if lines is None:
+                        stats["binary"] += 1
+                    else:
+                        stats["searched"] += 1
+                        stats["bytes"] += entry.size
+                return entry, lines
+
+            results = []
+            with ThreadPoolExecutor(max_workers=SEARCH_WORKERS) as executor:
+                for index, (entry, lines) in enumerate(executor.map(fs.in_scope(search_one), entries)):
+                    report_progress(index, len(entries))
+                    if lines:
+                        results.append((entry, lines))
+
+            elapsed = time.perf_counter() - started
+            match_count = sum(1 for _, lines in results for _, _, is_match in lines if is_match)
+
+            summary = f"🔎 内容搜索: {'正则' if regex else '字符串'} '{query}'"
+            summary += f"{'' if case_sensitive else '（不区分大小写）'}\n"
+            summary += f"目录: {directory}\n"
+            summary += f"文件条件: {file_query.describe()}\n"
+            summary += (f"候选文件 {len(entries)} 个，已搜索 {stats['searched']} 个"
+                        f"（{stats['bytes']} 字节），跳过二进制 {stats['binary']} 个，耗时 {elapsed:.2f} 秒\n")
+
+            if not results:
+                summary += "\n没有找到匹配的内容"
+            else:
+                summary += f"在 {len(results)} 个文件中找到 {match_count} 处匹配"
+                if budget.exhausted:
+                    summary += f"（已达到上限 {max_matches}，提前停止，结果可能不完整）"
+                summary += "\n"
+
+                for entry, lines in results:
+                    summary += f"\n{entry.rel_path}:\n"
+                    previous = None
+                    for number, text, is_match in lines:
+                        if context_lines and previous is not None and number != previous + 1:
+                            summary += "  --\n"
+                        summary += f"  {number}{':' if is_match else '-'} {text}\n"
+                        previous = number
+
+            if errors:
+                summary += f"\n无法读取 {len(errors)} 个文件:\n" + "\n".join(errors[:20])
+                if len(errors) > 20:
+                    summary += f"\n  ... 其余 {len(errors) - 20} 个未显示"
+
+            return summary
+
+        except Exception as e:
+            return f"搜索内容时出错: {str(e)}"
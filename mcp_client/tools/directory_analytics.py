@@ -0,0 +1,271 @@
+"""
+目录分析工具模块
+一次遍历把文件元数据收集为列式数组（大小、修改时间、扩展名ID、深度、顶层目录ID），
+再用向量化运算计算按扩展名/顶层目录的空间占用、文件年龄分布、大小分位数和按月增长，
+只返回简短的汇总而不是完整的文件列表
+
+安装了 NumPy 时使用 NumPy 计算，否则回退到标准库 array 模块和纯 Python 实现，结果相同
+"""
+
+import os
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from . import fs
+from .file_query import FileQuery
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 文件年龄分段（天），最后一段为“更早”
+AGE_BUCKETS = [1, 7, 30, 90, 180, 365, 730]
+AGE_LABELS = ["1天内", "1-7天", "7-30天", "1-3个月", "3-6个月", "6-12个月", "1-2年", "2年以上"]
+
+# 计算的大小分位数
+PERCENTILES = [50, 90, 99]
+
+# 增长统计覆盖的最近月数
+GROWTH_MONTHS = 12
+
+# 扩展名/顶层目录默认列出的条目数
+DEFAULT_TOP_N = 10
+MAX_TOP_N = 50
+
+
+class FileColumns:
+    """一次遍历得到的列式元数据，字符串列以ID存储，名称保存在查找表中"""
+
+    def __init__(self):
+        self.sizes = array("q")
+        self.mtimes = array("d")
+        self.ext_ids = array("l")
+        self.depths = array("l")
+        self.top_ids = array("l")
+        self.ext_names: List[str] = []
+        self.top_names: List[str] = []
+        self._ext_index: Dict[str, int] = {}
+        self._top_index: Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self.sizes)
+
+    @staticmethod
+    def _intern(name: str, index: Dict[str, int], names: List[str]) -> int:
+        value = index.get(name)
+        if value is None:
+            value = index[name] = len(names)
+            names.append(name)
+        return value
+
+    def append(self, rel_path: str, name: str, depth: int, size: int, mtime: float):
+        ext = os.path.splitext(name)[1].lower() or "(无扩展名)"
+        top = rel_path.split("/", 1)[0] if depth > 0 else "(根目录文件)"
+        self.sizes.append(size)
+        self.mtimes.append(mtime)
+        self.ext_ids.append(self._intern(ext, self._ext_index, self.ext_names))
+        self.depths.append(depth)
+        self.top_ids.append(self._intern(top, self._top_index, self.top_names))
+
+    def memory_bytes(self) -> int:
+        return sum(col.itemsize * len(col) for col in (self.sizes, self.mtimes, self.ext_ids, self.depths, self.top_ids))
+
+
+def collect_columns(directory: str, query: FileQuery) -> FileColumns:
+    columns = FileColumns()
+    for item, rel_path, depth, st in query.walk(directory):
+        columns.append(rel_path, item.name, depth, st.st_size, st.st_mtime)
+    return columns
+
+
+def _month_key(timestamp: float) -> int:
+    """按UTC月份编号（年*12+月-1），与 NumPy datetime64 的月份换算一致"""
+    moment = datetime.fromtimestamp(timestamp, timezone.utc)
+    return moment.year * 12 + moment.month - 1
+
+
+def _nearest_rank(sorted_values, percent: float):
+    if len(sorted_values) == 0:
+        return 0
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize_numpy(columns: FileColumns, now: float) -> Dict[str, Any]:
+    # array 的类型码与 NumPy 的 dtype 字符一致，直接共享内存，不复制
+    sizes, mtimes, ext_ids, top_ids, depths = (
+        np.frombuffer(col, dtype=col.typecode)
+        for col in (columns.sizes, columns.mtimes, columns.ext_ids, columns.top_ids, columns.depths)
+    )
+    weights = sizes.astype(np.float64)
+
+    age_days = (now - mtimes) / 86400
+    age_bins = np.digitize(age_days, AGE_BUCKETS)
+    months = mtimes.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64) + 1970 * 12
+    current_month = _month_key(now)
+    recent = (months > current_month - GROWTH_MONTHS) & (months <= current_month)
+    month_offsets = months[recent] - (current_month - GROWTH_MONTHS + 1)
+
+    sorted_sizes = np.sort(sizes)
+    return {
+        "ext_bytes": np.bincount(ext_ids, weights=weights, minlength=len(columns.ext_names)).tolist(),
+        "ext_counts": np.bincount(ext_ids, minlength=len(columns.ext_names)).tolist(),
+        "top_bytes": np.bincount(top_ids, weights=weights, minlength=len(columns.top_names)).tolist(),
+        "top_counts": np.bincount(top_ids, minlength=len(columns.top_names)).tolist(),
+        "age_bytes": np.bincount(age_bins, weights=weights, minlength=len(AGE_LABELS)).tolist(),
+        "age_counts": np.bincount(age_bins, minlength=len(AGE_LABELS)).tolist(),
+        "growth_bytes": np.bincount(month_offsets, weights=weights[recent], minlength=GROWTH_MONTHS).tolist(),
+        "growth_counts": np.bincount(month_offsets, minlength=GROWTH_MONTHS).tolist(),
+        "percentiles": {p: int(_nearest_rank(sorted_sizes, p)) for p in PERCENTILES},
+        "max_size": int(sorted_sizes[-1]),
+        "mean_size": float(weights.mean()),
+        "max_depth": int(depths.max()),
+        "median_age_days": float(np.median(age_days)),
+    }
+
+
+def summarize_python(columns: FileColumns, now: float) -> Dict[str, Any]:
+    ext_bytes = [0] * len(columns.ext_names)
+    ext_counts = [0] * len(columns.ext_names)
+    top_bytes = [0] * len(columns.top_names)
+    top_counts = [0] * len(columns.top_names)
+    age_bytes = [0] * len(AGE_LABELS)
+    age_counts = [0] * len(AGE_LABELS)
+    growth_bytes = [0] * GROWTH_MONTHS
+    growth_counts = [0] * GROWTH_MONTHS
+    first_month = _month_key(now) - GROWTH_MONTHS + 1
+    ages = []
+
+    for size, mtime, ext_id, top_id in zip(columns.sizes, columns.mtimes, columns.ext_ids, columns.top_ids):
+        ext_bytes[ext_id] += size
+        ext_counts[ext_id] += 1
+        top_bytes[top_id] += size
+        top_counts[top_id] += 1
+        age = (now - mtime) / 86400
+        ages.append(age)
+        bucket = next((i for i, limit in enumerate(AGE_BUCKETS) if age < limit), len(AGE_BUCKETS))
+        age_bytes[bucket] += size
+        age_counts[bucket] += 1
+        offset = _month_key(mtime) - first_month
+        if 0 <= offset < GROWTH_MONTHS:
+            growth_bytes[offset] += size
+            growth_counts[offset] += 1
+
+    sorted_sizes = sorted(columns.sizes)
+    ages.sort()
+    middle = len(ages) // 2
+    median_age = ages[middle] if len(ages) % 2 else (ages[middle - 1] + ages[middle]) / 2
+    return {
+        "ext_bytes": ext_bytes,
+        "ext_counts": ext_counts,
+        "top_bytes": top_bytes,
+        "top_counts": top_counts,
+        "age_bytes": age_bytes,
+        "age_counts": age_counts,
+        "growth_bytes": growth_bytes,
+        "growth_counts": growth_counts,
+        "percentiles": {p: _nearest_rank(sorted_sizes, p) for p in PERCENTILES},
+        "max_size": sorted_sizes[-1],
+        "mean_size": sum(sorted_sizes) / len(sorted_sizes),
+        "max_depth": max(columns.depths),
+        "median_age_days": median_age,
+    }
+
+
+def format_size(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if abs(size) < 1024 or unit == "TB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def _share(part: float, total: float) -> str:
+    return f"{part / total * 100:.1f}%" if total else "-"
+
+
+def register_directory_analytics_tools(mcp):
+    """注册目录分析相关工具"""
+
+    @mcp.tool
+    def analyze_directory(directory: str, filters: Dict[str, Any] = None, top_n: int = DEFAULT_TOP_N):
+        """
+        分析目录的空间占用（递归，包含隐藏文件）：按扩展名和顶层子目录统计大小、文件年龄分布、
+        文件大小分位数和最近12个月的按月（UTC）增长，只返回汇总，适合回答“哪些类型/多旧的文件占用了空间”
+        :param directory: 要分析的目录
+        :param filters: 额外过滤条件（可选），与 find_files 相同，如 {"exclude": [".git"], "min_size": 1024}
+        :param top_n: 扩展名和顶层目录各列出的条目数（默认10，最多50）
+        :return: 目录分析汇总
+        """
+        try:
+            if not fs.exists(directory):
+                return f"错误: 目录 {directory} 不存在"
+
+            if not fs.isdir(directory):
+                return f"错误: {directory} 不是一个目录"
+
+            try:
+                query = FileQuery.from_spec("*", filters, fixed={"file_type": "file"}, recursive=True,
+                                            include_hidden=True)
+            except ValueError as e:
+                return f"错误: {str(e)}"
+
+            top_n = max(1, min(int(top_n), MAX_TOP_N))
+
+            started = time.perf_counter()
+            columns = collect_columns(directory, query)
+            scan_seconds = time.perf_counter() - started
+
+            if not len(columns):
+                return f"在 {directory} 中没有找到符合条件的文件（{query.describe()}）"
+
+            now = time.time()
+            stats = summarize_numpy(columns, now) if np is not None else summarize_python(columns, now)
+            total_seconds = time.perf_counter() - started
+
+            total_bytes = sum(stats["ext_bytes"])
+            file_count = len(columns)
+
+            result = f"📊 目录分析: {directory}\n"
+            result += f"条件: {query.describe()}\n"
+            result += f"文件 {file_count} 个，共 {format_size(total_bytes)}，最大深度 {stats['max_depth'] + 1} 层\n"
+            result += (f"文件大小: 平均 {format_size(stats['mean_size'])}，"
+                       + "，".join(f"P{p} {format_size(v)}" for p, v in stats["percentiles"].items())
+                       + f"，最大 {format_size(stats['max_size'])}\n")
+            result += f"修改时间中位数: {stats['median_age_days']:.0f} 天前\n"
+
+            def ranked(names, sizes, counts, title):
+                order = sorted(range(len(names)), key=lambda i: -sizes[i])
+                text = f"\n{title}（前 {min(top_n, len(order))}/{len(order)}）:\n"
+                for i in order[:top_n]:
+                    text += (f"  {names[i]}: {format_size(sizes[i])} ({_share(sizes[i], total_bytes)})，"
+                             f"{counts[i]} 个文件\n")
+                rest = order[top_n:]
+                if rest:
+                    rest_bytes = sum(sizes[i] for i in rest)
+                    text += (f"  其余 {len(rest)} 项: {format_size(rest_bytes)} ({_share(rest_bytes, total_bytes)})，"
+                             f"{sum(counts[i] for i in rest)} 个文件\n")
+                return text
+
+            result += ranked(columns.ext_names, stats["ext_bytes"], stats["ext_counts"], "按扩展名")
+            result += ranked(columns.top_names, stats["top_bytes"], stats["top_counts"], "按顶层目录")
+
+            result += "\n按修改时间:\n"
+            for label, size, count in zip(AGE_LABELS, stats["age_bytes"], stats["age_counts"]):
+                if count:
+                    result += f"  {label}: {format_size(size)} ({_share(size, total_bytes)})，{count} 个文件\n"
+
+            result += f"\n最近 {GROWTH_MONTHS} 个月的新增/修改（按修改月份）:\n"
+            first_month = _month_key(now) - GROWTH_MONTHS + 1
+            for offset, (size, count) in enumerate(zip(stats["growth_bytes"], stats["growth_counts"])):
+                year, month = divmod(first_month + offset, 12)
+                result += f"  {year:04d}-{month + 1:02d}: {format_size(size)}，{count} 个文件\n"
+
+            result += (f"\n扫描耗时 {scan_seconds:.2f} 秒，总耗时 {total_seconds:.2f} 秒"
+                       f"（{'NumPy' if np is not None else '纯Python'}，列数据 {format_size(columns.memory_bytes())}）")
+            return result
+
+        except Exception as e:
+            return f"分析目录时出错: {str(e)}"
@@ -0,0 +1,532 @@
+"""
+归档工具模块
+- 将匹配的文件流式写入 tar/tar.gz/zip，tar.gz 的压缩按数据块分发到线程池并行完成，内存占用与归档大小无关
+- 流式解压 zip/tar 归档，zip 的各成员并行写出，带成员过滤、大小限制和路径穿越防护
+"""
+
+import fnmatch
+import gzip
+import os
+import re
+import stat
+import tarfile
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, List, Union
+
+from . import fs
+from .file_listing import format_listing
+from .file_query import FileEntry, FileQuery
+from .io_scheduler import io_slot
+from .jobs import report_progress
+from .path_locks import path_locked
+
+# 并行压缩的线程数与数据块大小
+ARCHIVE_WORKERS = os.cpu_count() or 4
+ARCHIVE_CHUNK_SIZE = 1024 * 1024
+
+# 支持的归档格式
+ARCHIVE_FORMATS = ("tar", "tar.gz", "zip")
+
+# 并行解压的线程数与流式复制的缓冲区大小
+EXTRACT_WORKERS = 8
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# 结果中最多展示的条目数
+MAX_ITEMS_SHOWN = 20
+MAX_LISTING_SHOWN = 200
+
+
+class ParallelGzipWriter:
+    """
+    并行gzip写入器（类文件对象，只支持顺序写）
+    写入的数据按固定大小分块，每块独立压缩为一个gzip成员并按顺序写出；
+    多成员gzip是合法的gzip流，gzip/tar 均可直接解压。
+    同时在途的数据块数有上限，因此内存占用恒定
+    """
+
+    def __init__(self, fileobj, executor: ThreadPoolExecutor, level: int = 6,
+                 chunk_size: int = ARCHIVE_CHUNK_SIZE, max_pending: int = ARCHIVE_WORKERS * 2):
+        self.fileobj = fileobj
+        self.executor = executor
+        self.level = level
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending
+        self.bytes_in = 0
+        self._buffer = bytearray()
+        self._pending = deque()
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self.bytes_in += len(data)
+        while len(self._buffer) >= self.chunk_size:
+            self._submit(bytes(self._buffer[:self.chunk_size]))
+            del self._buffer[:self.chunk_size]
+        return len(data)
+
+    def _submit(self, chunk: bytes):
+        # zlib 压缩时释放GIL，多个数据块可以真正并行
+        self._pending.append(self.executor.submit(gzip.compress, chunk, self.level, mtime=0))
+        while len(self._pending) >= self.max_pending:
+            self.fileobj.write(self._pending.popleft().result())
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        while self._pending:
+            self.fileobj.write(self._pending.popleft().result())
+
+
+def collect_archive_entries(matched: List[FileEntry], output_path: str) -> List[tuple]:
+    """
+    收集要归档的文件，匹配到的文件夹展开为其中的所有文件
+    :return: [(文件路径, 归档内路径, 大小)]，不包含输出文件本身
+    """
+    output_real = os.path.realpath(output_path)
+    entries = []
+    seen = set()
+    for entry in matched:
+        if entry.is_dir:
+            children = FileQuery(recursive=True, include_hidden=True, file_type="file").scan(entry.path)
+            items = [(c.path, f"{entry.rel_path}/{c.rel_path}", c.size) for c in children]
+        else:
+            items = [(entry.path, entry.rel_path, entry.size)]
+        for path, arcname, size in items:
+            if arcname in seen or os.path.realpath(path) == output_real:
+                continue
+            seen.add(arcname)
+            entries.append((path, arcname, size))
+    return entries
+
+
+def write_archive(output_path: str, archive_format: str, entries: List[tuple], level: int) -> int:
+    """
+    流式写入归档，返回写入的原始字节数
+    文件内容按块读取，内存占用与文件和归档大小无关
+    """
+    if archive_format == "zip":
+        with zipfile.ZipFile(output_path, "w", compression=zipfile.ZIP_DEFLATED,
+                             compresslevel=level, allowZip64=True) as zf:
+            for index, (path, arcname, _) in enumerate(entries):
+                report_progress(index, len(entries))
+                with io_slot(path, output_path):
+                    zf.write(path, arcname)
+        fs.invalidate(output_path)
+        return sum(size for _, _, size in entries)
+
+    with fs.open_file(output_path, "wb") as raw:
+        if archive_format == "tar.gz":
+            with ThreadPoolExecutor(max_workers=ARCHIVE_WORKERS) as executor:
+                writer = ParallelGzipWriter(raw, executor, level=level)
+                with tarfile.open(fileobj=writer, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+                    for index, (path, arcname, _) in enumerate(entries):
+                        report_progress(index, len(entries))
+                        with io_slot(path, output_path):
+                            tar.add(path, arcname=arcname, recursive=False)
+                writer.close()
+        else:
+            with tarfile.open(fileobj=raw, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+                for index, (path, arcname, _) in enumerate(entries):
+                    report_progress(index, len(entries))
+                    with io_slot(path, output_path):
+                        tar.add(path, arcname=arcname, recursive=False)
+    return sum(size for _, _, size in entries)
+
+
+@contextmanager
+def open_tar_stream(path: str):
+    """以流模式打开 tar/tar.gz/tar.bz2/tar.xz（gzip 走 gzip 模块以兼容并行压缩生成的多成员gzip）"""
+    with fs.open_file(path, "rb") as f:
+        is_gzip = f.read(2) == b"\x1f\x8b"
+    if not is_gzip:
+        with tarfile.open(path, mode="r|*") as tar:
+            yield tar
+        return
+    with gzip.open(path, "rb") as gz, tarfile.open(fileobj=gz, mode="r|") as tar:
+        yield tar
+
+
+def verify_archive(output_path: str, archive_format: str, entries: List[tuple]) -> List[str]:
+    """
+    重新读取归档，校验每个文件都存在且大小一致（zip 额外校验CRC，gzip 解压时校验每个成员的CRC）
+    :return: 问题列表，为空表示校验通过
+    """
+    expected = {arcname: size for _, arcname, size in entries}
+    problems = []
+
+    if archive_format == "zip":
+        with zipfile.ZipFile(output_path) as zf:
+            bad_member = zf.testzip()
+            if bad_member:
+                problems.append(f"{bad_member}: CRC校验失败")
+            actual = {info.filename: info.file_size for info in zf.infolist() if not info.is_dir()}
+    else:
+        # tarfile 的 "r|gz" 流模式不支持多成员gzip，这里用 gzip 模块解压后再按流读取tar
+        actual = {}
+        with open_tar_stream(output_path) as tar:
+            for member in tar:
+                if member.isfile():
+                    actual[member.name] = member.size
+
+    for arcname, size in expected.items():
+        if arcname not in actual:
+            problems.append(f"{arcname}: 归档中缺失")
+        elif actual[arcname] != size:
+            problems.append(f"{arcname}: 大小不一致（源 {size} 字节，归档 {actual[arcname]} 字节）")
+    return problems
+
+
+def remove_empty_dirs(directory: str):
+    """自底向上删除已清空的文件夹（含自身），非空的保留"""
+    for root, dirs, _ in os.walk(directory, topdown=False):
+        for name in dirs:
+            try:
+                fs.rmdir(os.path.join(root, name))
+            except OSError:
+                pass
+    try:
+        fs.rmdir(directory)
+    except OSError:
+        pass
+
+
+def safe_member_path(target_real: str, name: str):
+    """
+    计算归档成员的解压路径，绝对路径、盘符、'..' 或经由符号链接逃出目标目录的成员返回 None
+    """
+    normalized = name.replace("\\", "/")
+    if normalized.startswith("/") or re.match(r"^[A-Za-z]:", normalized):
+        return None
+    parts = [p for p in normalized.split("/") if p not in ("", ".")]
+    if not parts or ".." in parts:
+        return None
+    dest = os.path.realpath(os.path.join(target_real, *parts))
+    if dest != target_real and not dest.startswith(target_real + os.sep):
+        return None
+    return dest
+
+
+def stream_to_file(source, dest_path: str, limit: int) -> int:
+    """
+    按块把成员内容写入文件，超过 limit 字节时中止（防止声明大小与实际不符）
+    :return: 写入的字节数
+    """
+    written = 0
+    try:
+        with fs.open_file(dest_path, "wb") as out:
+            while True:
+                chunk = source.read(COPY_BUFFER_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > limit:
+                    raise ValueError(f"实际大小超过声明大小 {limit} 字节")
+                out.write(chunk)
+    except BaseException:
+        if fs.exists(dest_path):
+            fs.remove(dest_path)
+        raise
+    return written
+
+
+def member_selected(name: str, member_patterns: List[str]) -> bool:
+    """成员名或其文件名匹配任意一个模式即选中，未指定模式时全部选中"""
+    if not member_patterns:
+        return True
+    base = name.rstrip("/").rsplit("/", 1)[-1]
+    return any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(base, p) for p in member_patterns)
+
+
+def default_extract_directory(archive_path: str) -> str:
+    """默认解压到归档所在目录下与归档同名（去掉扩展名）的文件夹"""
+    base = os.path.basename(archive_path)
+    for suffix in (".tar.gz", ".tar.bz2", ".tar.xz", ".tgz", ".tbz2", ".txz", ".tar", ".zip"):
+        if base.lower().endswith(suffix):
+            base = base[:-len(suffix)]
+            break
+    return os.path.join(os.path.dirname(os.path.abspath(archive_path)), base or "extracted")
+
+
+def register_file_archive_tools(mcp):
+    """注册归档相关工具"""
+
+    @mcp.tool
+    @path_locked(shared=[lambda args: None if args["delete_sources"] else args["directory"]],
+                 exclusive=["output_path", lambda args: args["directory"] if args["delete_sources"] else None])
+    def archive_files(directory: str, pattern: Union[str, List[str]], output_path: str,
+                      archive_format: str = "tar.gz", compress_level: int = 6,
+                      delete_sources: bool = False, filters: Dict[str, Any] = None):
+        """
+        将目录中匹配模式的文件流式打包为归档（如清理日志前先归档），可在校验通过后删除源文件
+        :param directory: 源目录
+        :param pattern: 文件模式，如 '*.log'，也可以是模式列表；匹配到的文件夹会整体归档
+        :param output_path: 输出归档文件路径
+        :param archive_format: 归档格式：'tar.gz'（默认，多线程并行压缩）、'tar'、'zip'
+        :param compress_level: 压缩级别 1-9（默认6）
+        :param delete_sources: 归档写入并校验通过后是否删除源文件（默认False）
+        :param filters: 额外过滤条件（可选），与 find_files 相同，如 {"older_than_days": 30, "recursive": true}
+        :return: 归档结果
+        """
+        try:
+            if not fs.exists(directory):
+                return f"错误: 目录 {directory} 不存在"
+
+            if not fs.isdir(directory):
+                return f"错误: {directory} 不是一个目录"
+
+            if archive_format not in ARCHIVE_FORMATS:
+                return f"错误: 不支持的归档格式 {archive_format}，仅支持 {', '.join(ARCHIVE_FORMATS)}"
+
+            if not 1 <= compress_level <= 9:
+                return f"错误: 压缩级别必须在 1-9 之间"
+
+            if fs.exists(output_path):
+                return f"错误: 输出文件 {output_path} 已存在"
+
+            try:
+                query = FileQuery.from_spec(pattern, filters)
+            except ValueError as e:
+                return f"错误: {str(e)}"
+
+            matched = query.scan(directory)
+            entries = collect_archive_entries(matched, output_path)
+            if not entries:
+                return f"在 {directory} 中未找到匹配 '{query.describe()}' 的文件"
+
+            output_dir = os.path.dirname(os.path.abspath(output_path))
+            fs.makedirs(output_dir, exist_ok=True)
+
+            started = time.perf_counter()
+            try:
+                total_bytes = write_archive(output_path, archive_format, entries, compress_level)
+            except BaseException:
+                fs.invalidate(output_path)
+                if fs.exists(output_path):
+                    fs.remove(output_path)
+                raise
+            write_seconds = time.perf_counter() - started
+
+            problems = verify_archive(output_path, archive_format, entries)
+            archive_size = fs.getsize(output_path)
+            ratio = archive_size / total_bytes if total_bytes else 0
+            throughput = total_bytes / write_seconds / (1024 * 1024) if write_seconds > 0 else 0
+
+            summary = f"📦 归档完成: {len(entries)} 个文件 → {output_path}\n"
+            summary += f"匹配模式: {query.describe()}\n"
+            summary += f"格式: {archive_format}，压缩级别 {compress_level}\n"
+            summary += f"原始大小: {total_bytes} 字节，归档大小: {archive_size} 字节 (压缩比 {ratio:.1%})\n"
+            summary += f"写入耗时: {write_seconds:.2f} 秒 ({throughput:.1f} MB/s)\n"
+
+            if problems:
+                summary += f"\n❗ 归档校验失败，源文件未删除:\n"
+                summary += "\n".join(f"  {p}" for p in problems[:MAX_ITEMS_SHOWN])
+                return summary
+
+            summary += "校验: 通过\n"
+
+            if delete_sources:
+                deleted = 0
+                errors = []
+                for path, arcname, _ in entries:
+                    try:
+                        with io_slot(path):
+                            fs.remove(path)
+                        deleted += 1
+                    except Exception as e:
+                        errors.append(f"  {arcname}: 删除失败 - {str(e)}")
+                for entry in matched:
+                    if entry.is_dir:
+                        remove_empty_dirs(entry.path)
+                summary += f"已删除源文件: {deleted}/{len(entries)} 个\n"
+                if errors:
+                    summary += "\n".join(errors[:MAX_ITEMS_SHOWN])
+
+            return summary
+
+        except Exception as e:
+            return f"归档文件时出错: {str(e)}"
+
+    @mcp.tool
+    @path_locked(shared=["archive_path"],
+                 exclusive=[lambda args: args["target_directory"] or default_extract_directory(args["archive_path"])])
+    def extract_archive(archive_path: str, target_directory: str = None, members: Union[str, List[str]] = None,
+                        max_total_size: int = None, max_member_size: int = None, overwrite: bool = False):
+        """
+        流式解压 zip/tar/tar.gz/tar.bz2/tar.xz 归档，不会把成员整体读入内存，zip 成员并行写出
+        :param archive_path: 归档文件路径
+        :param target_directory: 解压目标目录（可选，默认为归档旁边与归档同名的文件夹）
+        :param members: 只解压匹配的成员，通配符或通配符列表，如 '*.csv'、'data/*'（匹配成员路径或文件名）
+        :param max_total_size: 解压总大小上限（字节，可选）：按成员在归档中的顺序解压，
+                               下一个成员会使总大小超过上限时中止，已解压的文件保留，其后的成员不再解压
+        :param max_member_size: 单个成员大小上限（字节，可选），超过的成员会被跳过
+        :param overwrite: 是否覆盖已存在的文件（默认False，已存在则跳过）
+        :return: 解压结果及文件列表（与 list_files 格式相同）
+        """
+        try:
+            if not fs.exists(archive_path):
+                return f"错误: 归档文件 {archive_path} 不存在"
+
+            if not fs.isfile(archive_path):
+                return f"错误: {archive_path} 不是文件"
+
+            if isinstance(members, str):
+                members = [members]
+            member_patterns = list(members or [])
+
+            target_directory = target_directory or default_extract_directory(archive_path)
+            if fs.exists(target_directory) and not fs.isdir(target_directory):
+                return f"错误: {target_directory} 存在但不是目录"
+            fs.makedirs(target_directory, exist_ok=True)
+            target_real = os.path.realpath(target_directory)
+
+            extracted = []
+            folders = set()
+            skipped = []
+            started = time.perf_counter()
+
+            def plan_member(name: str, size: int, is_dir: bool):
+                """检查单个成员，返回解压路径或 None（并记录跳过原因）"""
+                if not member_selected(name, member_patterns):
+                    return None
+                dest = safe_member_path(target_real, name)
+                if dest is None:
+                    skipped.append(f"  {name}: 路径不安全（绝对路径或包含 '..'），已跳过")
+                    return None
+                if is_dir:
+                    return dest
+                if max_member_size is not None and size > max_member_size:
+                    skipped.append(f"  {name}: 大小 {size} 字节超过单个成员上限，已跳过")
+                    return None
+                if fs.lexists(dest) and not overwrite:
+                    skipped.append(f"  {name}: 目标文件已存在，已跳过")
+                    return None
+                return dest
+
+            def record_parents(dest: str):
+                rel_dir = os.path.relpath(os.path.dirname(dest), target_real)
+                while rel_dir not in (".", ""):
+                    folders.add(rel_dir.replace(os.sep, "/"))
+                    rel_dir = os.path.dirname(rel_dir)
+
+            if zipfile.is_zipfile(archive_path):
+                archive_type = "zip"
+                with zipfile.ZipFile(archive_path) as zf:
+                    jobs = []
+                    for info in zf.infolist():
+                        # 外部属性高16位为 Unix 模式，其中未记录文件类型时按普通文件处理
+                        file_type = stat.S_IFMT(info.external_attr >> 16)
+                        if file_type not in (0, stat.S_IFREG, stat.S_IFDIR):
+                            if member_selected(info.filename, member_patterns):
+                                skipped.append(f"  {info.filename}: 链接或特殊文件，已跳过")
+                            continue
+                        dest = plan_member(info.filename, info.file_size, info.is_dir())
+                        if dest is None:
+                            continue
+                        if info.is_dir():
+                            fs.makedirs(dest, exist_ok=True)
+                            record_parents(os.path.join(dest, ""))
+                            continue
+                        jobs.append((info, dest))
+
+                # 与 tar 相同：按归档顺序累计，超过上限的成员及其后的成员都不解压
+                if max_total_size is not None:
+                    declared_total = 0
+                    for index, (info, _) in enumerate(jobs):
+                        declared_total += info.file_size
+                        if declared_total > max_total_size:
+                            skipped.append(f"  {info.filename}: 解压总大小将超过上限 {max_total_size} 字节，已中止")
+                            jobs = jobs[:index]
+                            break
+
+                # 每个线程使用独立的 ZipFile 句柄，成员之间互不阻塞
+                local = threading.local()
+                handles = []
+                handles_lock = threading.Lock()
+
+                def extract_zip_member(job):
+                    info, dest = job
+                    if not hasattr(local, "zf"):
+                        local.zf = zipfile.ZipFile(archive_path)
+                        with handles_lock:
+                            handles.append(local.zf)
+                    try:
+                        fs.makedirs(os.path.dirname(dest), exist_ok=True)
+                        with io_slot(archive_path, dest), local.zf.open(info) as source:
+                            size = stream_to_file(source, dest, info.file_size)
+                        fs.utime(dest, (time.time(), time.mktime(info.date_time + (0, 0, -1))))
+                        return info.filename, dest, size, None
+                    except Exception as e:
+                        return info.filename, dest, 0, str(e)
+
+                try:
+                    extract = fs.in_scope(extract_zip_member)
+                    with ThreadPoolExecutor(max_workers=EXTRACT_WORKERS) as executor:
+                        for index, (name, dest, size, error) in enumerate(executor.map(extract, jobs)):
+                            report_progress(index, len(jobs))
+                            if error:
+                                skipped.append(f"  {name}: 解压失败 - {error}")
+                            else:
+                                extracted.append((os.path.relpath(dest, target_real).replace(os.sep, "/"), size))
+                                record_parents(dest)
+                finally:
+                    for handle in handles:
+                        handle.close()
+            else:
+                archive_type = "tar"
+                total = 0
+                try:
+                    with open_tar_stream(archive_path) as tar:
+                        for member in tar:
+                            report_progress(len(extracted), None, f"已解压 {total} 字节")
+                            if not (member.isfile() or member.isdir()):
+                                if member_selected(member.name, member_patterns):
+                                    skipped.append(f"  {member.name}: 链接或特殊文件，已跳过")
+                                continue
+                            dest = plan_member(member.name, member.size, member.isdir())
+                            if dest is None:
+                                continue
+                            if member.isdir():
+                                fs.makedirs(dest, exist_ok=True)
+                                record_parents(os.path.join(dest, ""))
+                                continue
+                            if max_total_size is not None and total + member.size > max_total_size:
+                                skipped.append(f"  {member.name}: 解压总大小将超过上限 {max_total_size} 字节，已中止")
+                                break
+                            fs.makedirs(os.path.dirname(dest), exist_ok=True)
+                            source = tar.extractfile(member)
+                            with io_slot(archive_path, dest):
+                                size = stream_to_file(source, dest, member.size)
+                            fs.utime(dest, (time.time(), member.mtime))
+                            total += size
+                            extracted.append((os.path.relpath(dest, target_real).replace(os.sep, "/"), size))
+                            record_parents(dest)
+                except (tarfile.TarError, OSError, EOFError) as e:
+                    if not extracted:
+                        return f"错误: 无法读取归档 {archive_path}（不是有效的 zip/tar 归档或已损坏）- {str(e)}"
+                    skipped.append(f"  归档读取中断: {str(e)}")
+
+            elapsed = time.perf_counter() - started
+            total_bytes = sum(size for _, size in extracted)
+            throughput = total_bytes / elapsed / (1024 * 1024) if elapsed > 0 else 0
+
+            summary = f"📂 解压完成: {archive_path} ({archive_type}) → {target_directory}\n"
+            summary += f"解压 {len(extracted)} 个文件，共 {total_bytes} 字节，跳过 {len(skipped)} 个，"
+            summary += f"耗时 {elapsed:.2f} 秒 ({throughput:.1f} MB/s)\n"
+            if skipped:
+                summary += "\n".join(skipped[:MAX_ITEMS_SHOWN]) + "\n"
+                if len(skipped) > MAX_ITEMS_SHOWN:
+                    summary += f"  ... 其余 {len(skipped) - MAX_ITEMS_SHOWN} 个未显示\n"
+            summary += "\n"
+
+            return summary + format_listing(target_directory, extracted, sorted(folders), limit=MAX_LISTING_SHOWN)
+
+        except Exception as e:
+            return f"解压归档时出错: {str(e)}"
@@ -3,17 +3,21 @@
 """
 
 import os
-import shutil
-import glob
-import time
-from typing import Union, List
+from typing import Any, Dict, Union, List
 from datetime import datetime
 
+from . import fs
+from .file_query import FileQuery, drop_nested
+from .io_scheduler import io_slot
+from .jobs import report_progress
+from .path_locks import path_locked
+
 
 def register_file_deletion_tools(mcp):
     """注册文件删除相关工具"""
     
     @mcp.tool
+    @path_locked(exclusive=["file_paths"])
     def delete_files(file_paths: Union[str, List[str]], confirm: bool = False):
         """
         删除指定的文件或文件夹，支持单个或批量操作
@@ -34,22 +38,22 @@ def register_file_deletion_tools(mcp):
                 total_size = 0
 
                 for file_path in items_to_delete:
-                    if not os.path.exists(file_path):
+                    if not fs.exists(file_path):
                         preview_info.append(f"  {file_path}: 文件/文件夹不存在")
                         continue
 
-                    if os.path.isfile(file_path):
-                        file_size = os.path.getsize(file_path)
+                    if fs.isfile(file_path):
+                        file_size = fs.getsize(file_path)
                         total_size += file_size
                         preview_info.append(f"  {file_path} ({file_size} 字节)")
-                    elif os.path.isdir(file_path):
+                    elif fs.isdir(file_path):
                         # 计算文件夹大小
                         folder_size = 0
                         file_count = 0
                         for root, dirs, files in os.walk(file_path):
                             for file in files:
                                 file_count += 1
-                                folder_size += os.path.getsize(os.path.join(root, file))
+                                folder_size += fs.getsize(os.path.join(root, file))
                         total_size += folder_size
                         preview_info.append(f"  {file_path} (包含 {file_count} 个文件，共 {folder_size} 字节)")
 
@@ -64,24 +68,27 @@ def register_file_deletion_tools(mcp):
             success_count = 0
             total_count = len(items_to_delete)
 
-            for file_path in items_to_delete:
+            for index, file_path in enumerate(items_to_delete):
+                report_progress(index, total_count)
                 # 检查文件是否存在
-                if not os.path.exists(file_path):
+                if not fs.exists(file_path):
                     results.append(f"  {file_path}: 文件/文件夹不存在")
                     continue
 
                 try:
-                    if os.path.isfile(file_path):
+                    if fs.isfile(file_path):
                         # 删除文件
-                        file_size = os.path.getsize(file_path)
-                        os.remove(file_path)
+                        file_size = fs.getsize(file_path)
+                        with io_slot(file_path):
+                            fs.remove(file_path)
                         results.append(f"  {os.path.basename(file_path)}: 文件删除成功 ({file_size} 字节)")
                         success_count += 1
 
-                    elif os.path.isdir(file_path):
+                    elif fs.isdir(file_path):
                         # 删除文件夹及其内容
                         folder_name = os.path.basename(file_path)
-                        shutil.rmtree(file_path)
+                        with io_slot(file_path):
+                            fs.rmtree(file_path)
                         results.append(f"  {folder_name}: 文件夹删除成功")
                         success_count += 1
 
@@ -104,43 +111,51 @@ def register_file_deletion_tools(mcp):
             return f"删除操作时出错: {str(e)}"
 
     @mcp.tool
-    def delete_files_by_pattern(directory: str, pattern: str, confirm: bool = False):
+    @path_locked(exclusive=["directory"])
+    def delete_files_by_pattern(directory: str, pattern: Union[str, List[str]], confirm: bool = False,
+                                filters: Dict[str, Any] = None):
         """
         根据模式批量删除文件（如删除所有临时文件）
         :param directory: 目标目录
-        :param pattern: 文件模式，如 '*.tmp', '*.log', '*backup*' 等
+        :param pattern: 文件模式，如 '*.tmp', '*.log', '*backup*' 等，也可以是模式列表
         :param confirm: 确认删除标志，设为True才会真正执行删除操作
+        :param filters: 额外过滤条件（可选），与 find_files 相同：exclude, regex, min_size, max_size,
+                        older_than_days, newer_than_days, modified_after, modified_before,
+                        recursive, max_depth, file_type, include_hidden
         :return: 删除操作结果
         """
         try:
-            if not os.path.exists(directory):
+            if not fs.exists(directory):
                 return f"错误: 目录 {directory} 不存在"
 
-            if not os.path.isdir(directory):
+            if not fs.isdir(directory):
                 return f"错误: {directory} 不是一个目录"
 
-            # 查找匹配的文件
-            search_path = os.path.join(directory, pattern)
-            matched_files = glob.glob(search_path)
+            try:
+                query = FileQuery.from_spec(pattern, filters)
+            except ValueError as e:
+                return f"错误: {str(e)}"
+
+            # 查找匹配的文件（文件夹内的匹配项随文件夹一起删除）
+            matched_files = drop_nested(query.scan(directory))
+            description = query.describe()
 
             if not matched_files:
-                return f"在 {directory} 中未找到匹配 '{pattern}' 的文件"
+                return f"在 {directory} 中未找到匹配 '{description}' 的文件"
 
             # 安全检查：如果没有确认，只显示要删除的文件
             if not confirm:
                 preview_info = []
                 total_size = 0
 
-                for file_path in sorted(matched_files):
-                    file_name = os.path.basename(file_path)
-                    if os.path.isfile(file_path):
-                        file_size = os.path.getsize(file_path)
-                        total_size += file_size
-                        preview_info.append(f"  {file_name} ({file_size} 字节)")
-                    elif os.path.isdir(file_path):
-                        preview_info.append(f"  {file_name} (文件夹)")
+                for entry in matched_files:
+                    if entry.is_dir:
+                        preview_info.append(f"  {entry.rel_path} (文件夹)")
+                    else:
+                        total_size += entry.size
+                        preview_info.append(f"  {entry.rel_path} ({entry.size} 字节)")
 
-                warning_msg = f"  模式删除预览 (匹配 '{pattern}')\n"
+                warning_msg = f"  模式删除预览 (匹配 '{description}')\n"
                 warning_msg += f"目录: {directory}\n"
                 warning_msg += f"找到 {len(matched_files)} 个匹配项，总大小 {total_size} 字节\n\n"
                 warning_msg += "\n".join(preview_info)
@@ -154,21 +169,24 @@ def register_file_deletion_tools(mcp):
             total_count = len(matched_files)
             total_size_deleted = 0
 
-            for file_path in sorted(matched_files):
-                file_name = os.path.basename(file_path)
+            for index, entry in enumerate(matched_files):
+                report_progress(index, total_count)
+                file_path = entry.path
+                file_name = entry.rel_path
 
                 try:
-                    if os.path.isfile(file_path):
+                    if not entry.is_dir:
                         # 删除文件
-                        file_size = os.path.getsize(file_path)
-                        os.remove(file_path)
-                        total_size_deleted += file_size
-                        results.append(f"  {file_name}: 删除成功 ({file_size} 字节)")
+                        with io_slot(file_path):
+                            fs.remove(file_path)
+                        total_size_deleted += entry.size
+                        results.append(f"  {file_name}: 删除成功 ({entry.size} 字节)")
                         success_count += 1
 
-                    elif os.path.isdir(file_path):
+                    else:
                         # 删除文件夹
-                        shutil.rmtree(file_path)
+                        with io_slot(file_path):
+                            fs.rmtree(file_path)
                         results.append(f"  {file_name}: 文件夹删除成功")
                         success_count += 1
 
@@ -181,7 +199,7 @@ def register_file_deletion_tools(mcp):
 
             # 生成结果摘要
             summary = f"🗑️  模式匹配删除操作完成: 成功 {success_count}/{total_count} 个文件\n"
-            summary += f"匹配模式: {pattern}\n"
+            summary += f"匹配模式: {description}\n"
             summary += f"目录: {directory}\n"
             summary += f"删除文件总大小: {total_size_deleted} 字节\n\n"
 
@@ -191,61 +209,55 @@ def register_file_deletion_tools(mcp):
             return f"模式匹配删除时出错: {str(e)}"
 
     @mcp.tool
-    def safe_cleanup(directory: str, days_old: int = 7, file_patterns: List[str] = None, confirm: bool = False):
+    @path_locked(exclusive=["directory"])
+    def safe_cleanup(directory: str, days_old: int = 7, file_patterns: List[str] = None, confirm: bool = False,
+                     filters: Dict[str, Any] = None):
         """
         安全清理目录：删除指定天数前的旧文件（可指定文件类型）
         :param directory: 要清理的目录
         :param days_old: 删除多少天前的文件（默认7天）
         :param file_patterns: 文件模式列表，如 ['*.tmp', '*.log']，None表示所有文件
         :param confirm: 确认删除标志，设为True才会真正执行删除操作
+        :param filters: 额外过滤条件（可选），与 find_files 相同：exclude, regex, min_size, max_size,
+                        older_than_days, newer_than_days, modified_after, modified_before,
+                        recursive, max_depth, include_hidden（只清理文件，file_type 不能改为其他值）
         :return: 清理操作结果
         """
         try:
-            if not os.path.exists(directory):
+            if not fs.exists(directory):
                 return f"错误: 目录 {directory} 不存在"
 
-            if not os.path.isdir(directory):
+            if not fs.isdir(directory):
                 return f"错误: {directory} 不是一个目录"
 
-            # 计算时间阈值
-            cutoff_time = time.time() - (days_old * 24 * 60 * 60)
-            cutoff_date = datetime.fromtimestamp(cutoff_time).strftime('%Y-%m-%d %H:%M:%S')
-
-            # 查找符合条件的文件
-            files_to_delete = []
-
-            if file_patterns is None:
-                # 所有文件
-                for item in os.listdir(directory):
-                    item_path = os.path.join(directory, item)
-                    if os.path.isfile(item_path) and os.path.getmtime(item_path) < cutoff_time:
-                        files_to_delete.append(item_path)
-            else:
-                # 按模式匹配
-                for pattern in file_patterns:
-                    search_path = os.path.join(directory, pattern)
-                    matched_files = glob.glob(search_path)
-                    for file_path in matched_files:
-                        if os.path.isfile(file_path) and os.path.getmtime(file_path) < cutoff_time:
-                            files_to_delete.append(file_path)
+            # 所有模式与时间阈值编译为一个查询，单次遍历完成匹配（无需按模式分别查找再去重）
+            # 未指定模式时清理所有文件（包括隐藏文件）
+            try:
+                query = FileQuery.from_spec(
+                    file_patterns or "*",
+                    filters,
+                    fixed={"file_type": "file"},
+                    older_than_days=days_old,
+                    include_hidden=file_patterns is None,
+                )
+            except ValueError as e:
+                return f"错误: {str(e)}"
+            cutoff_date = datetime.fromtimestamp(query.mtime_max).strftime('%Y-%m-%d %H:%M:%S') if query.mtime_max else "不限"
+
+            files_to_delete = query.scan(directory)
 
             if not files_to_delete:
                 return f"在 {directory} 中未找到 {days_old} 天前的旧文件"
 
-            # 去重
-            files_to_delete = list(set(files_to_delete))
-
             # 安全检查：如果没有确认，只显示要删除的文件
             if not confirm:
                 preview_info = []
                 total_size = 0
 
-                for file_path in sorted(files_to_delete):
-                    file_name = os.path.basename(file_path)
-                    file_size = os.path.getsize(file_path)
-                    file_date = datetime.fromtimestamp(os.path.getmtime(file_path)).strftime('%Y-%m-%d %H:%M:%S')
-                    total_size += file_size
-                    preview_info.append(f"  {file_name} ({file_size} 字节, 修改时间: {file_date})")
+                for entry in files_to_delete:
+                    file_date = datetime.fromtimestamp(entry.mtime).strftime('%Y-%m-%d %H:%M:%S')
+                    total_size += entry.size
+                    preview_info.append(f"  {entry.rel_path} ({entry.size} 字节, 修改时间: {file_date})")
 
                 warning_msg = f"  安全清理预览\n"
                 warning_msg += f"目录: {directory}\n"
@@ -263,15 +275,16 @@ def register_file_deletion_tools(mcp):
             success_count = 0
             total_size_deleted = 0
 
-            for file_path in sorted(files_to_delete):
-                file_name = os.path.basename(file_path)
+            for index, entry in enumerate(files_to_delete):
+                report_progress(index, len(files_to_delete))
+                file_name = entry.rel_path
 
                 try:
-                    file_size = os.path.getsize(file_path)
-                    file_date = datetime.fromtimestamp(os.path.getmtime(file_path)).strftime('%Y-%m-%d %H:%M:%S')
-                    os.remove(file_path)
-                    total_size_deleted += file_size
-                    results.append(f"  {file_name}: 删除成功 ({file_size} 字节, {file_date})")
+                    file_date = datetime.fromtimestamp(entry.mtime).strftime('%Y-%m-%d %H:%M:%S')
+                    with io_slot(entry.path):
+                        fs.remove(entry.path)
+                    total_size_deleted += entry.size
+                    results.append(f"  {file_name}: 删除成功 ({entry.size} 字节, {file_date})")
                     success_count += 1
 
                 except PermissionError:
@@ -3,95 +3,161 @@
 """
 
 import os
-import glob
+from typing import Any, Dict, List, Optional, Union
+
+from . import fs, listing_snapshots
+from .file_query import FileQuery
+
+
+def format_listing(directory: str, files: List[tuple], folders: List[str], limit: int = None) -> str:
+    """
+    生成 list_files 风格的紧凑列表，其他工具返回文件列表时也使用此格式
+    :param directory: 目录路径
+    :param files: [(文件名, 大小)] 列表
+    :param folders: 文件夹名列表
+    :param limit: 每类最多列出的条目数（可选，默认全部列出）
+    :return: 列表描述
+    """
+    file_lines = sorted(f"{name} ({size} 字节)" for name, size in files)
+    folder_lines = sorted(folders)
+
+    result = f"目录: {directory}\n"
+    result += f"共找到 {len(file_lines)} 个文件，{len(folder_lines)} 个文件夹\n\n"
+
+    if folder_lines:
+        result += " 文件夹:\n"
+        for folder in folder_lines[:limit]:
+            result += f"  - {folder}\n"
+        if limit is not None and len(folder_lines) > limit:
+            result += f"  ... 其余 {len(folder_lines) - limit} 个文件夹未列出\n"
+        result += "\n"
+
+    if file_lines:
+        result += " 文件:\n"
+        for file in file_lines[:limit]:
+            result += f"  - {file}\n"
+        if limit is not None and len(file_lines) > limit:
+            result += f"  ... 其余 {len(file_lines) - limit} 个文件未列出\n"
+
+    return result
 
 
 def register_file_listing_tools(mcp):
     """注册文件列表和查找相关工具"""
     
     @mcp.tool
-    def list_files(directory: str):
+    def list_files(directory: str, since: Optional[str] = None):
         """
         列出指定目录下的所有文件和文件夹
         :param directory: 目录路径
-        :return: 文件列表描述
+        :param since: 上次调用返回的快照令牌（可选），给出时只返回之后新增、删除和变更的条目
+        :return: 文件列表描述，末尾附新的快照令牌
         """
         try:
-            if not os.path.exists(directory):
+            if not fs.exists(directory):
                 return f"错误: 目录 {directory} 不存在"
 
-            if not os.path.isdir(directory):
+            if not fs.isdir(directory):
                 return f"错误: {directory} 不是一个目录"
 
-            items = os.listdir(directory)
-
-            if not items:
-                return f"目录 {directory} 是空的"
+            # 一次 scandir 同时取得类型（来自目录项，通常无需 stat），只对文件 stat 取大小
+            with os.scandir(directory) as iterator:
+                items = list(iterator)
 
             files = []
             folders = []
+            entries = []
 
             for item in items:
-                item_path = os.path.join(directory, item)
-                if os.path.isfile(item_path):
-                    file_size = os.path.getsize(item_path)
-                    files.append(f"{item} ({file_size} 字节)")
-                elif os.path.isdir(item_path):
-                    folders.append(item)
-
-            result = f"目录: {directory}\n"
-            result += f"共找到 {len(files)} 个文件，{len(folders)} 个文件夹\n\n"
-
-            if folders:
-                result += " 文件夹:\n"
-                for folder in sorted(folders):
-                    result += f"  - {folder}\n"
-                result += "\n"
-
-            if files:
-                result += " 文件:\n"
-                for file in sorted(files):
-                    result += f"  - {file}\n"
-
-            return result
+                try:
+                    if item.is_file():
+                        st = item.stat()
+                        fs.remember(item.path, st)
+                        files.append((item.name, st.st_size))
+                        entries.append((item.name, st.st_size, st.st_mtime))
+                    elif item.is_dir():
+                        folders.append(item.name)
+                        entries.append((item.name, listing_snapshots.DIR_SIZE, 0.0))
+                except OSError:
+                    # 失效的符号链接等
+                    continue
+
+            scope = listing_snapshots.make_scope("list_files", directory)
+            token, delta, note = listing_snapshots.record(scope, entries, since)
+            if delta is not None:
+                result = listing_snapshots.format_delta(f"目录: {directory}", since, delta)
+                return result + listing_snapshots.token_line(token)
+
+            result = f"{note}\n\n" if note else ""
+            if not items:
+                result += f"目录 {directory} 是空的\n"
+            else:
+                result += format_listing(directory, files, folders)
+            return result + listing_snapshots.token_line(token)
 
         except Exception as e:
             return f"列出文件时出错: {str(e)}"
 
     @mcp.tool
-    def find_files(directory: str, pattern: str):
+    def find_files(directory: str, pattern: Union[str, List[str]], filters: Dict[str, Any] = None,
+                   since: Optional[str] = None):
         """
-        根据模式查找文件（支持扩展名、关键词等）
+        根据模式查找文件（支持扩展名、关键词、大小、修改时间等多条件组合）
         :param directory: 搜索目录
-        :param pattern: 匹配模式，如 '*.pdf', '*.jpg', '*report*' 等
-        :return: 匹配的文件列表
+        :param pattern: 匹配模式，如 '*.pdf', '*.jpg', '*report*' 等，也可以是模式列表
+        :param filters: 额外过滤条件（可选），支持的键：
+                        - "exclude": ["*.bak"] 排除的通配符（匹配的文件夹不再进入）
+                        - "regex": ["^report_\\d+"] 文件名正则（满足任意一个即可）
+                        - "min_size" / "max_size": 文件大小范围（字节）
+                        - "older_than_days" / "newer_than_days": 按修改时间距今天数过滤
+                        - "modified_after" / "modified_before": 按修改日期过滤，如 "2024-01-01"
+                        - "recursive": 是否递归子目录，"max_depth": 递归最大深度
+                        - "file_type": "file" / "dir" / "any"
+                        - "include_hidden": 通配符是否匹配隐藏文件
+        :param since: 上次相同查询返回的快照令牌（可选），给出时只返回之后新增、删除和变更的匹配项
+        :return: 匹配的文件列表，末尾附新的快照令牌
         """
         try:
-            if not os.path.exists(directory):
+            if not fs.exists(directory):
                 return f"错误: 目录 {directory} 不存在"
 
-            if not os.path.isdir(directory):
+            if not fs.isdir(directory):
                 return f"错误: {directory} 不是一个目录"
 
-            # 构建搜索路径
-            search_path = os.path.join(directory, pattern)
-            matched_files = glob.glob(search_path)
-
+            try:
+                query = FileQuery.from_spec(pattern, filters)
+            except ValueError as e:
+                return f"错误: {str(e)}"
+
+            # 单次遍历完成全部条件匹配
+            matched_files = query.scan(directory)
+            description = query.describe()
+
+            scope = listing_snapshots.make_scope("find_files", directory, pattern, filters)
+            token, delta, note = listing_snapshots.record(
+                scope,
+                [(e.rel_path, listing_snapshots.DIR_SIZE if e.is_dir else e.size, e.mtime) for e in matched_files],
+                since,
+            )
+            if delta is not None:
+                header = f"在 {directory} 中匹配 '{description}' 的文件"
+                return listing_snapshots.format_delta(header, since, delta) + listing_snapshots.token_line(token)
+
+            result = f"{note}\n\n" if note else ""
             if not matched_files:
-                return f"在 {directory} 中未找到匹配 '{pattern}' 的文件"
+                result += f"在 {directory} 中未找到匹配 '{description}' 的文件\n"
+                return result + listing_snapshots.token_line(token)
 
-            result = f"在 {directory} 中找到 {len(matched_files)} 个匹配 '{pattern}' 的文件:\n\n"
+            result += f"在 {directory} 中找到 {len(matched_files)} 个匹配 '{description}' 的文件:\n\n"
 
-            for file_path in sorted(matched_files):
-                file_name = os.path.basename(file_path)
-                file_size = os.path.getsize(file_path)
-                result += f" {file_name} ({file_size} 字节)\n"
+            for entry in matched_files:
+                result += f" {entry.rel_path} ({entry.size} 字节)\n"
 
             result += f"\n完整路径列表:\n"
-            for file_path in sorted(matched_files):
-                result += f"  - {file_path}\n"
+            for entry in matched_files:
+                result += f"  - {entry.path}\n"
 
-            return result
+            return result + listing_snapshots.token_line(token)
 
         except Exception as e:
-            return f"查找文件时出错: {str(e)}"
\ No newline at end of file
+            return f"查找文件时出错: {str(e)}"
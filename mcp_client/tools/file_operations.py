@@ -3,15 +3,21 @@
 """
 
 import os
-import shutil
-import glob
-from typing import Union, List
+import sys
+from typing import Any, Dict, Union, List
+
+from . import fs
+from .file_query import FileQuery, drop_nested
+from .io_scheduler import io_slot
+from .jobs import report_progress
+from .path_locks import moved_into, path_locked
 
 
 def register_file_operation_tools(mcp):
     """注册文件操作相关工具"""
     
     @mcp.tool
+    @path_locked(exclusive=["source_items", moved_into("source_items", "target_directory")])
     def move_files(source_items: Union[str, List[str]], target_directory: str):
         """
         移动文件或文件夹到目标目录，支持单个或批量操作，自动创建目标目录
@@ -27,22 +33,23 @@ def register_file_operation_tools(mcp):
                 items_to_move = source_items
 
             # 自动创建目标目录
-            if not os.path.exists(target_directory):
+            if not fs.exists(target_directory):
                 try:
-                    os.makedirs(target_directory)
-                    print(f"自动创建目标目录: {target_directory}")
+                    fs.makedirs(target_directory, exist_ok=False)
+                    print(f"自动创建目标目录: {target_directory}", file=sys.stderr)
                 except Exception as e:
                     return f"错误: 无法创建目标目录 {target_directory} - {str(e)}"
-            elif not os.path.isdir(target_directory):
+            elif not fs.isdir(target_directory):
                 return f"错误: {target_directory} 存在但不是目录"
 
             results = []
             success_count = 0
             total_count = len(items_to_move)
 
-            for source_path in items_to_move:
+            for index, source_path in enumerate(items_to_move):
+                report_progress(index, total_count)
                 # 检查源文件是否存在
-                if not os.path.exists(source_path):
+                if not fs.exists(source_path):
                     results.append(f" {source_path}: 源文件/文件夹不存在")
                     continue
 
@@ -51,16 +58,17 @@ def register_file_operation_tools(mcp):
                 target_path = os.path.join(target_directory, item_name)
 
                 # 检查目标位置是否已存在
-                if os.path.exists(target_path):
+                if fs.exists(target_path):
                     results.append(f" {item_name}: 目标位置已存在同名文件/文件夹")
                     continue
 
                 try:
                     # 执行移动操作
-                    shutil.move(source_path, target_path)
+                    with io_slot(source_path, target_path):
+                        fs.move(source_path, target_path)
 
                     # 判断移动的是文件还是文件夹
-                    item_type = "文件夹" if os.path.isdir(target_path) else "文件"
+                    item_type = "文件夹" if fs.isdir(target_path) else "文件"
                     results.append(f" {item_name}: {item_type}移动成功")
                     success_count += 1
 
@@ -81,56 +89,67 @@ def register_file_operation_tools(mcp):
             return f"移动操作时出错: {str(e)}"
 
     @mcp.tool
-    def move_files_by_pattern(source_directory: str, pattern: str, target_directory: str):
+    @path_locked(exclusive=["source_directory", "target_directory"])
+    def move_files_by_pattern(source_directory: str, pattern: Union[str, List[str]], target_directory: str,
+                              filters: Dict[str, Any] = None):
         """
         根据模式批量移动文件（如移动所有pdf文件）
         :param source_directory: 源目录
-        :param pattern: 文件模式，如 '*.pdf', '*.jpg', '*report*' 等
+        :param pattern: 文件模式，如 '*.pdf', '*.jpg', '*report*' 等，也可以是模式列表
         :param target_directory: 目标目录
+        :param filters: 额外过滤条件（可选），与 find_files 相同：exclude, regex, min_size, max_size,
+                        older_than_days, newer_than_days, modified_after, modified_before,
+                        recursive, max_depth, file_type, include_hidden
         :return: 移动操作结果
         """
         try:
-            if not os.path.exists(source_directory):
+            if not fs.exists(source_directory):
                 return f"错误: 源目录 {source_directory} 不存在"
 
-            if not os.path.isdir(source_directory):
+            if not fs.isdir(source_directory):
                 return f"错误: {source_directory} 不是一个目录"
 
-            # 查找匹配的文件
-            search_path = os.path.join(source_directory, pattern)
-            matched_files = glob.glob(search_path)
+            try:
+                query = FileQuery.from_spec(pattern, filters)
+            except ValueError as e:
+                return f"错误: {str(e)}"
+
+            # 查找匹配的文件（文件夹内的匹配项随文件夹一起移动）
+            matched_files = drop_nested(query.scan(source_directory))
 
             if not matched_files:
-                return f"在 {source_directory} 中未找到匹配 '{pattern}' 的文件"
+                return f"在 {source_directory} 中未找到匹配 '{query.describe()}' 的文件"
 
             # 自动创建目标目录
-            if not os.path.exists(target_directory):
+            if not fs.exists(target_directory):
                 try:
-                    os.makedirs(target_directory)
-                    print(f" 自动创建目标目录: {target_directory}")
+                    fs.makedirs(target_directory, exist_ok=False)
+                    print(f" 自动创建目标目录: {target_directory}", file=sys.stderr)
                 except Exception as e:
                     return f"错误: 无法创建目标目录 {target_directory} - {str(e)}"
-            elif not os.path.isdir(target_directory):
+            elif not fs.isdir(target_directory):
                 return f"错误: {target_directory} 存在但不是目录"
 
             results = []
             success_count = 0
             total_count = len(matched_files)
 
-            for source_path in sorted(matched_files):
-                file_name = os.path.basename(source_path)
+            for index, entry in enumerate(matched_files):
+                report_progress(index, total_count)
+                source_path = entry.path
+                file_name = entry.name
                 target_path = os.path.join(target_directory, file_name)
 
                 # 检查目标位置是否已存在
-                if os.path.exists(target_path):
+                if fs.exists(target_path):
                     results.append(f" {file_name}: 目标位置已存在同名文件")
                     continue
 
                 try:
                     # 执行移动操作
-                    shutil.move(source_path, target_path)
-                    file_size = os.path.getsize(target_path)
-                    results.append(f" {file_name}: 移动成功 ({file_size} 字节)")
+                    with io_slot(source_path, target_path):
+                        fs.move(source_path, target_path)
+                    results.append(f" {file_name}: 移动成功 ({entry.size} 字节)")
                     success_count += 1
 
                 except PermissionError:
@@ -140,7 +159,7 @@ def register_file_operation_tools(mcp):
 
             # 生成结果摘要
             summary = f"模式匹配移动操作完成: 成功 {success_count}/{total_count} 个文件\n"
-            summary += f"匹配模式: {pattern}\n"
+            summary += f"匹配模式: {query.describe()}\n"
             summary += f"源目录: {source_directory}\n"
             summary += f"目标目录: {target_directory}\n\n"
 
@@ -0,0 +1,258 @@
+"""
+文件整理工具模块
+按路由规则（扩展名/通配符/日期/大小 → 目标目录模板）一次扫描完成分类，并分批执行移动
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List
+
+from . import fs
+from .file_query import FileEntry, FileQuery
+from .io_scheduler import io_slot
+from .jobs import report_progress
+from .path_locks import path_locked, template_root
+
+# 每批移动的文件数与并发批次数
+ORGANIZE_BATCH_SIZE = 500
+ORGANIZE_WORKERS = 8
+
+# 预览/结果中最多展示的目标目录数与错误数
+MAX_TARGETS_SHOWN = 50
+MAX_ERRORS_SHOWN = 20
+
+# 规则中除过滤条件外的键
+RULE_KEYS = {"target", "pattern", "ext"}
+
+
+def size_class(size: int) -> str:
+    """按大小分档，用于 {size_class} 占位符"""
+    if size < 100 * 1024:
+        return "tiny"
+    if size < 10 * 1024 * 1024:
+        return "small"
+    if size < 1024 * 1024 * 1024:
+        return "medium"
+    return "large"
+
+
+def render_target(template: str, entry) -> str:
+    """
+    根据文件信息渲染目标目录模板
+    支持占位符: {year} {month} {day} {ext} {name} {stem} {size_class}
+    """
+    modified = datetime.fromtimestamp(entry.mtime)
+    stem, ext = os.path.splitext(entry.name)
+    return template.format(
+        year=f"{modified.year:04d}",
+        month=f"{modified.month:02d}",
+        day=f"{modified.day:02d}",
+        ext=ext[1:].lower() or "no_ext",
+        name=entry.name,
+        stem=stem,
+        size_class=size_class(entry.size),
+    )
+
+
+def validate_template(template: str):
+    """用示例文件渲染一次模板，提前发现未知占位符"""
+    try:
+        render_target(template, FileEntry("example.txt", "example.txt", "example.txt", False, 0, 0.0))
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValueError(f"目标模板 '{template}' 无效 - {str(e)}")
+
+
+def compile_rule(rule: Dict[str, Any]) -> FileQuery:
+    """将一条路由规则编译为 FileQuery"""
+    if not isinstance(rule, dict) or not rule.get("target"):
+        raise ValueError(f"规则缺少 target: {rule}")
+    validate_template(rule["target"])
+
+    patterns = rule.get("pattern") or []
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    extensions = rule.get("ext") or []
+    if isinstance(extensions, str):
+        extensions = [extensions]
+    patterns = list(patterns) + [f"*.{e.lstrip('.')}" for e in extensions]
+
+    filters = {k: v for k, v in rule.items() if k not in RULE_KEYS}
+    return FileQuery.from_spec(patterns or "*", filters, fixed={"file_type": "file"})
+
+
+def move_batch(batch: List[tuple]) -> List[tuple]:
+    """
+    执行一批移动（fs.move：同一文件系统内直接 rename，跨设备时回退到复制后删除）
+    :return: [(源路径, 错误信息或None)]
+    """
+    outcomes = []
+    for source_path, target_path in batch:
+        try:
+            if fs.lexists(target_path):
+                outcomes.append((source_path, "目标位置已存在同名文件"))
+                continue
+            with io_slot(source_path, target_path):
+                fs.move(source_path, target_path)
+            outcomes.append((source_path, None))
+        except PermissionError:
+            outcomes.append((source_path, "权限不足，无法移动"))
+        except Exception as e:
+            outcomes.append((source_path, f"移动失败 - {str(e)}"))
+    return outcomes
+
+
+def target_roots(arguments: Dict[str, Any]) -> List[str]:
+    """整理可能写入的目录：各目标模板中不含占位符的部分（相对 target_root，默认为整理的目录）"""
+    root = arguments.get("target_root") or arguments.get("directory") or ""
+    templates = [rule.get("target") for rule in arguments.get("rules") or [] if isinstance(rule, dict)]
+    templates.append(arguments.get("default_target"))
+    return [template_root(template, root) for template in templates if isinstance(template, str) and template]
+
+
+def register_file_organize_tools(mcp):
+    """注册文件整理相关工具"""
+
+    @mcp.tool
+    @path_locked(exclusive=["directory", target_roots])
+    def organize_directory(directory: str, rules: List[Dict[str, Any]], default_target: str = None,
+                           target_root: str = None, recursive: bool = False, confirm: bool = False):
+        """
+        按路由规则一次性整理目录：单次扫描完成分类，再按目标目录分批移动（适合整理下载目录等大量文件）
+        :param directory: 要整理的目录
+        :param rules: 路由规则列表，按顺序匹配，第一条命中的规则生效。每条规则：
+                      - "target": 目标目录模板（必填），如 "{year}/{ext}"、"图片/{year}-{month}"
+                      - "ext": 扩展名列表，如 ["jpg", "png"]
+                      - "pattern": 通配符或通配符列表，如 "*report*"
+                      - 其余键与 find_files 的 filters 相同，如 "min_size"、"older_than_days"、"modified_after"
+                      模板占位符: {year} {month} {day}（修改时间）、{ext}、{name}、{stem}、
+                      {size_class}（tiny/small/medium/large）
+        :param default_target: 未命中任何规则的文件的目标模板（可选，默认不移动）
+        :param target_root: 目标目录模板的根目录（可选，默认为 directory）
+        :param recursive: 是否包含子目录中的文件（默认False）
+        :param confirm: 确认执行标志，设为True才会真正移动文件，否则只显示整理计划
+        :return: 整理结果摘要
+        """
+        try:
+            if not fs.exists(directory):
+                return f"错误: 目录 {directory} 不存在"
+
+            if not fs.isdir(directory):
+                return f"错误: {directory} 不是一个目录"
+
+            if not rules and not default_target:
+                return "错误: 至少需要一条规则或 default_target"
+
+            try:
+                compiled = []
+                for rule in rules or []:
+                    query = compile_rule(rule)
+                    compiled.append((rule["target"], query))
+                if default_target:
+                    validate_template(default_target)
+            except (ValueError, TypeError) as e:
+                return f"错误: 规则无效 - {str(e)}"
+
+            root = target_root or directory
+
+            # 单次扫描，逐个文件按规则分类
+            scan_query = FileQuery(recursive=recursive, file_type="file")
+            entries = scan_query.scan(directory)
+
+            plan = {}
+            rule_counts = [0] * len(compiled)
+            unmatched = 0
+            skipped = []
+            planned_targets = set()
+
+            for entry in entries:
+                template = None
+                for index, (target, query) in enumerate(compiled):
+                    if query.matches(entry):
+                        template = target
+                        rule_counts[index] += 1
+                        break
+                if template is None:
+                    if not default_target:
+                        unmatched += 1
+                        continue
+                    template = default_target
+
+                target_dir = os.path.normpath(os.path.join(root, render_target(template, entry)))
+                target_path = os.path.join(target_dir, entry.name)
+                if os.path.normpath(entry.path) == target_path:
+                    unmatched += 1
+                    continue
+                if target_path in planned_targets:
+                    skipped.append(f" {entry.rel_path}: 与其他文件的目标路径冲突")
+                    continue
+                planned_targets.add(target_path)
+                plan.setdefault(target_dir, []).append((entry.path, target_path))
+
+            planned_count = sum(len(items) for items in plan.values())
+            rule_summary = "\n".join(
+                f"  规则{index + 1} → {target}: {rule_counts[index]} 个文件"
+                for index, (target, _) in enumerate(compiled)
+            )
+
+            header = f"目录: {directory}\n"
+            header += f"扫描文件 {len(entries)} 个，计划移动 {planned_count} 个，未匹配/无需移动 {unmatched} 个\n"
+            if rule_summary:
+                header += f"规则命中:\n{rule_summary}\n"
+
+            targets_shown = sorted(plan.items(), key=lambda item: -len(item[1]))[:MAX_TARGETS_SHOWN]
+
+            if not confirm:
+                preview = f"  整理计划预览\n{header}\n目标目录 ({len(plan)} 个):\n"
+                for target_dir, items in targets_shown:
+                    examples = ", ".join(os.path.basename(source) for source, _ in items[:3])
+                    preview += f"  {target_dir}: {len(items)} 个文件 (如 {examples})\n"
+                if len(plan) > MAX_TARGETS_SHOWN:
+                    preview += f"  ... 其余 {len(plan) - MAX_TARGETS_SHOWN} 个目标目录未显示\n"
+                if skipped:
+                    preview += "\n将跳过:\n" + "\n".join(skipped[:MAX_ERRORS_SHOWN]) + "\n"
+                preview += f"\n❗ 这是预览模式，文件尚未移动。"
+                preview += f"\n如需执行整理，请设置 confirm=True"
+                return preview
+
+            if not plan:
+                return f"在 {directory} 中没有需要整理的文件\n{header}"
+
+            # 每个目标目录只创建一次，然后按批并发移动
+            batches = []
+            for target_dir, items in plan.items():
+                try:
+                    fs.makedirs(target_dir, exist_ok=True)
+                except Exception as e:
+                    skipped.extend(f" {os.path.basename(source)}: 无法创建目标目录 {target_dir} - {str(e)}"
+                                   for source, _ in items)
+                    continue
+                for start in range(0, len(items), ORGANIZE_BATCH_SIZE):
+                    batches.append(items[start:start + ORGANIZE_BATCH_SIZE])
+
+            success_count = 0
+            errors = list(skipped)
+            with ThreadPoolExecutor(max_workers=ORGANIZE_WORKERS) as executor:
+                for batch_index, outcomes in enumerate(executor.map(fs.in_scope(move_batch), batches)):
+                    report_progress(batch_index, len(batches), f"已移动 {success_count} 个文件")
+                    for source_path, error in outcomes:
+                        if error is None:
+                            success_count += 1
+                        else:
+                            errors.append(f" {os.path.relpath(source_path, directory)}: {error}")
+
+            summary = f"🗂️ 目录整理完成: 成功移动 {success_count}/{planned_count} 个文件\n{header}\n"
+            summary += f"目标目录 ({len(plan)} 个):\n"
+            for target_dir, items in targets_shown:
+                summary += f"  {target_dir}: {len(items)} 个文件\n"
+            if len(plan) > MAX_TARGETS_SHOWN:
+                summary += f"  ... 其余 {len(plan) - MAX_TARGETS_SHOWN} 个目标目录未显示\n"
+            if errors:
+                summary += f"\n失败/跳过 {len(errors)} 个:\n" + "\n".join(errors[:MAX_ERRORS_SHOWN])
+                if len(errors) > MAX_ERRORS_SHOWN:
+                    summary += f"\n ... 其余 {len(errors) - MAX_ERRORS_SHOWN} 个未显示"
+
+            return summary
+
+        except Exception as e:
+            return f"整理目录时出错: {str(e)}"
@@ -0,0 +1,292 @@
+"""
+文件查询引擎模块
+将多个包含/排除通配符、正则、大小范围和修改时间范围编译为一个匹配器，
+每个目录只做一次 scandir 遍历，供所有基于模式的工具共用
+"""
+
+import fnmatch
+import os
+import re
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from . import fs
+
+# filters 参数支持的键
+FILTER_KEYS = {
+    "exclude",          # 排除的通配符列表，如 ['*.bak', 'node_modules']
+    "regex",            # 文件名正则列表，满足任意一个即可
+    "min_size",         # 最小文件大小（字节）
+    "max_size",         # 最大文件大小（字节）
+    "older_than_days",  # 修改时间早于N天前
+    "newer_than_days",  # 修改时间在N天以内
+    "modified_after",   # 修改时间晚于该日期，如 '2024-01-01'
+    "modified_before",  # 修改时间早于该日期
+    "recursive",        # 是否递归子目录（默认False）
+    "max_depth",        # 递归的最大深度（0表示只看当前目录）
+    "file_type",        # 'file' / 'dir' / 'any'
+    "include_hidden",   # 通配符是否匹配以 '.' 开头的隐藏文件
+}
+
+
+class FileEntry(NamedTuple):
+    """一次扫描得到的匹配项，携带扫描时已取得的元数据，避免重复 stat"""
+    path: str
+    name: str
+    rel_path: str
+    is_dir: bool
+    size: int
+    mtime: float
+
+
+def _compile_globs(patterns: List[str]) -> Optional[re.Pattern]:
+    """将多个通配符编译为一个正则，None 表示没有模式"""
+    if not patterns:
+        return None
+    return re.compile("|".join(
+        f"(?:{fnmatch.translate(os.path.normcase(p))})" for p in patterns
+    ))
+
+
+def _parse_date(value: str, key: str) -> float:
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        raise ValueError(f"{key} 日期格式无效: {value}，应为 YYYY-MM-DD")
+
+
+class FileQuery:
+    """
+    编译后的多条件文件匹配器
+    - 名称条件（通配符/正则/排除）先于元数据条件求值，只有通过名称条件的项才会 stat
+    - 通配符语义与 glob 一致：'*' 不匹配隐藏文件，除非模式本身以 '.' 开头或开启 include_hidden
+    - 含路径分隔符的模式按相对路径匹配
+    """
+
+    def __init__(self,
+                 patterns: Union[str, List[str], None] = None,
+                 exclude: Optional[List[str]] = None,
+                 regex: Optional[List[str]] = None,
+                 min_size: Optional[int] = None,
+                 max_size: Optional[int] = None,
+                 older_than_days: Optional[float] = None,
+                 newer_than_days: Optional[float] = None,
+                 modified_after: Optional[str] = None,
+                 modified_before: Optional[str] = None,
+                 recursive: bool = False,
+                 max_depth: Optional[int] = None,
+                 file_type: str = "any",
+                 include_hidden: bool = False):
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        patterns = [p for p in (patterns or ["*"]) if p]
+        if isinstance(exclude, str):
+            exclude = [exclude]
+        if isinstance(regex, str):
+            regex = [regex]
+        if file_type not in ("file", "dir", "any"):
+            raise ValueError(f"file_type 无效: {file_type}，应为 file / dir / any")
+
+        self.patterns = patterns
+        self.exclude = list(exclude or [])
+        self.regex = list(regex or [])
+        self.file_type = file_type
+        self.include_hidden = include_hidden
+        self.min_size = min_size
+        self.max_size = max_size
+
+        # 名称模式与路径模式分开编译；以 '.' 开头的模式才允许匹配隐藏文件
+        name_patterns = [p for p in patterns if "/" not in p and os.sep not in p]
+        path_patterns = [p.replace(os.sep, "/") for p in patterns if "/" in p or os.sep in p]
+        self._name_regex = _compile_globs([p for p in name_patterns if include_hidden or not p.startswith(".")])
+        self._dot_regex = _compile_globs([p for p in name_patterns if p.startswith(".")])
+        self._path_regex = _compile_globs(path_patterns)
+        self._exclude_regex = _compile_globs(self.exclude)
+        try:
+            self._regexes = [re.compile(r) for r in self.regex]
+        except re.error as e:
+            raise ValueError(f"正则表达式无效: {e}")
+
+        # 时间范围统一换算为 [mtime_min, mtime_max)
+        now = time.time()
+        self.mtime_min = None
+        self.mtime_max = None
+        if newer_than_days is not None:
+            self.mtime_min = now - float(newer_than_days) * 86400
+        if modified_after is not None:
+            after = _parse_date(modified_after, "modified_after")
+            self.mtime_min = after if self.mtime_min is None else max(self.mtime_min, after)
+        if older_than_days is not None:
+            self.mtime_max = now - float(older_than_days) * 86400
+        if modified_before is not None:
+            before = _parse_date(modified_before, "modified_before")
+            self.mtime_max = before if self.mtime_max is None else min(self.mtime_max, before)
+
+        # 含路径分隔符的模式隐含递归，深度由模式层级决定
+        if path_patterns and not recursive:
+            recursive = True
+            if max_depth is None:
+                max_depth = max(p.count("/") for p in path_patterns)
+        self.recursive = recursive
+        self.max_depth = max_depth if recursive else 0
+
+    @classmethod
+    def from_spec(cls, pattern: Union[str, List[str], None], filters: Optional[Dict[str, Any]] = None,
+                  fixed: Optional[Dict[str, Any]] = None, **defaults):
+        """
+        根据工具参数构建查询
+        :param pattern: 通配符或通配符列表
+        :param filters: 额外过滤条件字典，键见 FILTER_KEYS
+        :param fixed: 工具必须使用的条件（如只处理文件的 {"file_type": "file"}），filters 不能改为其他值
+        :param defaults: 工具自身的默认条件，可被 filters 覆盖
+        """
+        spec = dict(defaults)
+        if filters:
+            if not isinstance(filters, dict):
+                raise ValueError("filters 必须是字典")
+            unknown = set(filters) - FILTER_KEYS
+            if unknown:
+                raise ValueError(f"未知的过滤条件: {', '.join(sorted(unknown))}")
+            spec.update(filters)
+        for key, value in (fixed or {}).items():
+            if filters and key in filters and filters[key] != value:
+                raise ValueError(f"该工具要求 {key} 为 {value!r}，filters 中不能设置为 {filters[key]!r}")
+            spec[key] = value
+        return cls(patterns=pattern, **spec)
+
+    @property
+    def needs_stat_filter(self) -> bool:
+        return (self.min_size is not None or self.max_size is not None
+                or self.mtime_min is not None or self.mtime_max is not None)
+
+    def _excluded(self, name: str, rel_path: str) -> bool:
+        if self._exclude_regex is None:
+            return False
+        return bool(self._exclude_regex.match(os.path.normcase(name))
+                    or self._exclude_regex.match(os.path.normcase(rel_path)))
+
+    def matches_name(self, name: str, rel_path: str) -> bool:
+        """只用名称条件判断（不涉及磁盘访问）"""
+        normalized = os.path.normcase(name)
+        if name.startswith(".") and not self.include_hidden:
+            matched = bool(self._dot_regex and self._dot_regex.match(normalized))
+        else:
+            matched = bool(self._name_regex and self._name_regex.match(normalized))
+        if not matched and self._path_regex is not None:
+            matched = bool(self._path_regex.match(os.path.normcase(rel_path)))
+        if not matched:
+            return False
+        if self._excluded(name, rel_path):
+            return False
+        if self._regexes and not any(r.search(name) for r in self._regexes):
+            return False
+        return True
+
+    def matches_stat(self, is_dir: bool, size: int, mtime: float) -> bool:
+        """用元数据条件判断；设置了大小范围时文件夹不参与匹配"""
+        if self.file_type == "file" and is_dir:
+            return False
+        if self.file_type == "dir" and not is_dir:
+            return False
+        if self.min_size is not None or self.max_size is not None:
+            if is_dir:
+                return False
+            if self.min_size is not None and size < self.min_size:
+                return False
+            if self.max_size is not None and size > self.max_size:
+                return False
+        if self.mtime_min is not None and mtime < self.mtime_min:
+            return False
+        if self.mtime_max is not None and mtime >= self.mtime_max:
+            return False
+        return True
+
+    def matches(self, entry: FileEntry) -> bool:
+        """判断一个已扫描的条目是否满足全部条件"""
+        return (self.matches_name(entry.name, entry.rel_path)
+                and self.matches_stat(entry.is_dir, entry.size, entry.mtime))
+
+    def walk(self, directory: str) -> Iterator[Tuple[os.DirEntry, str, int, os.stat_result]]:
+        """
+        遍历目录（每个目录一次 scandir），逐个产出匹配项 (DirEntry, 相对路径, 深度, stat结果)
+        深度从0开始（directory 的直接子项为0）；符号链接指向的目录不会被递归进入
+        """
+        stack = [(directory, "", 0)]
+
+        while stack:
+            current, rel_dir, depth = stack.pop()
+            try:
+                iterator = os.scandir(current)
+            except (PermissionError, FileNotFoundError, NotADirectoryError):
+                continue
+
+            with iterator:
+                for item in iterator:
+                    rel_path = f"{rel_dir}/{item.name}" if rel_dir else item.name
+                    try:
+                        is_dir = item.is_dir()
+                    except OSError:
+                        continue
+
+                    if (is_dir and self.recursive
+                            and (self.max_depth is None or depth < self.max_depth)
+                            and not item.is_symlink()
+                            and not self._excluded(item.name, rel_path)):
+                        stack.append((item.path, rel_path, depth + 1))
+
+                    if not self.matches_name(item.name, rel_path):
+                        continue
+                    if self.file_type == "file" and is_dir or self.file_type == "dir" and not is_dir:
+                        continue
+
+                    try:
+                        st = item.stat()
+                    except OSError:
+                        # 失效的符号链接等
+                        continue
+                    # 放入本次调用的 stat 缓存，后续对该路径的存在性检查和取大小不再访问磁盘
+                    fs.remember(item.path, st)
+                    if not self.matches_stat(is_dir, st.st_size, st.st_mtime):
+                        continue
+
+                    yield item, rel_path, depth, st
+
+    def scan(self, directory: str) -> List[FileEntry]:
+        """遍历目录，返回按路径排序的匹配项"""
+        results = [
+            FileEntry(item.path, item.name, rel_path, item.is_dir(), st.st_size, st.st_mtime)
+            for item, rel_path, _, st in self.walk(directory)
+        ]
+        results.sort(key=lambda e: e.path)
+        return results
+
+    def describe(self) -> str:
+        """生成查询条件的简短描述，用于结果摘要"""
+        parts = [", ".join(self.patterns)]
+        if self.exclude:
+            parts.append(f"排除 {', '.join(self.exclude)}")
+        if self.regex:
+            parts.append(f"正则 {', '.join(self.regex)}")
+        if self.min_size is not None or self.max_size is not None:
+            parts.append(f"大小 {self.min_size or 0}~{self.max_size if self.max_size is not None else '∞'} 字节")
+        if self.mtime_min is not None:
+            parts.append(f"修改于 {datetime.fromtimestamp(self.mtime_min).strftime('%Y-%m-%d %H:%M:%S')} 之后")
+        if self.mtime_max is not None:
+            parts.append(f"修改于 {datetime.fromtimestamp(self.mtime_max).strftime('%Y-%m-%d %H:%M:%S')} 之前")
+        if self.recursive:
+            parts.append("递归" if self.max_depth is None else f"递归 {self.max_depth} 层")
+        return "; ".join(parts)
+
+
+def drop_nested(entries: List[FileEntry]) -> List[FileEntry]:
+    """去掉位于已匹配文件夹之内的条目（移动/删除文件夹时其内容会一并处理）"""
+    kept = []
+    current_dir = None
+    # 按路径分段排序，保证文件夹的所有后代紧跟在其后
+    for entry in sorted(entries, key=lambda e: e.path.split(os.sep)):
+        if current_dir is not None and entry.path.startswith(current_dir):
+            continue
+        kept.append(entry)
+        current_dir = entry.path + os.sep if entry.is_dir else None
+    return kept
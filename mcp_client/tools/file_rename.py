@@ -8,11 +8,25 @@ import time
 from typing import Union, List, Dict
 from datetime import datetime
 
+from . import fs
+from .jobs import report_progress
+from .path_locks import parent_directories, path_locked
+
+
+def renamed_path(file_path: str, new_name: str, keep_extension: bool = True) -> str:
+    """rename_file 的目标路径：原目录下的新名称，keep_extension 时沿用原扩展名"""
+    if keep_extension:
+        # 保持原扩展名，移除新名称中可能包含的扩展名
+        new_name = os.path.splitext(new_name)[0] + os.path.splitext(os.path.basename(file_path))[1]
+    return os.path.join(os.path.dirname(file_path), new_name)
+
 
 def register_file_rename_tools(mcp):
     """注册文件重命名相关工具"""
     
     @mcp.tool
+    @path_locked(exclusive=["file_path",
+                            lambda args: renamed_path(args["file_path"], args["new_name"], args["keep_extension"])])
     def rename_file(file_path: str, new_name: str, keep_extension: bool = True):
         """
         重命名指定文件，支持保持原扩展名或完全自定义新名称
@@ -23,7 +37,7 @@ def register_file_rename_tools(mcp):
         """
         try:
             # 检查源文件是否存在
-            if not os.path.exists(file_path):
+            if not fs.exists(file_path):
                 return json.dumps({
                     "status": "error",
                     "message": f"源文件不存在: {file_path}",
@@ -31,7 +45,7 @@ def register_file_rename_tools(mcp):
                     "new_path": None
                 }, ensure_ascii=False)
 
-            if not os.path.isfile(file_path):
+            if not fs.isfile(file_path):
                 return json.dumps({
                     "status": "error",
                     "message": f"路径不是文件: {file_path}",
@@ -57,7 +71,7 @@ def register_file_rename_tools(mcp):
             new_file_path = os.path.join(file_dir, final_new_name)
 
             # 检查新文件名是否已存在
-            if os.path.exists(new_file_path):
+            if fs.exists(new_file_path):
                 return json.dumps({
                     "status": "error",
                     "message": f"目标文件名已存在: {final_new_name}",
@@ -80,10 +94,10 @@ def register_file_rename_tools(mcp):
 
             # 执行重命名操作
             try:
-                os.rename(file_path, new_file_path)
+                fs.rename(file_path, new_file_path)
 
                 # 获取文件大小信息
-                file_size = os.path.getsize(new_file_path)
+                file_size = fs.getsize(new_file_path)
 
                 return json.dumps({
                     "status": "success",
@@ -123,6 +137,7 @@ def register_file_rename_tools(mcp):
             }, ensure_ascii=False)
 
     @mcp.tool
+    @path_locked(exclusive=[parent_directories("file_paths")])
     def batch_rename_files(file_paths: Union[str, List[str]], rename_pattern: str, keep_extension: bool = True):
         """
         批量重命名文件，支持多种命名模式
@@ -164,9 +179,10 @@ def register_file_rename_tools(mcp):
             timestamp = int(time.time())
 
             for index, file_path in enumerate(file_paths, 1):
+                report_progress(index - 1, total_count)
                 try:
                     # 检查源文件是否存在
-                    if not os.path.exists(file_path):
+                    if not fs.exists(file_path):
                         results.append({
                             "file_path": file_path,
                             "status": "error",
@@ -174,7 +190,7 @@ def register_file_rename_tools(mcp):
                         })
                         continue
 
-                    if not os.path.isfile(file_path):
+                    if not fs.isfile(file_path):
                         results.append({
                             "file_path": file_path,
                             "status": "error",
@@ -204,7 +220,7 @@ def register_file_rename_tools(mcp):
                     new_file_path = os.path.join(file_dir, final_new_name)
 
                     # 检查新文件名是否已存在
-                    if os.path.exists(new_file_path):
+                    if fs.exists(new_file_path):
                         results.append({
                             "file_path": file_path,
                             "status": "error",
@@ -215,9 +231,9 @@ def register_file_rename_tools(mcp):
                         continue
 
                     # 执行重命名
-                    os.rename(file_path, new_file_path)
+                    fs.rename(file_path, new_file_path)
 
-                    file_size = os.path.getsize(new_file_path)
+                    file_size = fs.getsize(new_file_path)
 
                     results.append({
                         "file_path": file_path,
@@ -269,6 +285,7 @@ def register_file_rename_tools(mcp):
             }, ensure_ascii=False)
 
     @mcp.tool
+    @path_locked(exclusive=[parent_directories("file_paths")])
     def rename_with_rules(file_paths: Union[str, List[str]], rules: Dict[str, str]):
         """
         根据规则批量重命名文件，支持文本替换、大小写转换等
@@ -306,9 +323,10 @@ def register_file_rename_tools(mcp):
             success_count = 0
             total_count = len(file_paths)
 
-            for file_path in file_paths:
+            for index, file_path in enumerate(file_paths):
+                report_progress(index, total_count)
                 try:
-                    if not os.path.exists(file_path) or not os.path.isfile(file_path):
+                    if not fs.exists(file_path) or not fs.isfile(file_path):
                         results.append({
                             "file_path": file_path,
                             "status": "error",
@@ -364,7 +382,7 @@ def register_file_rename_tools(mcp):
                         continue
 
                     # 检查目标文件是否存在
-                    if os.path.exists(new_file_path):
+                    if fs.exists(new_file_path):
                         results.append({
                             "file_path": file_path,
                             "status": "error",
@@ -375,7 +393,7 @@ def register_file_rename_tools(mcp):
                         continue
 
                     # 执行重命名
-                    os.rename(file_path, new_file_path)
+                    fs.rename(file_path, new_file_path)
 
                     results.append({
                         "file_path": file_path,
@@ -0,0 +1,314 @@
+"""
+目录同步工具模块
+按 大小+修改时间（可选内容哈希）比较源目录与目标目录，只并发复制新增或变化的文件
+"""
+
+import errno
+import hashlib
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+from . import fs
+from .file_query import FileQuery
+from .io_scheduler import io_slot
+from .jobs import report_progress
+from .path_locks import path_locked
+
+# 并发复制/哈希的线程数
+SYNC_WORKERS = 8
+
+# 单次内核复制与哈希读取的块大小
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+# 修改时间比较的容差（秒），兼容FAT等时间精度较低的文件系统
+MTIME_TOLERANCE = 1.0
+
+# 结果中每类最多展示的条目数
+MAX_ITEMS_SHOWN = 20
+
+# copy_file_range 不可用时回退到普通复制的错误码
+_FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF}
+
+
+def file_digest(path: str) -> str:
+    """分块计算文件内容哈希"""
+    digest = hashlib.blake2b(digest_size=20)
+    with fs.open_file(path, "rb") as f:
+        while True:
+            chunk = f.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def kernel_copy(source_path: str, target_path: str):
+    """
+    复制文件内容，优先使用 copy_file_range 在内核内完成（支持的文件系统上还可以是reflink/服务端复制），
+    不支持时回退到 shutil.copyfile（Linux上使用sendfile，macOS上使用fcopyfile）
+    """
+    if hasattr(os, "copy_file_range"):
+        with fs.open_file(source_path, "rb") as fsrc, fs.open_file(target_path, "wb") as fdst:
+            copied = 0
+            try:
+                while True:
+                    n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), COPY_CHUNK_SIZE)
+                    if n == 0:
+                        return
+                    copied += n
+            except OSError as e:
+                if copied or e.errno not in _FALLBACK_ERRNOS:
+                    raise
+    shutil.copyfile(source_path, target_path)
+    fs.invalidate(target_path)
+
+
+def copy_entry(source_path: str, target_path: str) -> int:
+    """
+    复制单个文件并保留修改时间，先写入临时文件再原子替换
+    :return: 复制的字节数
+    """
+    target_dir = os.path.dirname(target_path)
+    fs.makedirs(target_dir, exist_ok=True)
+    temp_path = os.path.join(target_dir, f".{os.path.basename(target_path)}.sync-tmp")
+    try:
+        kernel_copy(source_path, temp_path)
+        shutil.copystat(source_path, temp_path)
+        fs.replace(temp_path, target_path)
+    except BaseException:
+        if fs.lexists(temp_path):
+            fs.remove(temp_path)
+        raise
+    return fs.getsize(target_path)
+
+
+def format_rate(size: float, seconds: float) -> str:
+    if seconds <= 0:
+        return "-"
+    rate = size / seconds
+    for unit in ("B", "KB", "MB", "GB"):
+        if rate < 1024:
+            return f"{rate:.1f} {unit}/s"
+        rate /= 1024
+    return f"{rate:.1f} TB/s"
+
+
+def register_file_sync_tools(mcp):
+    """注册目录同步相关工具"""
+
+    @mcp.tool
+    @path_locked(shared=["source_directory"], exclusive=["target_directory"])
+    def sync_directories(source_directory: str, target_directory: str, compare_hash: bool = False,
+                         delete_extraneous: bool = False, dry_run: bool = False, filters: Dict[str, Any] = None):
+        """
+        增量同步目录：把源目录的新增和变化文件复制到目标目录（递归），未变化的文件不会重复复制
+        :param source_directory: 源目录
+        :param target_directory: 目标目录（不存在时自动创建）
+        :param compare_hash: 大小相同的文件是否再比较内容哈希（更准确但需要读取文件，默认只比较大小和修改时间）
+        :param delete_extraneous: 是否删除目标目录中源目录没有的文件/文件夹（默认False）
+        :param dry_run: 只报告差异，不做任何修改
+        :param filters: 额外过滤条件（可选），与 find_files 相同，如 {"exclude": ["*.tmp", ".git"]}，
+                        未被过滤条件选中的文件既不会复制也不会删除
+        :return: 同步结果（差异统计与吞吐量）
+        """
+        try:
+            if not fs.exists(source_directory):
+                return f"错误: 源目录 {source_directory} 不存在"
+
+            if not fs.isdir(source_directory):
+                return f"错误: {source_directory} 不是一个目录"
+
+            if fs.exists(target_directory) and not fs.isdir(target_directory):
+                return f"错误: {target_directory} 存在但不是目录"
+
+            source_real = os.path.realpath(source_directory)
+            target_real = os.path.realpath(target_directory)
+            # 目标是源的子目录会把同步结果再同步进去；目标是源的上级目录时，删除多余文件会删掉源目录本身
+            if os.path.commonpath([source_real, target_real]) in (source_real, target_real):
+                return f"错误: 源目录和目标目录不能相同，也不能互相包含"
+
+            try:
+                query = FileQuery.from_spec("*", filters, recursive=True, include_hidden=True)
+            except ValueError as e:
+                return f"错误: {str(e)}"
+
+            started = time.perf_counter()
+
+            source_entries = {e.rel_path: e for e in query.scan(source_directory)}
+            target_entries = {e.rel_path: e for e in query.scan(target_directory)} if fs.isdir(target_directory) else {}
+
+            # 源与目标同名但类型不同（一边是文件、一边是文件夹）的最上层路径
+            conflicts = sorted(
+                (rel_path for rel_path, entry in source_entries.items()
+                 if rel_path in target_entries and target_entries[rel_path].is_dir != entry.is_dir),
+                key=lambda rel_path: rel_path.split("/"),
+            )
+            top_conflicts = set()
+            for rel_path in conflicts:
+                if not any(rel_path.startswith(c + "/") for c in top_conflicts):
+                    top_conflicts.add(rel_path)
+
+            def in_conflict(rel_path: str) -> bool:
+                while rel_path:
+                    if rel_path in top_conflicts:
+                        return True
+                    rel_path = rel_path.rpartition("/")[0]
+                return False
+
+            # 计算差异；类型冲突只有在 delete_extraneous 时才替换（先删除目标中的冲突项），否则跳过并报告
+            new_files, changed_files, unchanged = [], [], 0
+            hash_candidates = []
+            missing_dirs = []
+            skipped_conflicts = []
+            for rel_path, entry in source_entries.items():
+                existing = target_entries.get(rel_path)
+                if top_conflicts and in_conflict(rel_path):
+                    if not delete_extraneous:
+                        if rel_path in top_conflicts:
+                            skipped_conflicts.append(entry)
+                        continue
+                    # 冲突项会被整体删除，其下的内容全部按新增处理
+                    existing = None
+                if entry.is_dir:
+                    if existing is None:
+                        missing_dirs.append(rel_path)
+                    continue
+                if existing is None or existing.is_dir:
+                    new_files.append(entry)
+                elif existing.size != entry.size:
+                    changed_files.append(entry)
+                elif compare_hash:
+                    hash_candidates.append(entry)
+                elif abs(existing.mtime - entry.mtime) > MTIME_TOLERANCE:
+                    changed_files.append(entry)
+                else:
+                    unchanged += 1
+
+            if hash_candidates:
+                def differs(entry):
+                    target_path = os.path.join(target_directory, entry.rel_path)
+                    with io_slot(entry.path, target_path):
+                        return file_digest(entry.path) != file_digest(target_path)
+
+                with ThreadPoolExecutor(max_workers=SYNC_WORKERS) as executor:
+                    for entry, is_different in zip(hash_candidates, executor.map(fs.in_scope(differs), hash_candidates)):
+                        if is_different:
+                            changed_files.append(entry)
+                        else:
+                            unchanged += 1
+
+            extraneous = []
+            if delete_extraneous:
+                extraneous = [
+                    entry for rel_path, entry in target_entries.items()
+                    if rel_path not in source_entries
+                    or source_entries[rel_path].is_dir != entry.is_dir
+                ]
+                # 只保留最上层的多余项，文件夹会整体删除
+                extraneous.sort(key=lambda e: e.rel_path.split("/"))
+                top_level = []
+                for entry in extraneous:
+                    if top_level and top_level[-1].is_dir and entry.rel_path.startswith(top_level[-1].rel_path + "/"):
+                        continue
+                    top_level.append(entry)
+                extraneous = top_level
+
+            to_copy = sorted(new_files + changed_files, key=lambda e: e.rel_path)
+            bytes_to_copy = sum(e.size for e in to_copy)
+            compare_seconds = time.perf_counter() - started
+
+            header = f"源目录: {source_directory}\n目标目录: {target_directory}\n"
+            header += f"比较方式: 大小+修改时间{' + 内容哈希' if compare_hash else ''}\n"
+            header += (f"新增 {len(new_files)} 个，变化 {len(changed_files)} 个，未变化 {unchanged} 个，"
+                       f"缺失文件夹 {len(missing_dirs)} 个，待复制 {bytes_to_copy} 字节\n")
+            if delete_extraneous:
+                header += f"目标中多余的项目 {len(extraneous)} 个\n"
+            if skipped_conflicts:
+                header += f"类型冲突 {len(skipped_conflicts)} 个（目标中同名项是文件夹/文件，未覆盖，设置 delete_extraneous=True 以替换）\n"
+            header += f"比较耗时: {compare_seconds:.2f} 秒\n"
+
+            if dry_run:
+                report = f"🔍 同步预览（dry run，未做任何修改）\n{header}"
+                for title, items in (("新增", new_files), ("变化", changed_files), ("多余", extraneous),
+                                     ("类型冲突", skipped_conflicts)):
+                    if items:
+                        report += f"\n{title}:\n"
+                        report += "\n".join(f"  {e.rel_path}{'/' if e.is_dir else ''} ({e.size} 字节)"
+                                            for e in items[:MAX_ITEMS_SHOWN])
+                        if len(items) > MAX_ITEMS_SHOWN:
+                            report += f"\n  ... 其余 {len(items) - MAX_ITEMS_SHOWN} 个未显示"
+                        report += "\n"
+                return report
+
+            errors = [f"  {entry.rel_path}: 目标中同名项类型不同，未覆盖" for entry in skipped_conflicts]
+
+            # 先删除多余项（包括类型冲突的目标项），为复制同名但类型不同的源项腾出路径
+            deleted = 0
+            for entry in extraneous:
+                target_path = os.path.join(target_directory, entry.rel_path)
+                try:
+                    with io_slot(target_path):
+                        if entry.is_dir:
+                            fs.rmtree(target_path)
+                        else:
+                            fs.remove(target_path)
+                    deleted += 1
+                except Exception as e:
+                    errors.append(f"  {entry.rel_path}: 删除失败 - {str(e)}")
+
+            # 创建缺失的文件夹（包括空文件夹）
+            fs.makedirs(target_directory, exist_ok=True)
+            for rel_path in missing_dirs:
+                try:
+                    fs.makedirs(os.path.join(target_directory, rel_path), exist_ok=True)
+                except OSError as e:
+                    errors.append(f"  {rel_path}/: 创建文件夹失败 - {str(e)}")
+
+            # 并发复制
+            copy_started = time.perf_counter()
+            copied_files = 0
+            copied_bytes = 0
+
+            def copy_one(entry):
+                try:
+                    target_path = os.path.join(target_directory, entry.rel_path)
+                    with io_slot(entry.path, target_path):
+                        return entry, copy_entry(entry.path, target_path), None
+                except PermissionError:
+                    return entry, 0, "权限不足，无法复制"
+                except Exception as e:
+                    return entry, 0, f"复制失败 - {str(e)}"
+
+            with ThreadPoolExecutor(max_workers=SYNC_WORKERS) as executor:
+                for index, (entry, size, error) in enumerate(executor.map(fs.in_scope(copy_one), to_copy)):
+                    report_progress(index, len(to_copy), f"已复制 {copied_bytes} 字节")
+                    if error:
+                        errors.append(f"  {entry.rel_path}: {error}")
+                    else:
+                        copied_files += 1
+                        copied_bytes += size
+            copy_seconds = time.perf_counter() - copy_started
+
+            total_seconds = time.perf_counter() - started
+            summary = f"🔄 目录同步完成: 复制 {copied_files}/{len(to_copy)} 个文件"
+            if delete_extraneous:
+                summary += f"，删除 {deleted}/{len(extraneous)} 个多余项目"
+            summary += f"\n{header}"
+            summary += f"复制 {copied_bytes} 字节，耗时 {copy_seconds:.2f} 秒，"
+            summary += f"吞吐量 {format_rate(copied_bytes, copy_seconds)}"
+            if copy_seconds > 0:
+                summary += f"，{copied_files / copy_seconds:.1f} 文件/秒"
+            summary += f"\n总耗时: {total_seconds:.2f} 秒\n"
+
+            if errors:
+                summary += f"\n失败 {len(errors)} 个:\n" + "\n".join(errors[:MAX_ITEMS_SHOWN])
+                if len(errors) > MAX_ITEMS_SHOWN:
+                    summary += f"\n  ... 其余 {len(errors) - MAX_ITEMS_SHOWN} 个未显示"
+
+            return summary
+
+        except Exception as e:
+            return f"同步目录时出错: {str(e)}"
@@ -0,0 +1,218 @@
+"""
+I/O 调度模块
+按路径所在设备（st_dev）分别限制并发：同一块磁盘上的并发读写排队执行，避免机械硬盘来回寻道；
+不同设备之间互不影响，可以同时满速运行。每个设备有独立的并发上限和先进先出等待队列。
+
+工具在执行重量级I/O（复制、移动、删除、哈希、读取内容、打包解包）时使用:
+    with io_slot(source_path, target_path):
+        ...
+涉及多个设备时按设备号顺序依次获取，同一线程内重复获取同一设备不会再次占用名额。
+
+并发上限可通过环境变量调整：
+    VALKYRIE_IO_CONCURRENCY=4                       每个设备的默认并发数
+    VALKYRIE_IO_DEVICE_LIMITS="/mnt/hdd=1,/data=8"  指定路径所在设备的并发数
+也可以在运行时通过 set_io_concurrency 工具修改。
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from . import fs
+
+# 每个设备的默认并发数
+DEFAULT_DEVICE_CONCURRENCY = int(os.getenv("VALKYRIE_IO_CONCURRENCY", "4"))
+
+
+class DeviceQueue:
+    """单个设备的并发名额，等待者按到达顺序获得名额"""
+
+    def __init__(self, device: int, limit: int):
+        self.device = device
+        self.limit = limit
+        self.active = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.paths = set()
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def acquire(self):
+        started = time.perf_counter()
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                return
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+        # 名额由 release 直接移交，被唤醒时 active 已经计入本线程
+        waiter.wait()
+        waited = time.perf_counter() - started
+        with self._lock:
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    def release(self):
+        with self._lock:
+            self.completed += 1
+            if self._waiters and self.active <= self.limit:
+                self._waiters.popleft().set()
+            else:
+                self.active -= 1
+
+    def set_limit(self, limit: int):
+        with self._lock:
+            self.limit = limit
+            # 上限调高后立即放行等待者
+            while self._waiters and self.active < self.limit:
+                self.active += 1
+                self._waiters.popleft().set()
+
+
+class IOScheduler:
+    """按设备分配I/O并发名额"""
+
+    def __init__(self, default_limit: int = DEFAULT_DEVICE_CONCURRENCY):
+        self.default_limit = max(1, default_limit)
+        self._queues: Dict[int, DeviceQueue] = {}
+        self._lock = threading.Lock()
+        self._held = threading.local()
+
+    def device_of(self, path: str) -> Optional[int]:
+        """
+        返回路径所在设备号：按路径本身查找，挂载点目录得到的是挂载的设备
+        路径不存在时（如移动/解压的目标）使用最近的已存在上级目录
+        stat 结果走 fs 的单次调用缓存，工具已经检查过的路径不会重复 stat，调用结束后随之释放
+        """
+        current = os.path.abspath(path)
+        while True:
+            st = fs.stat(current)
+            if st is not None:
+                return st.st_dev
+            parent = os.path.dirname(current)
+            if parent == current:
+                return None
+            current = parent
+
+    def queue_for(self, device: int, path: str = None) -> DeviceQueue:
+        with self._lock:
+            queue = self._queues.get(device)
+            if queue is None:
+                queue = DeviceQueue(device, self.default_limit)
+                self._queues[device] = queue
+            if path is not None and len(queue.paths) < 3:
+                queue.paths.add(os.path.dirname(os.path.abspath(path)))
+            return queue
+
+    @contextmanager
+    def slot(self, *paths: str):
+        """为路径所在的所有设备各占用一个名额"""
+        held = getattr(self._held, "devices", None)
+        if held is None:
+            held = self._held.devices = set()
+
+        devices = {}
+        for path in paths:
+            if not path:
+                continue
+            device = self.device_of(path)
+            if device is not None and device not in held and device not in devices:
+                devices[device] = path
+
+        # 按设备号顺序获取，避免多个线程交叉等待造成死锁
+        acquired = []
+        try:
+            for device in sorted(devices):
+                queue = self.queue_for(device, devices[device])
+                queue.acquire()
+                acquired.append(queue)
+                held.add(device)
+            yield
+        finally:
+            for queue in reversed(acquired):
+                held.discard(queue.device)
+                queue.release()
+
+    def set_limit(self, path: str, limit: int) -> DeviceQueue:
+        if not os.path.exists(path):
+            raise ValueError(f"路径 {path} 不存在")
+        queue = self.queue_for(self.device_of(path))
+        with self._lock:
+            queue.paths.add(os.path.abspath(path))
+        queue.set_limit(max(1, int(limit)))
+        return queue
+
+    def queues(self):
+        with self._lock:
+            return list(self._queues.values())
+
+
+SCHEDULER = IOScheduler()
+
+
+def _apply_env_limits():
+    """读取 VALKYRIE_IO_DEVICE_LIMITS 中的设备并发配置"""
+    spec = os.getenv("VALKYRIE_IO_DEVICE_LIMITS", "")
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        path, _, limit = item.rpartition("=")
+        try:
+            SCHEDULER.set_limit(path, int(limit))
+        except ValueError as e:
+            print(f"忽略无效的I/O并发配置 '{item}': {e}", file=sys.stderr)
+
+
+_apply_env_limits()
+
+
+def io_slot(*paths: str):
+    """在默认调度器上为路径所在设备占用名额"""
+    return SCHEDULER.slot(*paths)
+
+
+def register_io_scheduler_tools(mcp):
+    """注册I/O调度相关工具"""
+
+    @mcp.tool
+    def get_io_scheduler_status():
+        """
+        查看I/O调度器状态：每个设备的并发上限、正在执行/排队的操作数和累计等待时间
+        :return: 各设备的调度状态
+        """
+        queues = SCHEDULER.queues()
+        if not queues:
+            return f"尚未有设备参与调度（默认每个设备并发 {SCHEDULER.default_limit}）"
+
+        lines = [f"I/O调度器（默认每个设备并发 {SCHEDULER.default_limit}）:"]
+        for queue in sorted(queues, key=lambda q: q.device):
+            average_wait = queue.total_wait / queue.completed if queue.completed else 0.0
+            lines.append(
+                f"  设备 {queue.device}（如 {', '.join(sorted(queue.paths)) or '-'}）: "
+                f"上限 {queue.limit}，执行中 {queue.active}，排队 {queue.queued}，已完成 {queue.completed}，"
+                f"平均等待 {average_wait * 1000:.1f} ms，最长等待 {queue.max_wait * 1000:.1f} ms"
+            )
+        return "\n".join(lines)
+
+    @mcp.tool
+    def set_io_concurrency(path: str, limit: int):
+        """
+        设置某个路径所在设备的I/O并发上限（机械硬盘建议1~2，SSD/NVMe可以更高）
+        :param path: 该设备上的任意已存在路径
+        :param limit: 并发上限（至少为1）
+        :return: 设置结果
+        """
+        try:
+            queue = SCHEDULER.set_limit(path, limit)
+            return f"已将设备 {queue.device}（{path} 所在设备）的I/O并发上限设为 {queue.limit}"
+        except (ValueError, TypeError) as e:
+            return f"错误: {str(e)}"
+        except Exception as e:
+            return f"设置I/O并发时出错: {str(e)}"
@@ -0,0 +1,324 @@
+"""
+后台任务模块
+把耗时工具放到工作线程池中执行：启动后立即返回任务ID，可查询、等待或取消
+
+工具实现中调用 report_progress(done, total, message) 上报进度，该调用同时是取消检查点：
+任务被取消后，下一次调用会抛出 JobCancelled 结束工具执行。不在后台任务中执行时该调用不做任何事。
+
+进度只记录在任务上，通过轮询取得：get_job 返回当前进度；wait_job 等待期间把进度变化作为
+该次 wait_job 请求的MCP进度通知发送。start_job 请求在任务开始前就已结束，
+MCP进度通知只能关联到仍在进行的请求，因此没有客户端在 wait_job 中等待时不会发送任何通知。
+"""
+
+import asyncio
+import contextvars
+import inspect
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from fastmcp import Context
+
+# 同时执行的后台任务数
+JOB_WORKERS = 4
+
+# 最多保留的已结束任务数，超出后丢弃最早结束的任务
+MAX_FINISHED_JOBS = 100
+
+# wait_job 检查任务状态的间隔（秒）与默认/最长等待时间
+WAIT_POLL_INTERVAL = 0.2
+DEFAULT_WAIT_SECONDS = 60
+MAX_WAIT_SECONDS = 600
+
+# 任务状态
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = {SUCCEEDED, FAILED, CANCELLED}
+
+STATE_LABELS = {
+    PENDING: "⏳ 排队中",
+    RUNNING: "🏃 运行中",
+    SUCCEEDED: "✅ 已完成",
+    FAILED: "❌ 失败",
+    CANCELLED: "🚫 已取消",
+}
+
+# 不能作为后台任务启动的工具（任务管理工具本身）
+JOB_TOOL_NAMES = {"start_job", "get_job", "wait_job", "cancel_job", "list_jobs"}
+
+
+class JobCancelled(BaseException):
+    """
+    任务被取消时由 report_progress 抛出
+    继承 BaseException，以免被工具内部的 except Exception 吞掉
+    """
+
+
+class Job:
+    def __init__(self, job_id: str, tool_name: str, arguments: Dict[str, Any]):
+        self.id = job_id
+        self.tool_name = tool_name
+        self.arguments = arguments
+        self.state = PENDING
+        self.progress = 0.0
+        self.total: Optional[float] = None
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.done_event = threading.Event()
+        self.future = None
+        # 每次进度变化递增，wait_job 据此判断是否需要发送通知
+        self.version = 0
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    def update(self, done: float, total: Optional[float] = None, message: Optional[str] = None):
+        with self._lock:
+            self.progress = float(done)
+            if total is not None:
+                self.total = float(total)
+            if message is not None:
+                self.message = message
+            self.version += 1
+
+    def finish(self, state: str, result=None, error: str = None):
+        with self._lock:
+            self.state = state
+            if state == SUCCEEDED and self.total:
+                self.progress = self.total
+            self.result = result
+            self.error = error
+            self.finished_at = time.time()
+            self.version += 1
+        self.done_event.set()
+
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def progress_text(self) -> str:
+        if self.total:
+            return f"{self.progress:.0f}/{self.total:.0f} ({self.progress / self.total * 100:.0f}%)"
+        return f"{self.progress:.0f}" if self.progress else "-"
+
+    def describe(self, include_result: bool = True) -> str:
+        text = f"任务 {self.id}: {STATE_LABELS[self.state]}"
+        if self.state == RUNNING and self.cancel_event.is_set():
+            text += "（正在取消）"
+        text += f"\n工具: {self.tool_name}\n进度: {self.progress_text()}"
+        if self.message:
+            text += f" - {self.message}"
+        text += f"\n耗时: {self.elapsed():.1f} 秒"
+        if self.error:
+            text += f"\n错误: {self.error}"
+        if include_result and self.state == SUCCEEDED:
+            result = self.result if isinstance(self.result, str) else repr(self.result)
+            text += f"\n\n结果:\n{result}"
+        return text
+
+
+_current_job: contextvars.ContextVar = contextvars.ContextVar("current_job", default=None)
+
+
+def report_progress(done: float, total: Optional[float] = None, message: Optional[str] = None):
+    """
+    上报当前后台任务的进度，并检查任务是否已被取消
+    只能在工具的主执行线程中调用（工具内部线程池的工作线程中不在任务上下文内）
+    """
+    job = _current_job.get()
+    if job is None:
+        return
+    if job.cancel_event.is_set():
+        raise JobCancelled()
+    job.update(done, total, message)
+
+
+class JobManager:
+    """后台任务管理器：在线程池中执行工具函数并跟踪任务状态"""
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs: Dict[str, Job] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, tool_name: str, fn, arguments: Dict[str, Any]) -> Job:
+        job = Job(f"job-{next(self._ids)}", tool_name, arguments)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        job.future = self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: Job, fn):
+        if job.cancel_event.is_set():
+            job.finish(CANCELLED)
+            return
+        job.state = RUNNING
+        job.started_at = time.time()
+        token = _current_job.set(job)
+        try:
+            result = fn(**job.arguments)
+        except JobCancelled:
+            job.finish(CANCELLED)
+        except Exception as e:
+            job.finish(FAILED, error=str(e))
+        else:
+            job.finish(SUCCEEDED, result=result)
+        finally:
+            _current_job.reset(token)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+        job.cancel_event.set()
+        # 尚未开始执行的任务直接从队列中移除
+        if job.future is not None and job.future.cancel():
+            job.finish(CANCELLED)
+        return job
+
+    def _prune(self):
+        finished = sorted((j for j in self._jobs.values() if j.finished), key=lambda j: j.finished_at)
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+
+
+def register_job_tools(mcp, manager: JobManager = None):
+    """
+    注册后台任务相关工具
+    :param mcp: ToolRegistry，除注册工具外还用于按名称查找可作为任务启动的工具
+    """
+    manager = manager or JobManager()
+
+    @mcp.tool
+    def start_job(tool_name: str, arguments: Dict[str, Any] = None):
+        """
+        以后台任务方式启动一个耗时工具（如大量移动/删除、目录同步、归档、批量OCR），立即返回任务ID
+        之后用 wait_job 等待结果，用 get_job 查询进度，用 cancel_job 取消
+        :param tool_name: 工具名称，如 "sync_directories"
+        :param arguments: 传给该工具的参数字典，与直接调用该工具时相同
+        :return: 任务ID
+        """
+        try:
+            fn = mcp.get(tool_name)
+            if fn is None or tool_name in JOB_TOOL_NAMES:
+                return f"错误: 工具 {tool_name} 不存在或不能作为后台任务启动"
+
+            arguments = arguments or {}
+            if not isinstance(arguments, dict):
+                return "错误: arguments 必须是字典"
+            try:
+                inspect.signature(fn).bind(**arguments)
+            except TypeError as e:
+                return f"错误: 参数与工具 {tool_name} 不匹配 - {str(e)}"
+
+            job = manager.submit(tool_name, fn, arguments)
+            return (f"🚀 已启动后台任务 {job.id}（{tool_name}）\n"
+                    f"使用 wait_job(\"{job.id}\") 等待结果，get_job 查询进度，cancel_job 取消")
+
+        except Exception as e:
+            return f"启动后台任务时出错: {str(e)}"
+
+    @mcp.tool
+    def get_job(job_id: str):
+        """
+        查询后台任务的状态与进度，任务完成时一并返回结果
+        :param job_id: 任务ID
+        :return: 任务状态
+        """
+        job = manager.get(job_id)
+        if job is None:
+            return f"错误: 任务 {job_id} 不存在"
+        return job.describe()
+
+    @mcp.tool
+    async def wait_job(job_id: str, timeout: float = DEFAULT_WAIT_SECONDS, ctx: Context = None):
+        """
+        等待后台任务结束并返回结果，等待期间通过本次请求的MCP进度通知上报任务进度
+        （后台任务只在有 wait_job 等待时发送进度通知，否则用 get_job 查询）
+        超时不会取消任务，可以再次调用 wait_job 继续等待
+        :param job_id: 任务ID
+        :param timeout: 最长等待秒数（默认60，最多600）
+        :return: 任务结果，或超时时的当前进度
+        """
+        job = manager.get(job_id)
+        if job is None:
+            return f"错误: 任务 {job_id} 不存在"
+
+        timeout = max(0.0, min(float(timeout), MAX_WAIT_SECONDS))
+        deadline = time.monotonic() + timeout
+        reported_version = -1
+        while True:
+            if ctx is not None and job.version != reported_version:
+                reported_version = job.version
+                try:
+                    await ctx.report_progress(job.progress, job.total, job.message or None)
+                except Exception:
+                    # 客户端未请求进度通知或连接已断开时忽略
+                    pass
+            if job.finished:
+                return job.describe()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return f"⏱️ 等待超时（{timeout:.0f} 秒），任务仍在执行，可再次调用 wait_job 继续等待\n\n" \
+                       + job.describe(include_result=False)
+            await asyncio.get_running_loop().run_in_executor(
+                None, job.done_event.wait, min(WAIT_POLL_INTERVAL, remaining))
+
+    @mcp.tool
+    def cancel_job(job_id: str):
+        """
+        取消后台任务：排队中的任务立即取消，运行中的任务在下一个检查点停止（已完成的部分不会回滚）
+        :param job_id: 任务ID
+        :return: 取消结果
+        """
+        job = manager.cancel(job_id)
+        if job is None:
+            return f"错误: 任务 {job_id} 不存在"
+        if job.state == CANCELLED:
+            return f"🚫 任务 {job_id} 已取消"
+        if job.finished:
+            return f"任务 {job_id} 已经结束，无需取消\n\n" + job.describe(include_result=False)
+        return f"已请求取消任务 {job_id}，任务将在下一个检查点停止\n\n" + job.describe(include_result=False)
+
+    @mcp.tool
+    def list_jobs():
+        """
+        列出所有后台任务及其状态
+        :return: 任务列表
+        """
+        jobs = manager.list()
+        if not jobs:
+            return "当前没有后台任务"
+        lines = [f"共 {len(jobs)} 个后台任务:"]
+        for job in sorted(jobs, key=lambda j: j.created_at):
+            line = f"  {job.id}  {STATE_LABELS[job.state]}  {job.tool_name}  进度 {job.progress_text()}"
+            line += f"  耗时 {job.elapsed():.1f}s"
+            if job.message and not job.finished:
+                line += f"  {job.message}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    return manager
@@ -0,0 +1,198 @@
+"""
+列表快照模块
+list_files / find_files 每次返回一个快照令牌，下次调用传入 since 即只返回相对该快照新增、删除和变更的条目。
+快照以紧凑数组保存在服务器内存中：按名称哈希排序的哈希数组、大小数组、修改时间数组，
+以及按同一顺序拼接的名称字符串（只在需要列出已删除条目时才拆分）
+"""
+
+import itertools
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+# 最多保留的快照数，超出时淘汰最久未使用的
+MAX_SNAPSHOTS = 256
+
+# 所有快照合计的最大条目数，避免反复列出超大目录占满内存
+MAX_TOTAL_ENTRIES = 2_000_000
+
+# 文件夹在快照中的大小标记（list_files 不对文件夹 stat）
+DIR_SIZE = -1
+
+# 名称拼接分隔符（文件名中不可能出现）
+_SEP = "\0"
+
+
+class Snapshot:
+    """一次列表结果的紧凑快照"""
+
+    __slots__ = ("scope", "hashes", "sizes", "mtimes", "names")
+
+    def __init__(self, scope: str, entries: List[Tuple[str, int, float]]):
+        names, sizes, mtimes = zip(*entries) if entries else ((), (), ())
+        # 进程内的 str 哈希足够区分名称；快照只存在于本进程内存，不受哈希随机化影响
+        hashes = [hash(name) for name in names]
+        order = sorted(range(len(hashes)), key=hashes.__getitem__)
+        self.scope = scope
+        self.hashes = array("q", [hashes[i] for i in order])
+        self.sizes = array("q", [sizes[i] for i in order])
+        self.mtimes = array("d", [mtimes[i] for i in order])
+        self.names = _SEP.join([names[i] for i in order])
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def name_list(self) -> List[str]:
+        return self.names.split(_SEP) if self.hashes else []
+
+    def same_as(self, other: "Snapshot") -> bool:
+        """逐数组比较，整体未变化时无需逐项对比"""
+        return self.hashes == other.hashes and self.sizes == other.sizes and self.mtimes == other.mtimes
+
+
+class Delta:
+    """两个快照之间的差异"""
+
+    def __init__(self):
+        self.added: List[Tuple[str, int]] = []
+        self.removed: List[Tuple[str, int]] = []
+        self.changed: List[Tuple[str, int, int]] = []
+        self.unchanged = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+
+def diff(old: Snapshot, new: Snapshot) -> Delta:
+    """按哈希顺序归并两个快照，得到新增、删除和变更（大小或修改时间不同）的条目"""
+    delta = Delta()
+    if old.same_as(new):
+        delta.unchanged = len(new)
+        return delta
+
+    new_names = new.name_list()
+    removed = []
+    i = j = 0
+    n_old, n_new = len(old), len(new)
+    while i < n_old or j < n_new:
+        if j >= n_new or (i < n_old and old.hashes[i] < new.hashes[j]):
+            removed.append(i)
+            i += 1
+        elif i >= n_old or new.hashes[j] < old.hashes[i]:
+            delta.added.append((new_names[j], new.sizes[j]))
+            j += 1
+        else:
+            if old.sizes[i] != new.sizes[j] or old.mtimes[i] != new.mtimes[j]:
+                delta.changed.append((new_names[j], old.sizes[i], new.sizes[j]))
+            else:
+                delta.unchanged += 1
+            i += 1
+            j += 1
+
+    if removed:
+        old_names = old.name_list()
+        delta.removed = [(old_names[i], old.sizes[i]) for i in removed]
+    delta.added.sort()
+    delta.removed.sort()
+    delta.changed.sort()
+    return delta
+
+
+class SnapshotStore:
+    """线程安全的快照存储，按最近使用淘汰"""
+
+    def __init__(self, max_snapshots: int = MAX_SNAPSHOTS, max_entries: int = MAX_TOTAL_ENTRIES):
+        self.max_snapshots = max_snapshots
+        self.max_entries = max_entries
+        self._snapshots: "OrderedDict[str, Snapshot]" = OrderedDict()
+        self._entries = 0
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[Snapshot]:
+        with self._lock:
+            snapshot = self._snapshots.get(token)
+            if snapshot is not None:
+                self._snapshots.move_to_end(token)
+            return snapshot
+
+    def put(self, snapshot: Snapshot) -> str:
+        with self._lock:
+            token = f"s{os.getpid():x}-{next(self._counter):x}"
+            self._snapshots[token] = snapshot
+            self._entries += len(snapshot)
+            while self._snapshots and (len(self._snapshots) > self.max_snapshots
+                                       or self._entries > self.max_entries):
+                if len(self._snapshots) == 1:
+                    break
+                _, evicted = self._snapshots.popitem(last=False)
+                self._entries -= len(evicted)
+            return token
+
+
+SNAPSHOTS = SnapshotStore()
+
+
+def make_scope(tool: str, directory: str, *params) -> str:
+    """快照适用范围：同一工具、同一目录、同样的查询参数，令牌才能互相比较"""
+    return _SEP.join([tool, os.path.normcase(os.path.abspath(directory))] + [repr(p) for p in params])
+
+
+def record(scope: str, entries: List[Tuple[str, int, float]], since: Optional[str] = None):
+    """
+    保存本次列表的快照，并在给出 since 时计算差异
+    :param scope: make_scope 生成的适用范围
+    :param entries: [(名称或相对路径, 大小, 修改时间)]，文件夹大小用 DIR_SIZE
+    :param since: 上次返回的快照令牌（可选）
+    :return: (新令牌, 差异或 None, 提示信息或 None)；since 无效时差异为 None 并给出原因
+    """
+    snapshot = Snapshot(scope, entries)
+    if not since:
+        return SNAPSHOTS.put(snapshot), None, None
+
+    previous = SNAPSHOTS.get(since)
+    if previous is None:
+        return SNAPSHOTS.put(snapshot), None, f"快照令牌 {since} 不存在或已过期，返回完整列表"
+    if previous.scope != scope:
+        return SNAPSHOTS.put(snapshot), None, f"快照令牌 {since} 属于其他目录或查询条件，返回完整列表"
+
+    delta = diff(previous, snapshot)
+    # 没有变化时沿用原令牌，不必再存一份相同的快照
+    token = since if not delta else SNAPSHOTS.put(snapshot)
+    return token, delta, None
+
+
+def _format_size(size: int) -> str:
+    return "文件夹" if size == DIR_SIZE else f"{size} 字节"
+
+
+def format_delta(header: str, since: str, delta: Delta) -> str:
+    """生成差异列表"""
+    result = f"{header}（相对快照 {since}）\n"
+    if not delta:
+        return result + f"无变化，共 {delta.unchanged} 项\n"
+
+    result += (f"新增 {len(delta.added)} 项，删除 {len(delta.removed)} 项，"
+               f"变更 {len(delta.changed)} 项，未变 {delta.unchanged} 项\n")
+    if delta.added:
+        result += "\n 新增:\n"
+        for name, size in delta.added:
+            result += f"  + {name} ({_format_size(size)})\n"
+    if delta.removed:
+        result += "\n 删除:\n"
+        for name, size in delta.removed:
+            result += f"  - {name} ({_format_size(size)})\n"
+    if delta.changed:
+        result += "\n 变更:\n"
+        for name, old_size, new_size in delta.changed:
+            if old_size == new_size:
+                result += f"  ~ {name} ({_format_size(new_size)}，修改时间变化)\n"
+            else:
+                result += f"  ~ {name} ({_format_size(old_size)} → {_format_size(new_size)})\n"
+    return result
+
+
+def token_line(token: str) -> str:
+    return f"\n快照令牌: {token}（下次传入 since 只返回之后的变化）\n"
@@ -1,18 +1,431 @@
 """
 OCR文字识别工具模块
+
+PDF 先检查每一页是否已有文本层（电子文档导出的PDF），有文本层的页面直接在本地提取文字，
+只把扫描页组成新的PDF上传识别，再按原页码合并，结果JSON与OCR服务返回的格式相同；需要 PyMuPDF。
+
+上传前可对图片做预处理：按目标DPI/最大长边缩小、转为灰度并重新压缩。手机照片和高DPI扫描件常有十几到几十MB，
+分辨率远超OCR所需，上传时间占了识别耗时的大部分。预处理需要 Pillow，未安装时直接上传原图。
+批量识别时图片在进程池中预处理，处理完的文件立即进入上传线程池，预处理与上传互相重叠。
 """
 
+import io
+import math
+import multiprocessing
 import os
 import json
+import time
 import requests
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import fs
+from .io_scheduler import io_slot
+from .jobs import report_progress
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+try:
+    import pymupdf
+except ImportError:
+    try:
+        import fitz as pymupdf
+    except ImportError:
+        pymupdf = None
+
+OCR_SERVICE_URL = 'https://server0.d5data.tech:20110/ocr'
+OCR_TIMEOUT = 600
+
+SUPPORTED_EXTENSIONS = [".jpg", ".jpeg", ".png", ".pdf"]
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+# 小于该大小的图片直接上传，预处理省下的字节不值得解码和重新编码的开销
+PREPROCESS_MIN_BYTES = 512 * 1024
+
+# 识别所需的分辨率：图片记录的DPI高于该值时按比例缩小
+TARGET_DPI = 300
+
+# 长边最大像素数（A4 纸在 300 DPI 下的长边），没有DPI信息的照片按此缩小
+MAX_LONG_EDGE = 3508
+
+# 重新压缩为 JPEG 时的质量
+JPEG_QUALITY = 85
+
+# 页面文本层少于该字数时视为扫描页（扫描件上常只有页码、页眉等少量文字），交给OCR服务识别
+MIN_TEXT_LAYER_CHARS = 32
+
+# 文本层中无法映射为Unicode的字符（U+FFFD）超过该比例时视为乱码，交给OCR服务识别
+MAX_UNMAPPED_RATIO = 0.1
+
+# 批量识别时预处理的进程数和同时上传的请求数
+PREPROCESS_WORKERS = max(1, min(4, os.cpu_count() or 1))
+UPLOAD_WORKERS = 4
+
+# 批量结果中最多列出的文件数
+MAX_ITEMS_SHOWN = 50
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def _flatten_alpha(image):
+    """透明背景合成到白底上，避免转灰度后透明区域变黑、盖住文字"""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGBA", rgba.size, (255, 255, 255, 255))
+        return Image.alpha_composite(background, rgba)
+    return image
+
+
+def preprocess_image(path: str, data: bytes = None, target_dpi: int = TARGET_DPI,
+                     max_long_edge: int = MAX_LONG_EDGE) -> Tuple[Optional[bytes], Dict[str, Any]]:
+    """
+    缩小、转灰度并重新压缩图片（JPEG 仍输出 JPEG，PNG 输出灰度 PNG 以免文字边缘出现压缩伪影）
+    可在进程池中调用：data 为空时在本进程内读取文件，避免把原图在进程间传递
+    :return: (处理后的内容, 处理说明)；未安装 Pillow、文件较小或处理后没有变小时内容为 None，说明中的 skipped 给出原因
+    """
+    info: Dict[str, Any] = {"preprocess_seconds": 0.0}
+    if Image is None:
+        info["skipped"] = "未安装 Pillow"
+        return None, info
+    if data is None:
+        with open(path, "rb") as f:
+            data = f.read()
+    info["original_bytes"] = len(data)
+    if len(data) < PREPROCESS_MIN_BYTES:
+        info["skipped"] = "文件较小"
+        return None, info
+
+    started = time.perf_counter()
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            image_format = source.format
+            width, height = source.size
+            scale = 1.0
+            dpi = source.info.get("dpi")
+            if dpi and dpi[0] and float(dpi[0]) > target_dpi:
+                scale = target_dpi / float(dpi[0])
+            if max(width, height) * scale > max_long_edge:
+                scale = max_long_edge / max(width, height)
+            target_long_edge = max(1, round(max(width, height) * scale))
+            if image_format == "JPEG":
+                # JPEG 解码时直接按 1/2、1/4、1/8 缩小并输出灰度，大照片的解码耗时和内存都大幅减少
+                source.draft("L", (math.ceil(width * scale), math.ceil(height * scale)))
+            image = ImageOps.exif_transpose(source)
+        image = _flatten_alpha(image)
+        if image.mode != "L":
+            image = image.convert("L")
+        if max(image.size) > target_long_edge:
+            factor = target_long_edge / max(image.size)
+            image = image.resize((max(1, round(image.width * factor)), max(1, round(image.height * factor))),
+                                 Image.Resampling.LANCZOS)
+
+        buffer = io.BytesIO()
+        if image_format == "PNG":
+            image.save(buffer, "PNG")
+        else:
+            image.save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    except Exception as e:
+        info["skipped"] = f"无法处理图片 - {str(e)}"
+        return None, info
+    finally:
+        info["preprocess_seconds"] = time.perf_counter() - started
+
+    info["original_size"] = f"{width}x{height}"
+    info["upload_size"] = f"{image.width}x{image.height}"
+    content = buffer.getvalue()
+    if len(content) >= len(data):
+        info["skipped"] = "处理后没有变小"
+        return None, info
+    return content, info
+
+
+def _page_text(page) -> Optional[str]:
+    """页面文本层的文字，没有可用的文本层时返回 None"""
+    text = page.get_text().strip()
+    if len(text) < MIN_TEXT_LAYER_CHARS or text.count("\ufffd") > len(text) * MAX_UNMAPPED_RATIO:
+        return None
+    return text
+
+
+def split_pdf_text_layer(data: bytes) -> Tuple[Optional[bytes], Dict[str, Any]]:
+    """
+    提取PDF各页的文本层，没有文本层的页面组成新的PDF
+    :return: (需要上传识别的PDF内容, 处理说明)；所有页面都有文本层时内容为空字节串，
+             未安装 PyMuPDF、没有任何文本层或无法解析时内容为 None（上传原文件），说明中的 skipped 给出原因
+    """
+    info: Dict[str, Any] = {"preprocess_seconds": 0.0}
+    if pymupdf is None:
+        info["skipped"] = "未安装 PyMuPDF"
+        return None, info
+
+    started = time.perf_counter()
+    try:
+        with pymupdf.open(stream=data, filetype="pdf") as document:
+            if document.needs_pass:
+                info["skipped"] = "PDF已加密"
+                return None, info
+            page_texts = [_page_text(page) for page in document]
+            ocr_pages = [index for index, text in enumerate(page_texts) if text is None]
+            if len(ocr_pages) == len(page_texts):
+                info["skipped"] = "没有文本层"
+                return None, info
+            content = b""
+            if ocr_pages:
+                document.select(ocr_pages)
+                content = document.tobytes(garbage=3, deflate=True)
+    except Exception as e:
+        info["skipped"] = f"无法读取PDF文本层 - {str(e)}"
+        return None, info
+    finally:
+        info["preprocess_seconds"] = time.perf_counter() - started
+
+    info["text_layer"] = {
+        "page_count": len(page_texts),
+        "pages": {index: text for index, text in enumerate(page_texts) if text is not None},
+        "ocr_pages": ocr_pages,
+    }
+    return content, info
+
+
+def merge_text_layer(filename: str, text_layer: Dict[str, Any],
+                     ocr_result: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+    """
+    把文本层页面与OCR服务识别的扫描页按原页码合并，生成与OCR服务格式相同的结果
+    文本层页面的 source 为 text_layer；OCR服务返回失败时原样返回其结果；
+    返回的页面结构无法合并（页数不符、页面中没有文字）时返回 None，由调用方改为上传整个PDF
+    """
+    ocr_pages: Dict[int, Any] = {}
+    if text_layer["ocr_pages"]:
+        if ocr_result.get("status") != "success":
+            return ocr_result
+        results = ocr_result.get("results")
+        pages = results.get("pages") if isinstance(results, dict) else None
+        if not isinstance(pages, list) or len(pages) != len(text_layer["ocr_pages"]):
+            return None
+        for index, page in zip(text_layer["ocr_pages"], pages):
+            if isinstance(page, dict) and isinstance(page.get("text"), str):
+                # OCR服务按上传的PDF编页码，改回原文件中的页码
+                if "page" in page:
+                    page = {**page, "page": index + 1}
+            elif not isinstance(page, str):
+                return None
+            ocr_pages[index] = page
+
+    # OCR服务的页面为纯文本时，文本层页面也用纯文本，保持列表中元素类型一致
+    plain = bool(ocr_pages) and all(isinstance(page, str) for page in ocr_pages.values())
+    pages, texts = [], []
+    for index in range(text_layer["page_count"]):
+        if index in ocr_pages:
+            page = ocr_pages[index]
+            texts.append(page if isinstance(page, str) else page["text"])
+        else:
+            text = text_layer["pages"][index]
+            page = text if plain else {"page": index + 1, "text": text, "source": "text_layer"}
+            texts.append(text)
+        pages.append(page)
+
+    merged = dict(ocr_result) if ocr_result else {"status": "success", "filename": filename}
+    base = ocr_result["results"] if ocr_result else {}
+    merged["results"] = {**base, "text": "\n".join(texts), "pages": pages}
+    return merged
+
+
+def prepare_upload(file_path: str, preprocess: bool, text_layer: bool = True) -> Tuple[bytes, Dict[str, Any]]:
+    """读取要上传的内容：图片按需预处理，PDF按需只保留没有文本层的页面，其余情况上传原始内容"""
+    # 只在读取源文件时占用其所在设备的I/O名额，预处理和上传期间不占用
+    with io_slot(file_path), fs.open_file(file_path, 'rb') as file:
+        data = file.read()
+    content, info = None, {}
+    suffix = Path(file_path).suffix.lower()
+    if preprocess and suffix in IMAGE_EXTENSIONS:
+        content, info = preprocess_image(file_path, data)
+    elif text_layer and suffix == ".pdf":
+        content, info = split_pdf_text_layer(data)
+    info["original_bytes"] = len(data)
+    if content is None:
+        content = data
+    info["upload_bytes"] = len(content)
+    return content, info
+
+
+def request_ocr(filename: str, content: bytes) -> Dict[str, Any]:
+    """
+    上传文件到OCR服务并解析结果
+    :raises RuntimeError: 服务返回非200状态码或不是有效的JSON，消息可直接展示给用户
+    """
+    response = requests.post(
+        OCR_SERVICE_URL,
+        files={'file': (filename, content, 'application/octet-stream')},
+        timeout=OCR_TIMEOUT
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"OCR服务返回状态码 {response.status_code}, 错误信息: {response.text}")
+    try:
+        return response.json()
+    except json.JSONDecodeError:
+        raise RuntimeError("OCR服务返回的不是有效的JSON格式")
+
+
+def default_output_path(file_path: str, output_directory: str = None) -> Path:
+    source_file = Path(file_path)
+    directory = Path(output_directory) if output_directory else source_file.parent
+    return directory / f"{source_file.stem}_ocr_result.json"
+
+
+def assign_output_paths(file_paths: List[str], output_directory: str = None) -> Tuple[Dict[str, Path], List[str]]:
+    """
+    为批量识别的每个文件分配结果JSON路径，避免同名文件互相覆盖
+    主名相同的文件（如 x.jpg 与 x.pdf）改用 源文件名_扩展名_ocr_result.json；
+    不同目录下的同名文件保存到同一 output_directory 时再加上所在目录名，
+    即 目录名_源文件名_扩展名_ocr_result.json；仍然冲突的文件不识别并报告错误
+    :return: ({源文件: 结果路径}, 错误列表)
+    """
+    groups: Dict[str, List[str]] = {}
+    for file_path in file_paths:
+        key = os.path.normcase(os.path.abspath(default_output_path(file_path, output_directory)))
+        groups.setdefault(key, []).append(file_path)
+
+    outputs: Dict[str, Path] = {}
+    for members in groups.values():
+        suffixes = [Path(p).suffix.lower() for p in members]
+        for file_path, suffix in zip(members, suffixes):
+            output_path = default_output_path(file_path, output_directory)
+            if len(members) > 1:
+                source_file = Path(file_path)
+                name = f"{source_file.stem}_{suffix.lstrip('.')}"
+                if suffixes.count(suffix) > 1:
+                    # 扩展名也相同（不同目录下的同名文件），再加上所在目录名
+                    name = f"{Path(os.path.abspath(file_path)).parent.name}_{name}"
+                output_path = output_path.with_name(f"{name}_ocr_result.json")
+            outputs[file_path] = output_path
+
+    errors = []
+    claimed: Dict[str, str] = {}
+    for file_path, output_path in list(outputs.items()):
+        key = os.path.normcase(os.path.abspath(output_path))
+        if key in claimed:
+            errors.append(f"  {file_path}: 结果文件 {output_path} 与 {claimed[key]} 冲突，请分批识别或分别指定输出目录")
+            del outputs[file_path]
+        else:
+            claimed[key] = file_path
+    return outputs, errors
+
+
+def summarize_result(file_path: str, output_json_path, ocr_result: Dict[str, Any]) -> Dict[str, Any]:
+    result_summary = {
+        "status": "成功",
+        "source_file": file_path,
+        "output_json": str(output_json_path),
+        "ocr_status": ocr_result.get("status", "unknown"),
+        "filename": ocr_result.get("filename", "unknown")
+    }
+
+    # 如果OCR成功，添加结果摘要
+    if ocr_result.get("status") == "success" and "results" in ocr_result:
+        results = ocr_result["results"]
+        if isinstance(results, dict):
+            result_summary["text_length"] = len(str(results.get("text", "")))
+            result_summary["pages_processed"] = len(results.get("pages", []))
+        elif isinstance(results, str):
+            result_summary["text_length"] = len(results)
+    return result_summary
+
+
+def upload_summary(info: Dict[str, Any], request_seconds: float) -> Dict[str, Any]:
+    """
+    上传统计：原始/上传字节数、预处理和请求耗时
+    节省的上传时间按本次请求的平均速率折算（请求耗时包含服务端识别时间，因此是保守估计）
+    """
+    original, uploaded = info["original_bytes"], info["upload_bytes"]
+    summary = {
+        "original_bytes": original,
+        "upload_bytes": uploaded,
+        "saved_bytes": original - uploaded,
+        "preprocess_seconds": round(info.get("preprocess_seconds", 0.0), 3),
+        "request_seconds": round(request_seconds, 3),
+    }
+    if original > uploaded and uploaded and request_seconds > 0:
+        summary["estimated_upload_seconds_saved"] = round((original - uploaded) / (uploaded / request_seconds), 3)
+    for key in ("original_size", "upload_size", "skipped"):
+        if key in info:
+            summary[key] = info[key]
+    if "text_layer" in info:
+        summary["text_layer_pages"] = len(info["text_layer"]["pages"])
+        summary["ocr_pages"] = len(info["text_layer"]["ocr_pages"])
+    return summary
+
+
+def describe_upload(summary: Dict[str, Any]) -> str:
+    if "text_layer_pages" in summary and not summary["ocr_pages"]:
+        return (f"全部 {summary['text_layer_pages']} 页使用PDF文本层，未上传OCR服务"
+                f"（提取耗时 {summary['preprocess_seconds']:.2f}s）")
+    text = f"上传 {format_bytes(summary['upload_bytes'])}"
+    if summary["saved_bytes"] > 0:
+        text += (f"（原始 {format_bytes(summary['original_bytes'])}，节省 "
+                 f"{summary['saved_bytes'] / summary['original_bytes']:.0%}，预处理 {summary['preprocess_seconds']:.2f}s）")
+    if "text_layer_pages" in summary:
+        text += f"，{summary['text_layer_pages']} 页使用PDF文本层、{summary['ocr_pages']} 页OCR识别"
+    return text + f"，请求耗时 {summary['request_seconds']:.2f}s"
+
+
+def recognize_file(file_path: str, output_json_path, content: bytes, info: Dict[str, Any]) -> Dict[str, Any]:
+    """上传已准备好的内容（PDF与文本层页面合并）、保存识别结果，返回结果摘要（含上传统计）"""
+    filename = os.path.basename(file_path)
+    text_layer = info.get("text_layer")
+    started = time.perf_counter()
+    if text_layer and not content:
+        ocr_result = merge_text_layer(filename, text_layer)
+    else:
+        ocr_result = request_ocr(filename, content)
+        if text_layer:
+            merged = merge_text_layer(filename, text_layer, ocr_result)
+            if merged is None:
+                # 无法把OCR服务返回的页面对应回原页码，改为上传整个PDF
+                with io_slot(file_path), fs.open_file(file_path, 'rb') as file:
+                    data = file.read()
+                ocr_result = request_ocr(filename, data)
+                info = {key: value for key, value in info.items() if key != "text_layer"}
+                info["upload_bytes"] += len(data)
+                info["skipped"] = "OCR结果无法与文本层合并，已上传整个PDF"
+            else:
+                ocr_result = merged
+    request_seconds = time.perf_counter() - started
+
+    try:
+        with fs.open_file(output_json_path, 'w', encoding='utf-8') as json_file:
+            json.dump(ocr_result, json_file, ensure_ascii=False, indent=2)
+    except Exception as e:
+        raise RuntimeError(f"保存JSON文件失败 - {str(e)}")
+
+    result_summary = summarize_result(file_path, output_json_path, ocr_result)
+    result_summary["upload"] = upload_summary(info, request_seconds)
+    return result_summary
+
+
+def describe_request_error(error: Exception) -> str:
+    if isinstance(error, requests.exceptions.Timeout):
+        return "OCR服务请求超时，请稍后重试"
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return "无法连接到OCR服务，请检查网络连接"
+    return str(error)
 
 
 def register_ocr_tools(mcp):
     """注册OCR相关工具"""
-    
+
     @mcp.tool
-    def ocr_recognize(file_path: str, output_json_path: str = None):
+    def ocr_recognize(file_path: str, output_json_path: str = None, preprocess: bool = True,
+                      use_text_layer: bool = True):
         """
         OCR文字识别工具：从图片或PDF文件中提取和识别文字内容，支持中英文识别
 
@@ -28,76 +441,166 @@ def register_ocr_tools(mcp):
         - 需要将扫描件转换为文字时使用此工具
         :param file_path: 要识别的文件路径（支持JPG、PNG、PDF格式）
         :param output_json_path: 输出JSON文件路径（可选，默认为源文件名_ocr_result.json）
+        :param preprocess: 上传前是否缩小图片、转灰度并重新压缩（默认True，需要安装 Pillow，对PDF无效）
+        :param use_text_layer: PDF页面已有文本层时是否直接提取文字、只上传扫描页（默认True，需要安装 PyMuPDF）
         :return: OCR识别结果
         """
         try:
             # 检查文件是否存在
-            if not os.path.exists(file_path):
+            if not fs.exists(file_path):
                 return f"错误: 文件 {file_path} 不存在"
 
             # 检查文件格式
             file_extension = Path(file_path).suffix.lower()
-            if file_extension not in [".jpg", ".jpeg", ".png", ".pdf"]:
+            if file_extension not in SUPPORTED_EXTENSIONS:
                 return f"错误: 不支持的文件格式 {file_extension}，仅支持 JPG、PNG、PDF"
 
-            # 准备上传文件
-            with open(file_path, 'rb') as file:
-                files = {
-                    'file': (os.path.basename(file_path), file, 'application/octet-stream')
-                }
-
-                # 发送POST请求到OCR服务
-                response = requests.post(
-                    'https://server0.d5data.tech:20110/ocr',
-                    files=files,
-                    timeout=600  # 设置60秒超时
-                )
-
-            # 检查响应状态
-            if response.status_code != 200:
-                return f"错误: OCR服务返回状态码 {response.status_code}, 错误信息: {response.text}"
-
-            # 解析JSON响应
-            try:
-                ocr_result = response.json()
-            except json.JSONDecodeError:
-                return f"错误: OCR服务返回的不是有效的JSON格式"
+            content, info = prepare_upload(file_path, preprocess, use_text_layer)
 
             # 生成输出文件路径
             if output_json_path is None:
-                source_file = Path(file_path)
-                output_json_path = source_file.parent / f"{source_file.stem}_ocr_result.json"
+                output_json_path = default_output_path(file_path)
 
-            # 保存结果到JSON文件
             try:
-                with open(output_json_path, 'w', encoding='utf-8') as json_file:
-                    json.dump(ocr_result, json_file, ensure_ascii=False, indent=2)
-            except Exception as e:
-                return f"错误: 保存JSON文件失败 - {str(e)}"
+                result_summary = recognize_file(file_path, output_json_path, content, info)
+            except RuntimeError as e:
+                return f"错误: {str(e)}"
 
             # 返回处理结果
-            result_summary = {
-                "status": "成功",
-                "source_file": file_path,
-                "output_json": str(output_json_path),
-                "ocr_status": ocr_result.get("status", "unknown"),
-                "filename": ocr_result.get("filename", "unknown")
-            }
-
-            # 如果OCR成功，添加结果摘要
-            if ocr_result.get("status") == "success" and "results" in ocr_result:
-                results = ocr_result["results"]
-                if isinstance(results, dict):
-                    result_summary["text_length"] = len(str(results.get("text", "")))
-                    result_summary["pages_processed"] = len(results.get("pages", []))
-                elif isinstance(results, str):
-                    result_summary["text_length"] = len(results)
-
-            return f"✅ OCR识别完成!\n文件: {file_path}\n结果已保存到: {output_json_path}\n状态: {result_summary['ocr_status']}\n详细信息: {json.dumps(result_summary, ensure_ascii=False, indent=2)}"
-
-        except requests.exceptions.Timeout:
-            return "错误: OCR服务请求超时，请稍后重试"
-        except requests.exceptions.ConnectionError:
-            return "错误: 无法连接到OCR服务，请检查网络连接"
+            return (f"✅ OCR识别完成!\n文件: {file_path}\n结果已保存到: {output_json_path}\n"
+                    f"状态: {result_summary['ocr_status']}\n{describe_upload(result_summary['upload'])}\n"
+                    f"详细信息: {json.dumps(result_summary, ensure_ascii=False, indent=2)}")
+
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            return f"错误: {describe_request_error(e)}"
+        except Exception as e:
+            return f"OCR识别时出错: {str(e)}"
+
+    @mcp.tool
+    def ocr_recognize_batch(file_paths: List[str], output_directory: str = None, preprocess: bool = True,
+                            use_text_layer: bool = True):
+        """
+        批量OCR识别多个图片/PDF：图片在多个进程中并行预处理，同时并发上传识别，每个文件的结果保存为单独的JSON
+        :param file_paths: 要识别的文件路径列表（支持JPG、PNG、PDF格式）
+        :param output_directory: 结果JSON的保存目录（可选，默认保存在各源文件所在目录，文件名为 源文件名_ocr_result.json，
+                                 主名相同的文件会在文件名中加上扩展名和所在目录名以免互相覆盖）
+        :param preprocess: 上传前是否缩小图片、转灰度并重新压缩（默认True，需要安装 Pillow，对PDF无效）
+        :param use_text_layer: PDF页面已有文本层时是否直接提取文字、只上传扫描页（默认True，需要安装 PyMuPDF）
+        :return: 每个文件的识别状态，以及上传字节数和耗时统计
+        """
+        try:
+            if isinstance(file_paths, str):
+                file_paths = [file_paths]
+            if not file_paths:
+                return "错误: 没有指定要识别的文件"
+            if output_directory:
+                if fs.exists(output_directory) and not fs.isdir(output_directory):
+                    return f"错误: {output_directory} 存在但不是目录"
+                fs.makedirs(output_directory, exist_ok=True)
+
+            started = time.perf_counter()
+            errors = []
+            valid = []
+            for file_path in dict.fromkeys(file_paths):
+                if not fs.isfile(file_path):
+                    errors.append(f"  {file_path}: 文件不存在")
+                elif Path(file_path).suffix.lower() not in SUPPORTED_EXTENSIONS:
+                    errors.append(f"  {file_path}: 不支持的文件格式，仅支持 JPG、PNG、PDF")
+                else:
+                    valid.append(file_path)
+            output_paths, conflicts = assign_output_paths(valid, output_directory)
+            errors.extend(conflicts)
+            valid = [p for p in valid if p in output_paths]
+            if not valid:
+                return "错误: 没有可识别的文件\n" + "\n".join(errors)
+
+            # 需要预处理的图片交给进程池，其余文件（PDF、小图片）在上传线程中准备
+            to_preprocess = [p for p in valid
+                             if preprocess and Image is not None
+                             and Path(p).suffix.lower() in IMAGE_EXTENSIONS
+                             and fs.getsize(p) >= PREPROCESS_MIN_BYTES]
+            pending = set(to_preprocess)
+
+            def upload_one(file_path: str, prepared: Optional[Tuple[Optional[bytes], Dict[str, Any]]]):
+                if prepared is None:
+                    content, info = prepare_upload(file_path, preprocess, use_text_layer)
+                else:
+                    content, info = prepared
+                    if content is None:
+                        with io_slot(file_path), fs.open_file(file_path, 'rb') as file:
+                            content = file.read()
+                    info = {**info, "original_bytes": fs.getsize(file_path), "upload_bytes": len(content)}
+                return recognize_file(file_path, output_paths[file_path], content, info)
+
+            upload = fs.in_scope(upload_one)
+            results = []
+            totals = {"original_bytes": 0, "upload_bytes": 0, "preprocess_seconds": 0.0, "estimated_saved": 0.0}
+            # 多个文件才值得启动进程池（spawn 方式，避免在有多个线程的服务进程中 fork）
+            process_pool = (ProcessPoolExecutor(max_workers=min(PREPROCESS_WORKERS, len(to_preprocess)),
+                                                mp_context=multiprocessing.get_context("spawn"))
+                            if len(to_preprocess) > 1 else None)
+            upload_pool = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS)
+            try:
+                uploads = {upload_pool.submit(upload, p, None): p for p in valid if p not in pending}
+                if process_pool is not None:
+                    preprocessing = {process_pool.submit(preprocess_image, p): p for p in to_preprocess}
+                    for index, future in enumerate(as_completed(preprocessing)):
+                        report_progress(0, len(valid), f"已预处理 {index}/{len(to_preprocess)} 张图片")
+                        file_path = preprocessing[future]
+                        try:
+                            content, info = future.result()
+                        except Exception as e:
+                            content, info = None, {"skipped": f"预处理失败 - {str(e)}"}
+                        uploads[upload_pool.submit(upload, file_path, (content, info))] = file_path
+                else:
+                    for file_path in to_preprocess:
+                        report_progress(0, len(valid), f"正在预处理 {file_path}")
+                        with io_slot(file_path), fs.open_file(file_path, 'rb') as file:
+                            data = file.read()
+                        content, info = preprocess_image(file_path, data)
+                        uploads[upload_pool.submit(upload, file_path, (content, info))] = file_path
+
+                for index, future in enumerate(as_completed(uploads)):
+                    report_progress(index, len(uploads), f"已识别 {index}/{len(uploads)} 个文件")
+                    file_path = uploads[future]
+                    try:
+                        summary = future.result()
+                    except Exception as e:
+                        errors.append(f"  {file_path}: {describe_request_error(e)}")
+                        continue
+                    results.append(summary)
+                    upload_stats = summary["upload"]
+                    totals["original_bytes"] += upload_stats["original_bytes"]
+                    totals["upload_bytes"] += upload_stats["upload_bytes"]
+                    totals["preprocess_seconds"] += upload_stats["preprocess_seconds"]
+                    totals["estimated_saved"] += upload_stats.get("estimated_upload_seconds_saved", 0.0)
+            finally:
+                upload_pool.shutdown(wait=True, cancel_futures=True)
+                if process_pool is not None:
+                    process_pool.shutdown(wait=True, cancel_futures=True)
+            elapsed = time.perf_counter() - started
+
+            results.sort(key=lambda r: r["source_file"])
+            summary = f"📝 批量OCR完成: 成功 {len(results)} 个，失败 {len(errors)} 个，总耗时 {elapsed:.2f} 秒\n"
+            if results:
+                original = totals["original_bytes"]
+                saved = original - totals["upload_bytes"]
+                summary += f"上传: {format_bytes(totals['upload_bytes'])}（原始 {format_bytes(original)}"
+                if saved > 0:
+                    summary += (f"，节省 {format_bytes(saved)} / {saved / original:.0%}，"
+                                f"预处理共 {totals['preprocess_seconds']:.2f}s，"
+                                f"按实测上传速率估计少用 {totals['estimated_saved']:.2f}s 上传时间")
+                summary += "）\n"
+                summary += "\n识别完成:\n"
+                for result in results[:MAX_ITEMS_SHOWN]:
+                    summary += (f"  ✅ {result['source_file']} → {result['output_json']}"
+                                f"（{result['ocr_status']}，{describe_upload(result['upload'])}）\n")
+                if len(results) > MAX_ITEMS_SHOWN:
+                    summary += f"  ... 还有 {len(results) - MAX_ITEMS_SHOWN} 个文件\n"
+            if errors:
+                summary += "\n失败:\n" + "\n".join(f"  ❌{line[1:]}" for line in errors[:MAX_ITEMS_SHOWN]) + "\n"
+                if len(errors) > MAX_ITEMS_SHOWN:
+                    summary += f"  ... 还有 {len(errors) - MAX_ITEMS_SHOWN} 个失败\n"
+            return summary.rstrip("\n")
         except Exception as e:
-            return f"OCR识别时出错: {str(e)}"
\ No newline at end of file
+            return f"批量OCR识别时出错: {str(e)}"
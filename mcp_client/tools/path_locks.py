@@ -0,0 +1,374 @@
+"""
+路径锁模块
+多个客户端或并行的工具调用同时修改重叠的路径时（如一边移动目录、一边删除其中的文件），
+各工具“先检查再操作”的过程会相互干扰。修改类工具在执行期间对涉及的路径持有锁:
+
+- 每个锁覆盖路径本身及其下的整棵子树：锁住 /data/a 与锁住 /data/a/b/c.txt 相互重叠，与 /data/b 互不相关
+- 共享锁（读取，如同步的源目录、归档的源目录）之间可以并存，独占锁（修改）与任何重叠的锁互斥
+- 一个工具需要的所有路径一次性原子获取，不会持有一部分再等待另一部分，因此不会死锁
+- 公平：与前面的等待者重叠的请求排在它后面，不会插队，连续的共享锁不会让独占锁饿死；
+  与所有等待者都不重叠的请求可以直接执行，互不相关的路径上的操作完全并行
+
+工具通过 path_locked 装饰器声明要锁的参数:
+    @mcp.tool
+    @path_locked(shared=["source_directory"], exclusive=["target_directory"])
+    def sync_directories(source_directory: str, target_directory: str, ...):
+
+锁的持有者是一次工具调用（fs 的调用范围），同一调用内嵌套获取与自己已持有的锁重叠的路径不会等待自己。
+路径按 abspath 规范化后比较，不解析符号链接；只读的查询类工具不加锁，读取到的是执行时刻的状态。
+"""
+
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from . import fs
+
+# 状态中最多展示的锁请求数与每个请求展示的路径数
+MAX_REQUESTS_SHOWN = 30
+MAX_PATHS_SHOWN = 3
+
+SHARED, EXCLUSIVE = 0, 1
+
+
+def normalize(path: str) -> str:
+    path = os.fspath(path)
+    # 已经是规范绝对路径时（批量操作的路径通常如此）省去 abspath 的规范化开销
+    if os.altsep is None and path[:1] == os.sep and path[-1:] != os.sep and "//" not in path and "/." not in path:
+        return path
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _parent(path: str) -> str:
+    """规范绝对路径的上级目录，根目录的上级是其自身"""
+    if os.altsep is None:
+        return path.rpartition(os.sep)[0] or os.sep
+    return os.path.dirname(path)
+
+
+def _ancestors(path: str) -> Iterable[str]:
+    while True:
+        parent = _parent(path)
+        if parent == path:
+            return
+        yield parent
+        path = parent
+
+
+def _weight(counts: Optional[List[int]], mode: int) -> int:
+    """counts 中与 mode 模式不兼容的锁数"""
+    if not counts:
+        return 0
+    return counts[EXCLUSIVE] + (counts[SHARED] if mode == EXCLUSIVE else 0)
+
+
+class LockRequest:
+    """
+    一次工具调用对一组路径的加锁请求
+    below 为每个上级目录之下本请求的 [共享, 独占] 锁数；批量操作的大量文件通常只有少数几个上级目录，
+    事先合并后，登记和冲突检查对每个路径只需常数次查找
+    """
+
+    def __init__(self, owner, locks: List[Tuple[str, int]], label: str):
+        self.owner = owner
+        self.locks = locks
+        self.label = label
+        self.requested = time.time()
+        self.granted: Optional[float] = None
+        self._event: Optional[threading.Event] = None
+
+        parents: Dict[str, List[int]] = {}
+        for path, mode in locks:
+            parent = _parent(path)
+            if parent != path:
+                counts = parents.get(parent)
+                if counts is None:
+                    counts = parents[parent] = [0, 0]
+                counts[mode] += 1
+        self.below: Dict[str, List[int]] = {}
+        for parent, counts in parents.items():
+            for ancestor in (parent, *_ancestors(parent)):
+                total = self.below.get(ancestor)
+                if total is None:
+                    total = self.below[ancestor] = [0, 0]
+                total[SHARED] += counts[SHARED]
+                total[EXCLUSIVE] += counts[EXCLUSIVE]
+
+    def describe(self) -> str:
+        paths = [f"{path}（{'独占' if mode == EXCLUSIVE else '共享'}）" for path, mode in self.locks[:MAX_PATHS_SHOWN]]
+        if len(self.locks) > MAX_PATHS_SHOWN:
+            paths.append(f"... 共 {len(self.locks)} 个路径")
+        return f"{self.label}: " + ", ".join(paths)
+
+
+class LockIndex:
+    """
+    一组锁的计数索引：on 为每个路径上的 [共享, 独占] 锁数，below 为每个目录之下（不含自身）的锁数，
+    判断重叠只需查看路径本身、below 中的一项和各级上级目录
+    """
+
+    def __init__(self):
+        self.on: Dict[str, List[int]] = {}
+        self.below: Dict[str, List[int]] = {}
+
+    def __bool__(self):
+        return bool(self.on)
+
+    def add(self, request: LockRequest, delta: int = 1):
+        for path, mode in request.locks:
+            self._update(self.on, path, mode, delta)
+        for ancestor, counts in request.below.items():
+            for mode in (SHARED, EXCLUSIVE):
+                if counts[mode]:
+                    self._update(self.below, ancestor, mode, delta * counts[mode])
+
+    def remove(self, request: LockRequest):
+        self.add(request, -1)
+
+    @staticmethod
+    def _update(table: Dict[str, List[int]], path: str, mode: int, delta: int):
+        counts = table.get(path)
+        if counts is None:
+            counts = table[path] = [0, 0]
+        counts[mode] += delta
+        if not counts[SHARED] and not counts[EXCLUSIVE]:
+            del table[path]
+
+    def conflicts(self, request: LockRequest) -> int:
+        """
+        与请求重叠且不兼容的锁的计数（同一把锁可能因多个路径重复计入，只用于判断是否为0，
+        以及减去持有者自己的锁：计数对持有者可加）
+        """
+        if not self.on:
+            return 0
+        count = 0
+        for path, mode in request.locks:
+            count += _weight(self.on.get(path), mode) + _weight(self.below.get(path), mode)
+        for ancestor, counts in request.below.items():
+            count += _weight(self.on.get(ancestor), EXCLUSIVE if counts[EXCLUSIVE] else SHARED)
+        return count
+
+
+class PathLockManager:
+    """分层路径锁：已授予的锁与等待队列都用 LockIndex 计数，授予与唤醒都在一把内部锁下完成"""
+
+    def __init__(self):
+        self._held = LockIndex()
+        # 持有者 → 其已授予的请求，只在同一持有者嵌套获取时才需要建立索引
+        self._owned: Dict[Any, List[LockRequest]] = {}
+        self._active: List[LockRequest] = []
+        self._waiting: deque = deque()
+        self._queued = LockIndex()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.contended = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _grantable(self, request: LockRequest) -> bool:
+        """与其他持有者的锁都不冲突（自己已持有的锁不计入）"""
+        conflicts = self._held.conflicts(request)
+        owned = self._owned.get(request.owner)
+        if conflicts and owned:
+            own = LockIndex()
+            for granted in owned:
+                own.add(granted)
+            conflicts -= own.conflicts(request)
+        return not conflicts
+
+    def _grant(self, request: LockRequest):
+        request.granted = time.time()
+        self._held.add(request)
+        self._owned.setdefault(request.owner, []).append(request)
+        self._active.append(request)
+
+    def acquire(self, locks: List[Tuple[str, int]], owner=None, label: str = "") -> LockRequest:
+        """
+        获取一组路径锁（locks 为 (路径, SHARED/EXCLUSIVE)），全部可用时一次性授予，否则排队等待
+        :return: 锁请求，用于 release
+        """
+        merged: Dict[str, int] = {}
+        for path, mode in locks:
+            path = normalize(path)
+            merged[path] = max(mode, merged.get(path, SHARED))
+        request = LockRequest(owner if owner is not None else object(), sorted(merged.items()), label)
+
+        with self._lock:
+            self.acquired += 1
+            # 已持有锁的调用再次获取时不排在等待者之后：等待者可能正在等它释放
+            holding = request.owner in self._owned
+            if (holding or not self._queued.conflicts(request)) and self._grantable(request):
+                self._grant(request)
+                return request
+            self.contended += 1
+            request._event = threading.Event()
+            self._waiting.append(request)
+            self._queued.add(request)
+
+        # 锁由 release 直接授予，被唤醒时已登记为持有者
+        request._event.wait()
+        waited = request.granted - request.requested
+        with self._lock:
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+        return request
+
+    def release(self, request: LockRequest):
+        with self._lock:
+            self._active.remove(request)
+            self._held.remove(request)
+            owned = self._owned[request.owner]
+            owned.remove(request)
+            if not owned:
+                del self._owned[request.owner]
+            self._wake()
+
+    def _wake(self):
+        """按到达顺序检查等待者：与前面仍在等待的请求不重叠、且与已持有的锁不冲突时授予"""
+        ahead = LockIndex()
+        for request in list(self._waiting):
+            holding = request.owner in self._owned
+            if (holding or not ahead.conflicts(request)) and self._grantable(request):
+                self._waiting.remove(request)
+                self._queued.remove(request)
+                self._grant(request)
+                request._event.set()
+            else:
+                ahead.add(request)
+
+    @contextmanager
+    def hold(self, locks: List[Tuple[str, int]], label: str = ""):
+        """在当前工具调用的范围内持有路径锁；不在调用范围内时每次获取都是独立的持有者"""
+        if not locks:
+            yield
+            return
+        request = self.acquire(locks, fs.current_scope(), label)
+        try:
+            yield
+        finally:
+            self.release(request)
+
+    def snapshot(self) -> Tuple[List[LockRequest], List[LockRequest]]:
+        with self._lock:
+            return list(self._active), list(self._waiting)
+
+
+LOCKS = PathLockManager()
+
+
+def _as_paths(value) -> List[str]:
+    """参数值 → 路径列表：单个路径或路径列表"""
+    if isinstance(value, str):
+        return [value] if value else []
+    if isinstance(value, (list, tuple, set)):
+        return [item for item in value if isinstance(item, str) and item]
+    return []
+
+
+def _json_paths(value) -> List[str]:
+    """与批量重命名工具相同地解析 file_paths：也接受 JSON 列表或 {"file_paths": [...]} 字符串"""
+    if isinstance(value, str):
+        try:
+            parsed = json.loads(value)
+        except ValueError:
+            return _as_paths(value)
+        if isinstance(parsed, dict) and "file_paths" in parsed:
+            return _as_paths(parsed["file_paths"])
+        if isinstance(parsed, list):
+            return _as_paths(parsed)
+    return _as_paths(value)
+
+
+def parent_directories(param: str) -> Callable[[Dict[str, Any]], List[str]]:
+    """锁参数中各文件所在的目录（批量重命名生成的新名称都落在原文件所在目录，事先无法确定）"""
+    def directories(arguments: Dict[str, Any]) -> List[str]:
+        return [os.path.dirname(os.path.abspath(path)) for path in _json_paths(arguments.get(param))]
+    return directories
+
+
+def moved_into(source_param: str, target_param: str) -> Callable[[Dict[str, Any]], List[str]]:
+    """锁移动的目标：目标目录下与各源路径同名的项（与 move_files 的目标路径相同）"""
+    def targets(arguments: Dict[str, Any]) -> List[str]:
+        target_directory = arguments.get(target_param)
+        if not isinstance(target_directory, str) or not target_directory:
+            return []
+        return [os.path.join(target_directory, os.path.basename(path))
+                for path in _as_paths(arguments.get(source_param))]
+    return targets
+
+
+def template_root(template: str, base: str = "") -> str:
+    """目标目录模板中不含占位符的部分（如 "归档/{year}/{ext}" → "归档"），按 base 解析相对路径"""
+    prefix, brace, _ = template.partition("{")
+    if brace and not prefix.endswith(("/", os.sep)):
+        prefix = os.path.dirname(prefix)
+    return os.path.join(base, prefix) if base or prefix else "."
+
+
+LockSpec = Union[str, Callable[[Dict[str, Any]], Any]]
+
+
+def _resolve(specs: Sequence[LockSpec], arguments: Dict[str, Any]) -> List[str]:
+    paths = []
+    for spec in specs:
+        paths.extend(_as_paths(spec(arguments) if callable(spec) else arguments.get(spec)))
+    return paths
+
+
+def path_locked(shared: Sequence[LockSpec] = (), exclusive: Sequence[LockSpec] = ()):
+    """
+    工具装饰器：调用期间对参数中的路径持有锁（放在 @mcp.tool 之下）
+    shared / exclusive 中每一项为参数名（值可以是路径或路径列表），或接收全部参数、返回路径（列表）的函数
+    """
+    def decorate(fn: Callable) -> Callable:
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = bound.arguments
+            locks = ([(path, SHARED) for path in _resolve(shared, arguments)]
+                     + [(path, EXCLUSIVE) for path in _resolve(exclusive, arguments)])
+            with LOCKS.hold(locks, fn.__name__):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def register_path_lock_tools(mcp):
+    """注册路径锁相关工具"""
+
+    @mcp.tool
+    def get_path_locks():
+        """
+        查看路径锁状态：正在执行的修改类操作持有的路径锁、排队等待的操作，以及累计等待时间
+        操作迟迟没有开始时可用来查看它在等待哪个操作
+        :return: 持有和等待中的锁
+        """
+        try:
+            active, waiting = LOCKS.snapshot()
+            now = time.time()
+            summary = (f"🔒 路径锁: {len(active)} 个操作持有锁，{len(waiting)} 个等待中\n"
+                       f"累计获取 {LOCKS.acquired} 次，其中 {LOCKS.contended} 次需要等待"
+                       f"（总等待 {LOCKS.total_wait:.2f} 秒，最长 {LOCKS.max_wait:.2f} 秒）\n")
+            if active:
+                summary += "\n持有:\n"
+                for request in active[:MAX_REQUESTS_SHOWN]:
+                    summary += f"  {request.describe()}（已持有 {now - request.granted:.1f} 秒）\n"
+            if waiting:
+                summary += "\n等待（按到达顺序）:\n"
+                for request in waiting[:MAX_REQUESTS_SHOWN]:
+                    summary += f"  {request.describe()}（已等待 {now - request.requested:.1f} 秒）\n"
+            shown = min(len(active), MAX_REQUESTS_SHOWN) + min(len(waiting), MAX_REQUESTS_SHOWN)
+            if len(active) + len(waiting) > shown:
+                summary += f"  ... 还有 {len(active) + len(waiting) - shown} 个\n"
+            return summary.rstrip("\n")
+        except Exception as e:
+            return f"获取路径锁状态时出错: {str(e)}"
@@ -0,0 +1,269 @@
+"""
+批处理流水线工具模块
+在服务器端按顺序执行 find → filter → rename → move → delete 等步骤，
+文件集合在步骤之间以内存形式传递，一次工具调用完成原本需要多轮对话的操作
+"""
+
+import os
+from datetime import datetime
+from typing import Any, Dict, List
+
+from . import fs
+from .file_organize import render_target, validate_template
+from .file_query import FileEntry, FileQuery, FILTER_KEYS
+from .io_scheduler import io_slot
+from .jobs import report_progress
+from .path_locks import path_locked, template_root
+
+# 支持的步骤及各自允许的键（find/filter 另外接受 find_files 的全部过滤条件）
+STEP_KEYS = {
+    "find": {"directory", "pattern"} | FILTER_KEYS,
+    "filter": {"pattern"} | FILTER_KEYS,
+    "rename": {"template", "keep_extension"},
+    "move": {"target_directory"},
+    "delete": set(),
+}
+
+# 单次流水线最多处理的文件数
+MAX_PIPELINE_FILES = 10000
+
+# 结果中最多展示的文件数与错误数
+MAX_FILES_SHOWN = 50
+MAX_ERRORS_SHOWN = 20
+
+
+def render_name(template: str, entry: FileEntry, index: int, keep_extension: bool) -> str:
+    """
+    根据模板生成新文件名
+    支持 render_target 的全部占位符，以及 {index}（从1开始，可写作 {index:03d}）和 {date}（修改日期 YYYY-MM-DD）
+    """
+    stem, ext = os.path.splitext(entry.name)
+    modified = datetime.fromtimestamp(entry.mtime)
+    fields = {
+        "year": f"{modified.year:04d}",
+        "month": f"{modified.month:02d}",
+        "day": f"{modified.day:02d}",
+        "date": modified.strftime("%Y-%m-%d"),
+        "ext": ext[1:].lower() or "no_ext",
+        "name": entry.name,
+        "stem": stem,
+        "index": index,
+    }
+    new_name = template.format(**fields)
+    if keep_extension and ext and not new_name.endswith(ext):
+        new_name += ext
+    if not new_name or "/" in new_name or os.sep in new_name or new_name in (".", ".."):
+        raise ValueError(f"生成的文件名无效: '{new_name}'")
+    return new_name
+
+
+def validate_steps(steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """执行前检查全部步骤，任何一步无效都不会开始执行"""
+    if not isinstance(steps, list) or not steps:
+        raise ValueError("steps 必须是非空列表")
+
+    compiled = []
+    for number, step in enumerate(steps, 1):
+        if not isinstance(step, dict):
+            raise ValueError(f"第 {number} 步必须是字典")
+        op = step.get("op")
+        if op not in STEP_KEYS:
+            raise ValueError(f"第 {number} 步的 op 无效: {op}，可选: {', '.join(STEP_KEYS)}")
+        unknown = set(step) - STEP_KEYS[op] - {"op"}
+        if unknown:
+            raise ValueError(f"第 {number} 步（{op}）不支持的参数: {', '.join(sorted(unknown))}")
+        if number == 1 and op != "find":
+            raise ValueError("第 1 步必须是 find")
+
+        options = {k: v for k, v in step.items() if k != "op"}
+        if op in ("find", "filter"):
+            filters = {k: v for k, v in options.items() if k in FILTER_KEYS}
+            query = FileQuery.from_spec(options.get("pattern") or "*", filters, fixed={"file_type": "file"})
+            if op == "find":
+                directory = options.get("directory")
+                if not directory:
+                    raise ValueError(f"第 {number} 步（find）缺少 directory")
+                if not fs.isdir(directory):
+                    raise ValueError(f"第 {number} 步（find）的目录 {directory} 不存在或不是目录")
+            options["query"] = query
+        elif op == "rename":
+            template = options.get("template")
+            if not template:
+                raise ValueError(f"第 {number} 步（rename）缺少 template")
+            try:
+                render_name(template, FileEntry("example.txt", "example.txt", "example.txt", False, 0, 0.0), 1, True)
+            except (KeyError, IndexError, ValueError) as e:
+                raise ValueError(f"第 {number} 步（rename）的模板 '{template}' 无效 - {str(e)}")
+        elif op == "move":
+            if not options.get("target_directory"):
+                raise ValueError(f"第 {number} 步（move）缺少 target_directory")
+            validate_template(options["target_directory"])
+        compiled.append({"op": op, **options})
+    return compiled
+
+
+def locked_paths(arguments: Dict[str, Any]) -> List[str]:
+    """
+    流水线可能修改的路径：各 find 步骤的目录，以及各 move 步骤目标模板中不含占位符的部分
+    （相对目标按每个 find 的目录解析，与执行时一致）
+    """
+    steps = [step for step in arguments.get("steps") or [] if isinstance(step, dict)]
+    directories = [step["directory"] for step in steps
+                   if step.get("op") == "find" and isinstance(step.get("directory"), str) and step["directory"]]
+    paths = list(directories)
+    for step in steps:
+        if step.get("op") == "move" and isinstance(step.get("target_directory"), str):
+            template = step["target_directory"]
+            paths.extend(template_root(template, directory) for directory in directories or [""])
+    return paths
+
+
+def register_pipeline_tools(mcp):
+    """注册批处理流水线相关工具"""
+
+    @mcp.tool
+    @path_locked(exclusive=[locked_paths])
+    def run_pipeline(steps: List[Dict[str, Any]], confirm: bool = False):
+        """
+        按顺序执行一组文件操作步骤，上一步的文件集合直接传给下一步，一次调用返回全部结果
+        适合“找出PDF → 加日期前缀重命名 → 移动到归档目录”这类多步操作
+        :param steps: 步骤列表，每步是带 "op" 的字典，第一步必须是 find：
+                      - {"op": "find", "directory": "目录", "pattern": "*.pdf", ...过滤条件}
+                        查找文件并加入集合（可以有多个 find），过滤条件与 find_files 的 filters 相同
+                      - {"op": "filter", "pattern": "*report*", "min_size": 1024, ...}
+                        只保留集合中满足条件的文件
+                      - {"op": "rename", "template": "{date}_{stem}", "keep_extension": true}
+                        重命名，占位符: {date} {year} {month} {day} {stem} {name} {ext} {index}/{index:03d}
+                      - {"op": "move", "target_directory": "归档/{year}"}
+                        移动到目标目录（支持 {year} {month} {ext} 等占位符，不存在时自动创建），
+                        相对路径按文件所来自的 find 步骤的目录解析
+                      - {"op": "delete"} 删除集合中的文件
+                      某个文件在某一步失败后会从集合中移除，不再参与后续步骤
+        :param confirm: 确认执行标志，设为True才会真正修改文件，否则只显示每一步的执行计划
+        :return: 各步骤结果汇总和最终文件集合
+        """
+        try:
+            try:
+                compiled = validate_steps(steps)
+            except (ValueError, TypeError) as e:
+                return f"错误: 流水线无效 - {str(e)}"
+
+            # 集合中的每一项: (原始路径, 所来自的 find 目录, 当前 FileEntry)
+            current: List[tuple] = []
+            seen = set()
+            stage_lines = []
+            errors = []
+            deleted = []
+
+            for number, step in enumerate(compiled, 1):
+                op = step["op"]
+
+                if op == "find":
+                    before = len(current)
+                    for entry in step["query"].scan(step["directory"]):
+                        if entry.path not in seen:
+                            seen.add(entry.path)
+                            current.append((entry.path, step["directory"], entry))
+                    if len(current) > MAX_PIPELINE_FILES:
+                        return f"错误: 第 {number} 步（find）匹配了超过 {MAX_PIPELINE_FILES} 个文件，请缩小范围"
+                    stage_lines.append(f"{number}. find {step['directory']} ({step['query'].describe()}): "
+                                       f"新增 {len(current) - before} 个，集合共 {len(current)} 个")
+                    continue
+
+                if op == "filter":
+                    before = len(current)
+                    current = [item for item in current if step["query"].matches(item[2])]
+                    stage_lines.append(f"{number}. filter ({step['query'].describe()}): "
+                                       f"保留 {len(current)}/{before} 个")
+                    continue
+
+                # 以下步骤会修改文件：逐个计算目标路径，预览模式下不执行
+                planned = set()
+                survivors = []
+                success = 0
+                for index, (origin, base, entry) in enumerate(current, 1):
+                    report_progress(index - 1, len(current), f"第 {number} 步 {op}")
+                    try:
+                        if op == "rename":
+                            new_name = render_name(step["template"], entry, index, step.get("keep_extension", True))
+                            target_path = os.path.join(os.path.dirname(entry.path), new_name)
+                        elif op == "move":
+                            target_dir = os.path.normpath(os.path.join(base, render_target(step["target_directory"], entry)))
+                            target_path = os.path.join(target_dir, entry.name)
+                        else:
+                            target_path = None
+
+                        if target_path is not None:
+                            if target_path == entry.path:
+                                survivors.append((origin, base, entry))
+                                success += 1
+                                continue
+                            if target_path in planned or fs.lexists(target_path):
+                                raise FileExistsError("目标位置已存在同名文件")
+                            planned.add(target_path)
+
+                        if confirm:
+                            if op == "rename":
+                                fs.rename(entry.path, target_path)
+                            elif op == "move":
+                                with io_slot(entry.path, target_path):
+                                    fs.makedirs(os.path.dirname(target_path), exist_ok=True)
+                                    fs.move(entry.path, target_path)
+                            else:
+                                with io_slot(entry.path):
+                                    fs.remove(entry.path)
+
+                        success += 1
+                        if op == "delete":
+                            deleted.append((origin, entry))
+                        else:
+                            # rel_path 随之更新（相对所来自的 find 目录），后续 filter 步骤按新路径匹配
+                            survivors.append((origin, base, entry._replace(
+                                path=target_path,
+                                name=os.path.basename(target_path),
+                                rel_path=os.path.relpath(target_path, base).replace(os.sep, "/"),
+                            )))
+                    except FileExistsError as e:
+                        errors.append(f"  第 {number} 步 {op} {entry.name}: {str(e)}")
+                    except PermissionError:
+                        errors.append(f"  第 {number} 步 {op} {entry.name}: 权限不足")
+                    except Exception as e:
+                        errors.append(f"  第 {number} 步 {op} {entry.name}: 失败 - {str(e)}")
+
+                description = {
+                    "rename": f"rename (模板 {step.get('template')})",
+                    "move": f"move → {step.get('target_directory')}",
+                    "delete": "delete",
+                }[op]
+                stage_lines.append(f"{number}. {description}: {'成功' if confirm else '计划'} "
+                                   f"{success}/{len(current)} 个")
+                current = survivors
+
+            header = "⚙️ 流水线执行完成" if confirm else "🔍 流水线执行计划（预览，尚未修改任何文件）"
+            result = f"{header}\n" + "\n".join(stage_lines) + "\n"
+
+            if current:
+                result += f"\n最终文件集合 ({len(current)} 个):\n"
+                for origin, _, entry in current[:MAX_FILES_SHOWN]:
+                    if origin != entry.path:
+                        result += f"  {origin} → {entry.path}\n"
+                    else:
+                        result += f"  {entry.path} ({entry.size} 字节)\n"
+                if len(current) > MAX_FILES_SHOWN:
+                    result += f"  ... 其余 {len(current) - MAX_FILES_SHOWN} 个未显示\n"
+            if deleted:
+                result += f"\n{'已删除' if confirm else '将删除'} {len(deleted)} 个文件，"
+                result += f"共 {sum(entry.size for _, entry in deleted)} 字节\n"
+
+            if errors:
+                result += f"\n失败 {len(errors)} 个（已从后续步骤中移除）:\n" + "\n".join(errors[:MAX_ERRORS_SHOWN])
+                if len(errors) > MAX_ERRORS_SHOWN:
+                    result += f"\n  ... 其余 {len(errors) - MAX_ERRORS_SHOWN} 个未显示"
+                result += "\n"
+
+            if not confirm:
+                result += "\n❗ 这是预览模式，如需执行请设置 confirm=True"
+            return result
+
+        except Exception as e:
+            return f"执行流水线时出错: {str(e)}"
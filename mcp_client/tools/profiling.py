@@ -0,0 +1,389 @@
+"""
+按需性能剖析模块
+生产环境中某次工具调用意外变慢时，不用重启服务就能看到时间花在哪里：运行时为指定工具（或接下来的N次调用）开启剖析，
+每次被剖析的调用结束后把结果写入剖析目录，再通过 get_profile_hotspots 查看热点函数。
+
+两种方式:
+- cprofile: 确定性剖析工具主线程的每次函数调用（pstats 格式，可用 snakeviz 等工具打开），
+  工具内部线程池中的工作不计入，开销较大（纯 Python 热循环可能变慢一倍以上）
+- sample: 按固定间隔采样进程中所有线程的调用栈（折叠栈格式，可直接生成火焰图），
+  包含线程池中的工作，开销小；跳过空闲等待的线程，但同时执行的其他调用也会被采到
+
+ToolRegistry 为每个工具包装 profiled，未开启剖析时只多一次属性检查。
+剖析目录默认为系统临时目录下的 valkyrie_profiles，可通过环境变量 VALKYRIE_PROFILE_DIR 修改；
+VALKYRIE_PROFILE="find_files,sync_directories"（或 "*"）在启动时即开启剖析。
+"""
+
+import cProfile
+import functools
+import inspect
+import itertools
+import json
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+PROFILE_DIR = os.getenv("VALKYRIE_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "valkyrie_profiles"))
+
+# 剖析目录中最多保留的剖析结果数，超出后删除最早的
+MAX_PROFILES = 100
+
+# 采样间隔（秒）
+SAMPLE_INTERVAL = 0.005
+
+# 采样时视为空闲等待的栈顶函数所在模块（线程池空闲的工作线程、事件循环等）
+IDLE_MODULES = (
+    "threading.py", "selectors.py", "queue.py", "concurrent/futures/thread.py",
+)
+
+# 热点列表默认与最多展示的函数数
+DEFAULT_TOP_N = 20
+MAX_TOP_N = 100
+
+MODES = ("cprofile", "sample")
+
+# 剖析相关工具本身不剖析
+PROFILING_TOOL_NAMES = {"set_profiling", "list_profiles", "get_profile_hotspots"}
+
+
+class StackSampler:
+    """后台线程按间隔采样调用栈，按折叠栈（根;...;叶）计数"""
+
+    def __init__(self, target_thread: int, interval: float = SAMPLE_INTERVAL):
+        self.target_thread = target_thread
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    @staticmethod
+    def _frame_label(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if ident != self.target_thread and frame.f_code.co_filename.endswith(IDLE_MODULES):
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(self._frame_label(frame))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(labels))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+class Profiler:
+    """剖析开关与剖析结果目录"""
+
+    def __init__(self, directory: str = PROFILE_DIR):
+        self.directory = directory
+        # 工具名 → 方式；"*" 表示所有工具
+        self.tools: Dict[str, str] = {}
+        # 工具名 → 剩余的剖析次数（只剖析接下来的N次调用）
+        self.remaining: Dict[str, int] = {}
+        self.active = False
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def enable(self, tool_names: List[str], mode: str, calls: Optional[int] = None):
+        with self._lock:
+            for name in tool_names:
+                self.tools[name] = mode
+                if calls is None:
+                    self.remaining.pop(name, None)
+                else:
+                    self.remaining[name] = calls
+            self.active = bool(self.tools)
+
+    def disable(self, tool_names: Optional[List[str]] = None):
+        with self._lock:
+            for name in list(self.tools) if tool_names is None else tool_names:
+                self.tools.pop(name, None)
+                self.remaining.pop(name, None)
+            self.active = bool(self.tools)
+
+    def claim(self, tool_name: str) -> Optional[str]:
+        """本次调用是否需要剖析，需要时返回方式（并扣减剩余次数）"""
+        with self._lock:
+            key = tool_name if tool_name in self.tools else "*" if "*" in self.tools else None
+            if key is None:
+                return None
+            mode = self.tools[key]
+            if key in self.remaining:
+                self.remaining[key] -= 1
+                if self.remaining[key] <= 0:
+                    del self.remaining[key]
+                    del self.tools[key]
+                    self.active = bool(self.tools)
+            return mode
+
+    def run(self, tool_name: str, mode: str, fn: Callable, args, kwargs):
+        """剖析执行一次工具调用，结束后（包括抛出异常时）保存结果"""
+        started = time.time()
+        sampler = profile = None
+        if mode == "sample":
+            sampler = StackSampler(threading.get_ident())
+            sampler.start()
+        else:
+            profile = cProfile.Profile()
+            profile.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if profile is not None:
+                profile.disable()
+            if sampler is not None:
+                sampler.stop()
+            try:
+                self.save(tool_name, mode, started, time.time() - started, profile, sampler)
+            except Exception as e:
+                print(f"保存剖析结果失败 ({tool_name}): {e}", file=sys.stderr)
+
+    def save(self, tool_name: str, mode: str, started: float, seconds: float,
+             profile: Optional[cProfile.Profile], sampler: Optional[StackSampler]):
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = f"{datetime.fromtimestamp(started):%Y%m%d-%H%M%S}-{next(self._ids):04d}-{tool_name}"
+        base = os.path.join(self.directory, profile_id)
+        if profile is not None:
+            data_file = base + ".prof"
+            profile.dump_stats(data_file)
+        else:
+            data_file = base + ".folded"
+            with open(data_file, "w", encoding="utf-8") as f:
+                for stack, count in sampler.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        meta = {
+            "id": profile_id,
+            "tool": tool_name,
+            "mode": mode,
+            "started": started,
+            "seconds": round(seconds, 4),
+            "data_file": data_file,
+        }
+        if sampler is not None:
+            meta["samples"] = sampler.samples
+            meta["interval"] = sampler.interval
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        self._prune()
+
+    def profiles(self) -> List[Dict]:
+        """剖析结果列表（新的在前）"""
+        if not os.path.isdir(self.directory):
+            return []
+        result = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                    result.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        result.sort(key=lambda meta: meta.get("id", ""), reverse=True)
+        return result
+
+    def get(self, profile_id: str) -> Optional[Dict]:
+        return next((meta for meta in self.profiles() if meta.get("id") == profile_id), None)
+
+    def _prune(self):
+        for meta in self.profiles()[MAX_PROFILES:]:
+            for path in (meta.get("data_file"), os.path.join(self.directory, meta["id"] + ".json")):
+                try:
+                    if path:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+
+PROFILER = Profiler()
+
+
+def _apply_env_profiling():
+    """读取 VALKYRIE_PROFILE 中启动时即开启剖析的工具"""
+    spec = os.getenv("VALKYRIE_PROFILE", "")
+    names = [part.strip() for part in spec.split(",") if part.strip()]
+    if names:
+        PROFILER.enable(names, "cprofile")
+
+
+_apply_env_profiling()
+
+
+def profiled(fn: Callable) -> Callable:
+    """包装工具函数，使其在开启剖析时被剖析（异步工具不剖析）"""
+    if inspect.iscoroutinefunction(fn) or fn.__name__ in PROFILING_TOOL_NAMES:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not PROFILER.active:
+            return fn(*args, **kwargs)
+        mode = PROFILER.claim(fn.__name__)
+        if mode is None:
+            return fn(*args, **kwargs)
+        return PROFILER.run(fn.__name__, mode, fn, args, kwargs)
+    return wrapper
+
+
+def _short_path(filename: str) -> str:
+    """热点中的文件名只保留最后两级，避免 site-packages 的长路径"""
+    parts = filename.replace("\\", "/").split("/")
+    return "/".join(parts[-2:])
+
+
+def cprofile_hotspots(data_file: str, top_n: int, sort_by: str) -> Tuple[str, List[str]]:
+    stats = pstats.Stats(data_file)
+    rows = []
+    for (filename, line, name), (primitive_calls, calls, total, cumulative, _) in stats.stats.items():
+        rows.append((total, cumulative, calls, primitive_calls, f"{name} ({_short_path(filename)}:{line})"))
+    key = 0 if sort_by == "self" else 1
+    rows.sort(key=lambda row: row[key], reverse=True)
+    header = f"{'自身(s)':>10} {'累计(s)':>10} {'调用次数':>12}  函数"
+    lines = []
+    for total, cumulative, calls, primitive_calls, label in rows[:top_n]:
+        call_text = str(calls) if calls == primitive_calls else f"{calls}/{primitive_calls}"
+        lines.append(f"{total:>10.4f} {cumulative:>10.4f} {call_text:>12}  {label}")
+    return header, lines
+
+
+def sample_hotspots(data_file: str, top_n: int, sort_by: str) -> Tuple[str, List[str]]:
+    self_counts: Counter = Counter()
+    inclusive_counts: Counter = Counter()
+    total = 0
+    with open(data_file, encoding="utf-8") as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if not stack:
+                continue
+            count = int(count)
+            total += count
+            frames = stack.split(";")
+            self_counts[frames[-1]] += count
+            for frame in set(frames):
+                inclusive_counts[frame] += count
+    ranked = (self_counts if sort_by == "self" else inclusive_counts).most_common(top_n)
+    header = f"{'自身':>8} {'累计':>8}  函数（共 {total} 个栈样本）"
+    lines = [f"{self_counts[frame] / total:>8.1%} {inclusive_counts[frame] / total:>8.1%}  {frame}"
+             for frame, _ in ranked] if total else []
+    return header, lines
+
+
+def register_profiling_tools(mcp):
+    """注册性能剖析相关工具"""
+
+    @mcp.tool
+    def set_profiling(tool_names: Union[str, List[str]] = "*", enabled: bool = True, mode: str = "cprofile",
+                      calls: int = None):
+        """
+        开启或关闭工具调用的性能剖析（运行时生效，无需重启服务），被剖析的每次调用结束后保存一份剖析结果
+        :param tool_names: 要剖析的工具名或工具名列表，"*" 表示所有工具（默认）
+        :param enabled: True 开启，False 关闭（关闭时 tool_names 为 "*" 表示全部关闭）
+        :param mode: 剖析方式："cprofile"（默认，精确统计主线程的函数调用）或 "sample"（低开销的调用栈采样，包含线程池中的工作）
+        :param calls: 只剖析接下来的N次调用（可选，默认一直剖析直到关闭）
+        :return: 当前的剖析设置
+        """
+        try:
+            names = [tool_names] if isinstance(tool_names, str) else list(tool_names or [])
+            if not names:
+                return "错误: 没有指定工具"
+            if not enabled:
+                PROFILER.disable(None if "*" in names else names)
+            else:
+                if mode not in MODES:
+                    return f"错误: 不支持的剖析方式 {mode}，可选: {', '.join(MODES)}"
+                if calls is not None and calls < 1:
+                    return "错误: calls 必须大于0"
+                known = set(getattr(mcp, "functions", {}))
+                unknown = [name for name in names if name != "*" and known and name not in known]
+                if unknown:
+                    return f"错误: 工具 {', '.join(unknown)} 不存在"
+                PROFILER.enable(names, mode, calls)
+
+            if not PROFILER.tools:
+                return f"⏹️ 已关闭性能剖析\n剖析结果目录: {PROFILER.directory}"
+            lines = ["⏺️ 正在剖析:"]
+            for name, tool_mode in sorted(PROFILER.tools.items()):
+                remaining = PROFILER.remaining.get(name)
+                scope = f"接下来 {remaining} 次调用" if remaining is not None else "每次调用"
+                lines.append(f"  {'所有工具' if name == '*' else name}: {tool_mode}，{scope}")
+            lines.append(f"剖析结果目录: {PROFILER.directory}（用 list_profiles 查看）")
+            return "\n".join(lines)
+        except Exception as e:
+            return f"设置性能剖析时出错: {str(e)}"
+
+    @mcp.tool
+    def list_profiles(tool_name: str = None, limit: int = 20):
+        """
+        列出已保存的剖析结果（新的在前）
+        :param tool_name: 只列出该工具的剖析结果（可选）
+        :param limit: 最多列出的条数（默认20）
+        :return: 剖析结果ID、工具、耗时与方式
+        """
+        try:
+            profiles = [meta for meta in PROFILER.profiles() if not tool_name or meta.get("tool") == tool_name]
+            if not profiles:
+                return f"没有剖析结果（目录: {PROFILER.directory}），可用 set_profiling 开启剖析"
+            lines = [f"共 {len(profiles)} 个剖析结果（目录: {PROFILER.directory}）:"]
+            for meta in profiles[:max(1, limit)]:
+                started = datetime.fromtimestamp(meta["started"]).strftime("%Y-%m-%d %H:%M:%S")
+                lines.append(f"  {meta['id']}  {meta['tool']}  耗时 {meta['seconds']:.3f}s  {meta['mode']}  {started}")
+            if len(profiles) > limit:
+                lines.append(f"  ... 还有 {len(profiles) - limit} 个")
+            return "\n".join(lines)
+        except Exception as e:
+            return f"列出剖析结果时出错: {str(e)}"
+
+    @mcp.tool
+    def get_profile_hotspots(profile_id: str = None, top_n: int = DEFAULT_TOP_N, sort_by: str = "cumulative"):
+        """
+        查看一次剖析结果中耗时最多的函数
+        :param profile_id: 剖析结果ID（可选，默认为最近一次）
+        :param top_n: 展示的函数数（默认20，最多100）
+        :param sort_by: 排序方式："cumulative"（默认，含调用的子函数）或 "self"（只算函数自身）
+        :return: 热点函数列表
+        """
+        try:
+            if sort_by not in ("cumulative", "self"):
+                return "错误: sort_by 只能是 cumulative 或 self"
+            if profile_id:
+                meta = PROFILER.get(profile_id)
+                if meta is None:
+                    return f"错误: 剖析结果 {profile_id} 不存在"
+            else:
+                profiles = PROFILER.profiles()
+                if not profiles:
+                    return "没有剖析结果，可用 set_profiling 开启剖析"
+                meta = profiles[0]
+            data_file = meta["data_file"]
+            if not os.path.exists(data_file):
+                return f"错误: 剖析数据文件 {data_file} 不存在"
+
+            top_n = max(1, min(int(top_n), MAX_TOP_N))
+            hotspots = cprofile_hotspots if meta["mode"] == "cprofile" else sample_hotspots
+            header, lines = hotspots(data_file, top_n, sort_by)
+            summary = (f"🔥 {meta['id']}（{meta['tool']}，耗时 {meta['seconds']:.3f}s，{meta['mode']}，"
+                       f"按{'自身' if sort_by == 'self' else '累计'}耗时排序）\n"
+                       f"数据文件: {data_file}\n\n{header}\n")
+            return summary + "\n".join(lines)
+        except Exception as e:
+            return f"读取剖析结果时出错: {str(e)}"
@@ -0,0 +1,33 @@
+"""
+工具注册表模块
+包装 MCP 实例：注册工具的同时记录工具函数，供后台任务等需要按名称调用工具的模块使用；
+每个工具在独立的文件系统调用范围内执行（见 fs.scoped），并可在运行时开启性能剖析（见 profiling.profiled）
+"""
+
+from typing import Callable, Dict
+
+from . import fs, profiling
+
+
+class ToolRegistry:
+    """
+    与 MCP 实例的 tool 装饰器用法相同，各工具模块的 register_*_tools(mcp) 可以直接接收它
+    未包装的属性会转发给原 MCP 实例
+    """
+
+    def __init__(self, mcp):
+        self.mcp = mcp
+        self.functions: Dict[str, Callable] = {}
+
+    def tool(self, fn=None, **kwargs):
+        if fn is None:
+            return lambda f: self.tool(f, **kwargs)
+        fn = profiling.profiled(fs.scoped(fn))
+        self.functions[fn.__name__] = fn
+        return self.mcp.tool(fn, **kwargs) if kwargs else self.mcp.tool(fn)
+
+    def get(self, name: str) -> Callable:
+        return self.functions.get(name)
+
+    def __getattr__(self, name):
+        return getattr(self.mcp, name)